@@ -0,0 +1,86 @@
+"""Bot API calls and wall time of a mass deadline, per ALERT_MODE.
+
+Fires ``deadline_job`` for ``--runners`` runners with ``--contacts`` contacts
+each, against a :class:`benchmarks.fakes.FakeBot` with ``--latency`` ms per
+call, once in ``split`` mode and once in ``single`` mode. The runners carry a
+GPS location and a short trail, so ``split`` makes three calls per contact:
+text, location pin and path. Reported per mode: calls per contact, total
+calls, and the time the same calls would take at Telegram's 30 msg/s token
+limit (the budget a mass deadline actually spends).
+
+    python -m benchmarks.bench_alert_calls [--runners 200] [--contacts 10] [--latency 5]
+"""
+import argparse
+import asyncio
+import time
+from typing import Any, Dict
+
+import bot.jobs.deadline as deadline
+from benchmarks.fakes import FakeBot, FakeContext
+from benchmarks.results import new_report, write_report
+from bot.constants import UD_ACTIVE
+from bot.persistence.ledger import DeliveryLedger
+from bot.utils.contacts import add_contact
+from bot.utils.names import NAME_CACHE
+from bot.utils.outbound import GLOBAL_RATE
+from bot.utils.trail import TRAILS
+
+CONTACT_BASE = 10_000_000
+
+
+async def _fire(bot: FakeBot, bot_data, runners: int) -> None:
+    # Both modes fire the same sessions, so each run gets its own ledger.
+    ledger = DeliveryLedger()
+
+    async def one(uid: int) -> None:
+        for i in range(3):
+            TRAILS.record(uid, 1.3 + i * 0.001, 103.8)
+        user_data = {UD_ACTIVE: {"location": {"type": "coords", "lat": 1.302, "lon": 103.8},
+                                 "end_dt_utc": "2030-01-01T00:00:00+00:00"}}
+        job = type("Job", (), {"chat_id": uid, "data": {"owner_id": uid}})()
+        await deadline.deadline_job(FakeContext(bot, user_data, bot_data, job=job), ledger)
+
+    await asyncio.gather(*(one(uid) for uid in range(1, runners + 1)))
+
+
+def run_mode(mode: str, runners: int, contacts: int, latency: float) -> Dict[str, Any]:
+    bot_data: Dict[str, Any] = {}
+    for uid in range(1, runners + 1):
+        for c in range(contacts):
+            add_contact(bot_data, uid, CONTACT_BASE + uid * contacts + c)
+    bot = FakeBot(latency=latency)
+    NAME_CACHE.clear()
+    deadline.ALERT_MODE = mode
+    start = time.perf_counter()
+    asyncio.run(_fire(bot, bot_data, runners))
+    elapsed = time.perf_counter() - start
+    # Runner-side calls (getChat, "deadline reached", summary) are the same in both modes.
+    contact_calls = sum(bot.calls.values()) - bot.calls["getChat"] - 2 * runners
+    return {
+        "mode": mode,
+        "api_calls": dict(bot.calls),
+        "calls_per_contact": contact_calls / (runners * contacts),
+        "seconds": elapsed,
+        "seconds_at_global_rate": sum(bot.calls.values()) / GLOBAL_RATE,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runners", type=int, default=200)
+    parser.add_argument("--contacts", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=5.0, help="fake Bot API latency per call in ms")
+    parser.add_argument("--out", help="JSON output path (default: bench_results/bench_alert_calls_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("bench_alert_calls", {k: v for k, v in vars(args).items() if k != "out"})
+    for mode in ("split", "single"):
+        res = run_mode(mode, args.runners, args.contacts, args.latency / 1000)
+        report["scenarios"].append(res)
+        print(f"{mode:>6}: {res['calls_per_contact']:.1f} calls/contact, {sum(res['api_calls'].values())} calls, "
+              f"{res['seconds']:.2f} s here, {res['seconds_at_global_rate']:.0f} s at {GLOBAL_RATE} msg/s")
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Webhook throughput of the user-sharded cluster for 1, 2, 4... workers.
+
+Runs :class:`bot.cluster.Dispatcher` with its worker processes against a
+:class:`benchmarks.fakes.FakeBotApiServer`, which runs in its own process so
+that it does not compete with the dispatcher's event loop. ``--connections``
+keep-alive clients POST ``/help`` updates from ``--users`` distinct users as
+fast as the dispatcher accepts them. A run is finished when the fake API has
+received one ``sendMessage`` per update. The result is end-to-end updates/s
+through dispatcher, worker and Bot API. The outbound rate limiter is off, as in
+``loadgen`` without ``--throttle``: Telegram's 30 msg/s limit applies to the
+token, so it does not grow with workers.
+
+Workers are CPU-bound processes, so scaling needs at least ``workers + 2``
+cores (dispatcher and fake API). ``os.cpu_count()`` is stored in the report.
+
+    python -m benchmarks.bench_cluster --workers 1,2,4 --updates 5000
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import Any, Dict
+
+from benchmarks.fakes import FakeBotApiServer
+from benchmarks.results import new_report, write_report
+
+USER_BASE = 9_000_000
+
+
+def _api_main(conn) -> None:
+    async def run():
+        api = await FakeBotApiServer().start()
+        conn.send(api.port)
+        await asyncio.Event().wait()
+
+    asyncio.run(run())
+
+
+async def _get(port: int, path: str) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"GET {path} HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n".encode())
+    data = await reader.read()
+    writer.close()
+    return data.split(b"\r\n\r\n", 1)[1]
+
+
+async def _sent(api_port: int) -> int:
+    return json.loads(await _get(api_port, "/_calls")).get("sendMessage", 0)
+
+
+def _help_update(update_id: int, user_id: int) -> bytes:
+    return json.dumps({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "Runner"},
+            "text": "/help", "entities": [{"type": "bot_command", "offset": 0, "length": 5}],
+        },
+    }).encode()
+
+
+async def _client(port: int, bodies, errors: list) -> None:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    try:
+        for body in bodies:
+            writer.write(b"POST /telegram HTTP/1.1\r\nHost: x\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: %d\r\n\r\n" % len(body) + body)
+            await writer.drain()
+            status = await reader.readline()
+            while (await reader.readline()) not in (b"\r\n", b""):
+                pass
+            if b" 200 " not in status:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def run_one(workers: int, updates: int, users: int, connections: int, api_port: int) -> Dict[str, Any]:
+    from bot.cluster import Dispatcher
+
+    dispatcher = Dispatcher(workers, throttle=False)
+    try:
+        port = await dispatcher.start("127.0.0.1", 0)
+        bodies = [_help_update(i + 1, USER_BASE + i % users) for i in range(updates)]
+        before = await _sent(api_port)
+        errors: list = []
+        start = time.perf_counter()
+        await asyncio.gather(*(_client(port, bodies[c::connections], errors) for c in range(connections)))
+        accepted = time.perf_counter() - start
+        while await _sent(api_port) - before < updates:
+            await asyncio.sleep(0.02)
+        elapsed = time.perf_counter() - start
+    finally:
+        await dispatcher.stop()
+    return {
+        "workers": workers,
+        "updates": updates,
+        "errors": len(errors),
+        "accept_per_s": updates / accepted,
+        "updates_per_s": updates / elapsed,
+        "routed": dict(dispatcher.routed),
+    }
+
+
+async def run(args) -> list:
+    ctx = multiprocessing.get_context("spawn")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    api_process = ctx.Process(target=_api_main, args=(child_conn,), daemon=True)
+    api_process.start()
+    api_port = await asyncio.to_thread(parent_conn.recv)
+    scenarios = []
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # Read by the spawned workers.
+            os.environ.update(BOT_TOKEN="123:BENCH", BOT_API_BASE_URL=f"http://127.0.0.1:{api_port}/bot",
+                              STATE_BACKEND="sqlite", STATE_FILE=os.path.join(tmp, "none.pkl"),
+                              DELIVERY_LEDGER_FILE=os.path.join(tmp, "deliveries.jsonl"))
+            for workers in (int(w) for w in args.workers.split(",")):
+                os.environ["STATE_DB"] = os.path.join(tmp, f"cluster_{workers}.sqlite3")
+                result = await run_one(workers, args.updates, args.users, args.connections, api_port)
+                scenarios.append(result)
+                print(f"{workers:2d} worker(s): {result['updates_per_s']:8.0f} updates/s end to end, "
+                      f"dispatcher accepted {result['accept_per_s']:8.0f}/s, errors {result['errors']}")
+    finally:
+        api_process.terminate()
+        api_process.join()
+    return scenarios
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", default="1,2,4", help="worker counts, one run each")
+    parser.add_argument("--updates", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=1000, help="distinct senders (spread over the shards)")
+    parser.add_argument("--connections", type=int, default=16, help="concurrent keep-alive webhook connections")
+    parser.add_argument("--out", help="JSON output path (default: bench_results/bench_cluster_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("bench_cluster", {**{k: v for k, v in vars(args).items() if k != "out"},
+                                          "cpu_count": os.cpu_count()})
+    report["scenarios"] = asyncio.run(run(args))
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
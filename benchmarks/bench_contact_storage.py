@@ -0,0 +1,80 @@
+"""Memory per relation: str-keyed lists (old layout) vs int-keyed compact sets (int or sorted array('q')).
+
+    python -m benchmarks.bench_contact_storage [--owners 10000] [--contacts 5]
+"""
+import argparse
+import pickle
+import random
+import time
+import tracemalloc
+
+from bot.constants import BD_CONTACTS, BD_OWNERS
+from bot.utils.contacts import _contains, add_contact, migrate_contact_storage
+
+
+def _edges(owners: int, per_owner: int):
+    rng = random.Random(7)
+    return [(o, rng.randrange(10**9, 10**10)) for o in range(10**9, 10**9 + owners) for _ in range(per_owner)]
+
+
+def _old_layout(edges):
+    contacts = {}
+    for owner, cid in edges:
+        lst = contacts.setdefault(str(owner), [])
+        if cid not in lst:
+            lst.append(cid)
+    return {BD_CONTACTS: contacts}
+
+
+def _new_layout(edges):
+    bot_data = {}
+    migrate_contact_storage(bot_data)
+    for owner, cid in edges:
+        add_contact(bot_data, owner, cid)
+    return bot_data
+
+
+def _loaded_size(obj) -> int:
+    """Heap bytes of ``obj`` as it is after a restart, i.e. freshly unpickled."""
+    blob = pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    tracemalloc.start()
+    loaded = pickle.loads(blob)
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del loaded
+    return mem
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--owners", type=int, default=10_000)
+    parser.add_argument("--contacts", type=int, default=5)
+    args = parser.parse_args()
+
+    edges = _edges(args.owners, args.contacts)
+    old = _old_layout(edges)
+    new = _new_layout(edges)
+
+    print(f"{len(edges)} contact relations ({args.owners} owners x {args.contacts})")
+    print(f"{'relation':>32} {'heap bytes/rel':>15} {'pickle bytes/rel':>17}")
+    for name, rel in (
+        ("contacts_by_user, str+list", old[BD_CONTACTS]),
+        ("contacts_by_user, int+compact", new[BD_CONTACTS]),
+        ("owners_by_contact, int+compact", new[BD_OWNERS]),
+    ):
+        size = len(pickle.dumps(rel, protocol=pickle.HIGHEST_PROTOCOL))
+        print(f"{name:>32} {_loaded_size(rel) / len(edges):>15.1f} {size / len(edges):>17.1f}")
+
+    owner, cid = edges[len(edges) // 2]
+    for name, check in (
+        ("str+list `in`", lambda: cid in old[BD_CONTACTS][str(owner)]),
+        ("int+compact bisect", lambda: _contains(new[BD_CONTACTS][owner], cid)),
+    ):
+        start = time.perf_counter()
+        for _ in range(100_000):
+            check()
+        print(f"{name:>32} membership: {(time.perf_counter() - start) * 10:.3f} us")
+
+
+if __name__ == "__main__":
+    main()
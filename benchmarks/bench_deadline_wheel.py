@@ -0,0 +1,77 @@
+"""Arm/cancel throughput and memory: DeadlineWheel vs one JobQueue job per session.
+
+    python -m benchmarks.bench_deadline_wheel [--sessions 100000]
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+from telegram.ext import Application
+
+from bot.jobs.deadline import deadline_job
+from bot.jobs.wheel import DeadlineWheel
+
+
+def _payload(uid: int) -> dict:
+    return {"location": None, "owner_id": uid, "deadline_iso": "2099-01-01T00:00:00+00:00"}
+
+
+def _measure(arm, cancel, n: int) -> dict:
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    handles = [arm(uid) for uid in range(n)]
+    arm_s = time.perf_counter() - start
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for uid, handle in enumerate(handles):
+        cancel(uid, handle)
+    cancel_s = time.perf_counter() - start
+    return {"arm_per_s": n / arm_s, "cancel_per_s": n / cancel_s, "bytes_per_session": mem / n}
+
+
+def bench_wheel(n: int) -> dict:
+    wheel = DeadlineWheel()
+    now = time.time()
+    return _measure(
+        lambda uid: wheel.arm(uid, now + 600 + uid % 3600, chat_id=uid, data=_payload(uid)),
+        lambda uid, _: wheel.cancel(uid),
+        n,
+    )
+
+
+async def bench_job_queue(n: int) -> dict:
+    app = Application.builder().token("123:bench").build()
+    jq = app.job_queue
+    jq.set_application(app)
+    await jq.start()
+    try:
+        return _measure(
+            lambda uid: jq.run_once(
+                deadline_job, 600 + uid % 3600, chat_id=uid, user_id=uid, name=f"deadline_{uid}", data=_payload(uid)
+            ),
+            lambda uid, job: job.schedule_removal(),
+            n,
+        )
+    finally:
+        await jq.stop(wait=False)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rows = [("wheel", bench_wheel(args.sessions)), ("job_queue", asyncio.run(bench_job_queue(args.sessions)))]
+    print(f"{args.sessions} armed sessions")
+    print(f"{'engine':>10} {'arm/s':>12} {'cancel/s':>12} {'bytes/session':>14}")
+    for name, r in rows:
+        print(f"{name:>10} {r['arm_per_s']:>12,.0f} {r['cancel_per_s']:>12,.0f} {r['bytes_per_session']:>14,.0f}")
+
+
+if __name__ == "__main__":
+    main()
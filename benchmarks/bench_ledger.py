@@ -0,0 +1,101 @@
+"""Delivery-ledger cost of a deadline fan-out: group commit vs one write per record.
+
+Fires ``--runners`` deadlines at once, each alerting ``--contacts`` contacts
+through a fake bot whose calls take a random 0-``--latency`` seconds, with the
+ledger on a real file and ``fsync`` after every write. Compares
+:class:`bot.persistence.ledger.DeliveryLedger`, which writes the outcomes that
+finish in the same loop iteration together, with a ledger that writes and
+syncs each record on its own.
+
+    python -m benchmarks.bench_ledger [--runners 50] [--contacts 20] [--latency 0.02]
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict
+
+from benchmarks.fakes import FakeBot, FakeContext
+from benchmarks.results import new_report, write_report
+from bot.constants import UD_ACTIVE
+from bot.jobs import deadline
+from bot.persistence.ledger import DeliveryLedger, _line
+from bot.utils.contacts import add_contact
+from bot.utils.names import NAME_CACHE
+
+CONTACT_BASE = 10_000_000
+
+
+class JitterBot(FakeBot):
+    async def _call(self, endpoint, chat_id=None):
+        self.calls[endpoint] += 1
+        await asyncio.sleep(random.uniform(0, self.latency))
+
+
+class PerRecordLedger(DeliveryLedger):
+    async def append(self, key, contact_id, outcome):
+        ts = self.clock()
+        self._apply(key, contact_id, outcome, ts)
+        self._file.write(_line(key, contact_id, outcome, ts))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.writes += 1
+
+
+async def _fire(bot: FakeBot, bot_data, runners: int, ledger: DeliveryLedger) -> None:
+    async def one(uid: int) -> None:
+        iso = "2030-01-01T00:00:00+00:00"
+        user_data = {UD_ACTIVE: {"location": None, "end_dt_utc": iso}}
+        job = type("Job", (), {"chat_id": uid, "data": {"owner_id": uid, "deadline_iso": iso}})()
+        await deadline.deadline_job(FakeContext(bot, user_data, bot_data, job=job), ledger)
+
+    await asyncio.gather(*(one(uid) for uid in range(1, runners + 1)))
+
+
+def run(ledger_cls, runners: int, contacts: int, latency: float, directory: Path) -> Dict[str, Any]:
+    bot_data: Dict[str, Any] = {}
+    for uid in range(1, runners + 1):
+        for c in range(contacts):
+            add_contact(bot_data, uid, CONTACT_BASE + uid * contacts + c)
+    path = directory / f"{ledger_cls.__name__}.jsonl"
+    ledger = ledger_cls(path, fsync=True)
+    ledger.open()
+    NAME_CACHE.clear()
+    random.seed(3)
+    start = time.perf_counter()
+    asyncio.run(_fire(JitterBot(latency=latency), bot_data, runners, ledger))
+    elapsed = time.perf_counter() - start
+    ledger.close()
+    records = runners * (contacts + 1)
+    return {
+        "ledger": ledger_cls.__name__,
+        "records": records,
+        "writes": ledger.writes,
+        "records_per_write": records / ledger.writes,
+        "seconds": elapsed,
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runners", type=int, default=50)
+    parser.add_argument("--contacts", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.02, help="max seconds per fake Bot API call")
+    parser.add_argument("--out", help="JSON output path (default: bench_results/bench_ledger_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("bench_ledger", {k: v for k, v in vars(args).items() if k != "out"})
+    with tempfile.TemporaryDirectory() as tmp:
+        for ledger_cls in (DeliveryLedger, PerRecordLedger):
+            result = run(ledger_cls, args.runners, args.contacts, args.latency, Path(tmp))
+            report["scenarios"].append(result)
+            print(f"{result['ledger']:>16}: {result['writes']:6d} writes for {result['records']} records "
+                  f"({result['records_per_write']:.1f}/write), {result['seconds']:.3f}s")
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
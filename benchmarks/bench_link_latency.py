@@ -0,0 +1,70 @@
+"""p50/p99 latency of /link with the identity fetched per call vs once at startup.
+
+The fake bot answers getMe after ``--rtt`` milliseconds, roughly one Bot API
+round-trip.
+
+    python -m benchmarks.bench_link_latency [--rtt 60] [--calls 200]
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import types
+
+from bot.handlers.start import link_cmd
+from bot.utils.contacts import list_contacts
+from bot.utils.links import build_deep_link
+
+
+class FakeBot:
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.username = "SafeRunnersBot"
+
+    async def get_me(self):
+        await asyncio.sleep(self.rtt)
+        return types.SimpleNamespace(username=self.username)
+
+
+async def link_cmd_get_me_per_call(update, context) -> None:
+    """/link as it was before the startup bootstrap: one getMe per invocation."""
+    owner_id = update.effective_user.id
+    bot_username = (await context.bot.get_me()).username
+    deep_link = build_deep_link(bot_username, owner_id)
+    cnt = len(list_contacts(context.bot_data, owner_id))
+    await update.effective_chat.send_message(f"{deep_link} {cnt}")
+
+
+async def _noop(*args, **kwargs):
+    return None
+
+
+async def _measure(handler, bot, calls: int):
+    update = types.SimpleNamespace(
+        effective_user=types.SimpleNamespace(id=42),
+        effective_chat=types.SimpleNamespace(send_message=_noop),
+    )
+    context = types.SimpleNamespace(bot=bot, bot_data={})
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        await handler(update, context)
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples), samples[int(len(samples) * 0.99) - 1]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rtt", type=float, default=60, help="getMe round-trip in ms")
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+
+    bot = FakeBot(args.rtt / 1000)
+    for name, handler in (("getMe per call", link_cmd_get_me_per_call), ("bootstrapped", link_cmd)):
+        p50, p99 = asyncio.run(_measure(handler, bot, args.calls))
+        print(f"{name:>15}: p50 {p50 * 1e3:8.3f} ms   p99 {p99 * 1e3:8.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+"""End-to-end session flow: /begin -> location -> time button -> armed -> deadline alert.
+
+Each simulated runner goes through ``begin_cmd``, ``got_location``,
+``time_buttons`` (which calls ``confirm_and_schedule`` and arms the deadline
+wheel) and then ``deadline_job`` for the armed entry, against a
+:class:`benchmarks.fakes.FakeBot` with injected per-call latency and a share
+of contacts who blocked the bot. Runners have 1..``--contacts`` contacts each,
+drawn from a shared pool.
+
+Per scenario (one per ``--users`` value) it reports per-stage p50/p99 latency,
+flows and alerts per second, and peak traced memory (a second, untimed pass
+under tracemalloc, so the timings are not skewed). Results go to a JSON file
+tagged with the git commit, so runs can be compared across commits:
+
+    python -m benchmarks.bench_session_flow --users 1000,10000 --contacts 50 --latency 5 --fail-rate 0.1
+    python -m benchmarks.bench_session_flow --users 100000 --contacts 50   # several minutes
+"""
+import argparse
+import asyncio
+import gc
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Any, Dict, List
+
+from bot.handlers.session import begin_cmd, got_location, time_buttons
+from bot.jobs.deadline import deadline_job
+from bot.jobs.wheel import DEADLINES
+from bot.utils.contacts import add_contact
+from bot.utils.names import NAME_CACHE
+
+from benchmarks.fakes import FakeBot, FakeContext, make_update
+from benchmarks.results import new_report, write_report
+
+STAGES = ("begin", "location", "schedule", "deadline")
+CONTACT_BASE = 10_000_000
+
+
+def _populate(users: int, max_contacts: int, fail_rate: float, seed: int):
+    rng = random.Random(seed)
+    pool = range(CONTACT_BASE, CONTACT_BASE + max(users, max_contacts))
+    bot_data: Dict[str, Any] = {}
+    for uid in range(1, users + 1):
+        for cid in rng.sample(pool, rng.randint(1, max_contacts)):
+            add_contact(bot_data, uid, cid)
+    blocked = set(rng.sample(pool, int(len(pool) * fail_rate)))
+    return bot_data, blocked
+
+
+async def _flow(bot: FakeBot, bot_data, uid: int, samples: Dict[str, List[float]]) -> None:
+    user_data: Dict[Any, Any] = {}
+    clock = time.perf_counter
+
+    t = clock()
+    await begin_cmd(make_update(bot, uid, text="/begin"), FakeContext(bot, user_data, bot_data))
+    samples["begin"].append(clock() - t)
+
+    t = clock()
+    update = make_update(bot, uid, location={"latitude": 1.3, "longitude": 103.8})
+    await got_location(update, FakeContext(bot, user_data, bot_data))
+    samples["location"].append(clock() - t)
+
+    t = clock()
+    await time_buttons(make_update(bot, uid, callback_data="mins:30"), FakeContext(bot, user_data, bot_data))
+    samples["schedule"].append(clock() - t)
+
+    # Fire now instead of waiting for the wheel to tick.
+    entry = DEADLINES.cancel(uid)
+    t = clock()
+    await deadline_job(FakeContext(bot, user_data, bot_data, job=entry))
+    samples["deadline"].append(clock() - t)
+
+
+async def _run(bot: FakeBot, bot_data, users: int, concurrency: int) -> Dict[str, List[float]]:
+    samples: Dict[str, List[float]] = {stage: [] for stage in STAGES}
+    uids = iter(range(1, users + 1))
+
+    async def worker() -> None:
+        for uid in uids:
+            await _flow(bot, bot_data, uid, samples)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "mean_ms": statistics.fmean(values) * 1e3,
+        "p50_ms": values[len(values) // 2] * 1e3,
+        "p99_ms": values[max(0, int(len(values) * 0.99) - 1)] * 1e3,
+        "max_ms": values[-1] * 1e3,
+    }
+
+
+def run_scenario(users: int, max_contacts: int, latency: float, fail_rate: float, concurrency: int, seed: int,
+                 memory: bool = True) -> Dict[str, Any]:
+    bot_data, blocked = _populate(users, max_contacts, fail_rate, seed)
+    bot = FakeBot(latency=latency, fail_for=blocked)
+    NAME_CACHE.clear()
+
+    gc.collect()
+    start = time.perf_counter()
+    samples = asyncio.run(_run(bot, bot_data, users, concurrency))
+    elapsed = time.perf_counter() - start
+
+    relations = sum(len(v) if not isinstance(v, int) else 1 for v in bot_data["contacts_by_user"].values())
+    alerts = relations - bot.failures  # contacts reached; a blocked contact fails once, on its first call
+    result: Dict[str, Any] = {
+        "users": users,
+        "max_contacts": max_contacts,
+        "contact_relations": relations,
+        "seconds": elapsed,
+        "flows_per_s": users / elapsed,
+        "alerts_per_s": alerts / elapsed,
+        "api_calls": dict(bot.calls),
+        "api_failures": bot.failures,
+        "stages": {stage: _summary(samples[stage]) for stage in STAGES},
+    }
+
+    if memory:
+        gc.collect()
+        tracemalloc.start()
+        bot_data, blocked = _populate(users, max_contacts, fail_rate, seed)
+        state_bytes, _ = tracemalloc.get_traced_memory()
+        NAME_CACHE.clear()
+        asyncio.run(_run(FakeBot(latency=latency, fail_for=blocked), bot_data, users, concurrency))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["state_bytes"] = state_bytes
+        result["peak_traced_bytes"] = peak
+    return result
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", default="1000,10000", help="comma-separated runner counts, e.g. 1000,10000,100000")
+    parser.add_argument("--contacts", type=int, default=50, help="max contacts per runner (each gets 1..N)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Bot API latency per call in ms")
+    parser.add_argument("--fail-rate", type=float, default=0.1, help="share of contacts who blocked the bot")
+    parser.add_argument("--concurrency", type=int, default=100, help="runners in flight at once")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--out", help="JSON output path (default: bench_results/session_flow_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("session_flow", {k: v for k, v in vars(args).items() if k != "out"})
+    for users in (int(u) for u in args.users.split(",")):
+        res = run_scenario(users, args.contacts, args.latency / 1000, args.fail_rate, args.concurrency, args.seed,
+                           memory=not args.no_memory)
+        report["scenarios"].append(res)
+        print(f"{users} runners, {res['contact_relations']} contacts: "
+              f"{res['flows_per_s']:.0f} flows/s, {res['alerts_per_s']:.0f} alerts/s"
+              + (f", peak {res['peak_traced_bytes'] / 2**20:.1f} MiB" if "peak_traced_bytes" in res else ""))
+        for stage, s in res["stages"].items():
+            print(f"  {stage:>9}: p50 {s['p50_ms']:8.3f} ms   p99 {s['p99_ms']:8.3f} ms")
+
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Per-call cost of get_user_tz + local_hhmm_to_future_dt: uncached pytz lookup vs the zone cache.
+
+Users are spread over a handful of real zones, as in production. Each call
+resolves the user's zone and computes the next HH:MM occurrence, which is what
+``time_buttons``/``time_custom``/``confirm_and_schedule`` do per update.
+
+    python -m benchmarks.bench_timezones [--users 100000]
+"""
+import argparse
+import random
+import time
+import types
+
+from pytz import timezone as pytz_timezone, UnknownTimeZoneError
+
+from bot.config import DEFAULT_TZ
+from bot.constants import UD_TZ
+from bot.utils.time_utils import get_user_tz, local_hhmm_to_future_dt, resolve_tz
+
+ZONES = ["Asia/Singapore", "Europe/London", "America/New_York", "Asia/Kolkata", "Australia/Sydney", "UTC"]
+
+
+def get_user_tz_uncached(context):
+    """get_user_tz as it was: a pytz lookup on every call."""
+    tzname = context.user_data.get(UD_TZ, DEFAULT_TZ)
+    try:
+        return pytz_timezone(tzname)
+    except UnknownTimeZoneError:
+        return pytz_timezone(DEFAULT_TZ)
+
+
+def _run(contexts, lookup) -> float:
+    start = time.perf_counter()
+    for ctx in contexts:
+        local_hhmm_to_future_dt(18, 30, lookup(ctx))
+    return (time.perf_counter() - start) / len(contexts)
+
+
+def _run_lookup_only(contexts, lookup) -> float:
+    start = time.perf_counter()
+    for ctx in contexts:
+        lookup(ctx)
+    return (time.perf_counter() - start) / len(contexts)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100_000)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    contexts = [types.SimpleNamespace(user_data={UD_TZ: rng.choice(ZONES)}) for _ in range(args.users)]
+
+    def zoneinfo_lookup(ctx):
+        return resolve_tz(ctx.user_data.get(UD_TZ, DEFAULT_TZ), backend="zoneinfo")
+
+    print(f"{args.users} users over {len(ZONES)} zones, per call:")
+    for name, lookup in (
+        ("pytz, uncached", get_user_tz_uncached),
+        ("pytz, cached", get_user_tz),
+        ("zoneinfo, cached", zoneinfo_lookup),
+    ):
+        lookup_only = _run_lookup_only(contexts, lookup)
+        full = _run(contexts, lookup)
+        print(f"{name:>17}: get_user_tz {lookup_only * 1e6:6.3f} us   + local_hhmm_to_future_dt {full * 1e6:6.3f} us")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""Memory per session of a full location trail: compact Trail vs a list of location dicts.
+
+Fills ``--sessions`` trails with ``--points`` fixes each (a random walk, so
+nothing is thinned) and measures heap bytes per session with tracemalloc,
+for :class:`bot.utils.trail.Trail` and for the obvious alternative, a
+list of ``{"t", "lat", "lon"}`` dicts capped at the same size. Also times
+``Trail.add``.
+
+    python -m benchmarks.bench_trail [--sessions 10000] [--points 64]
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from benchmarks.results import new_report, write_report
+from bot.utils.trail import Trail
+
+
+def _walk(points: int, rng: random.Random):
+    lat, lon = 1.3 + rng.random() / 10, 103.8 + rng.random() / 10
+    for i in range(points):
+        lat += rng.uniform(0.0005, 0.001)
+        lon += rng.uniform(-0.001, 0.001)
+        yield 1_700_000_000 + i * 30, lat, lon
+
+
+def _compact(walk, size: int) -> Trail:
+    trail = Trail(size, min_distance=25)
+    for t, lat, lon in walk:
+        trail.add(lat, lon, at=t)
+    return trail
+
+
+def _dicts(walk, size: int) -> list:
+    trail = []
+    for t, lat, lon in walk:
+        trail.append({"t": t, "lat": lat, "lon": lon})
+        if len(trail) > size:
+            del trail[0]
+    return trail
+
+
+def _bytes_per_session(build, sessions: int, points: int) -> float:
+    rng = random.Random(7)
+    walks = [list(_walk(points, rng)) for _ in range(sessions)]
+    tracemalloc.start()
+    kept = [build(walk, points) for walk in walks]
+    mem, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del kept
+    return mem / sessions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=10_000)
+    parser.add_argument("--points", type=int, default=64, help="trail size, and fixes per session")
+    parser.add_argument("--out", help="JSON output path (default: bench_results/bench_trail_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("bench_trail", {k: v for k, v in vars(args).items() if k != "out"})
+    for name, build in (("Trail (int32 + float32 arrays)", _compact), ("list of dicts", _dicts)):
+        per_session = _bytes_per_session(build, args.sessions, args.points)
+        report["scenarios"].append({"layout": name, "bytes_per_session": per_session})
+        print(f"{name:>32}: {per_session:8.0f} heap bytes/session")
+
+    trail = Trail(args.points, min_distance=25)
+    fixes = list(_walk(100_000, random.Random(1)))
+    start = time.perf_counter()
+    for t, lat, lon in fixes:
+        trail.add(lat, lon, at=t)
+    add_us = (time.perf_counter() - start) / len(fixes) * 1e6
+    report["scenarios"].append({"layout": "Trail.add", "us_per_fix": add_us})
+    print(f"{'Trail.add':>32}: {add_us:8.2f} us/fix")
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+"""Fakes for driving the bot without Telegram.
+
+:class:`FakeBot`, :func:`make_update` and :class:`FakeContext` call handlers
+directly; only the attributes the handlers actually touch are provided. Every
+Bot API call goes through :meth:`FakeBot._call`, which sleeps for the
+configured latency and raises for chats that "blocked the bot".
+
+:class:`StubRequest` instead replaces the HTTP layer of a real ``Application``,
+and :class:`FakeBotApiServer` serves the same answers over HTTP for processes
+that talk to ``BOT_API_BASE_URL`` (the multi-process webhook cluster).
+"""
+import asyncio
+import json
+import time
+import types
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from urllib.parse import parse_qsl
+
+from telegram.request import BaseRequest
+
+
+class FakeBot:
+    def __init__(self, latency: float = 0.0, fail_for: Iterable[int] = (), username: str = "SafeRunnersBot"):
+        self.latency = latency              # seconds per API call
+        self.fail_for = set(fail_for)       # chat ids whose sends raise
+        self.username = username
+        self.id = 1
+        self.calls: Counter = Counter()     # endpoint -> count
+        self.failures = 0
+
+    async def _call(self, endpoint: str, chat_id: Optional[int] = None) -> None:
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if chat_id in self.fail_for:
+            self.failures += 1
+            raise RuntimeError("Forbidden: bot was blocked by the user")
+
+    async def get_chat(self, chat_id):
+        await self._call("getChat", chat_id)
+        return types.SimpleNamespace(full_name=f"User {chat_id}")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call("sendMessage", chat_id)
+
+    async def send_location(self, chat_id, latitude, longitude, **kwargs):
+        await self._call("sendLocation", chat_id)
+
+    async def edit_message_text(self, chat_id, text, **kwargs):
+        await self._call("editMessageText", chat_id)
+
+    async def answer_callback_query(self, query_id, **kwargs):
+        await self._call("answerCallbackQuery")
+
+
+class FakeChat:
+    def __init__(self, bot: FakeBot, chat_id: int):
+        self._bot = bot
+        self.id = chat_id
+
+    async def send_message(self, text, **kwargs):
+        await self._bot.send_message(self.id, text, **kwargs)
+
+
+class FakeCallbackQuery:
+    def __init__(self, bot: FakeBot, chat_id: int, data: str):
+        self._bot = bot
+        self._chat_id = chat_id
+        self.data = data
+
+    async def answer(self, **kwargs):
+        await self._bot.answer_callback_query(str(self._chat_id), **kwargs)
+
+    async def edit_message_text(self, text, **kwargs):
+        await self._bot.edit_message_text(self._chat_id, text, **kwargs)
+
+
+def make_update(
+    bot: FakeBot,
+    user_id: int,
+    text: Optional[str] = None,
+    location: Optional[Dict[str, float]] = None,
+    callback_data: Optional[str] = None,
+    live_period: Optional[int] = None,
+    edited: bool = False,
+):
+    """A private-chat update from ``user_id`` (chat id == user id).
+
+    ``edited`` delivers the message as ``edited_message``, as Telegram does for
+    every new fix of a live location.
+    """
+    message = None
+    if text is not None or location is not None:
+        message = types.SimpleNamespace(
+            text=text,
+            location=types.SimpleNamespace(live_period=live_period, **location) if location else None,
+        )
+    return types.SimpleNamespace(
+        effective_user=types.SimpleNamespace(id=user_id),
+        effective_chat=FakeChat(bot, user_id),
+        effective_message=message,
+        message=None if edited else message,
+        edited_message=message if edited else None,
+        callback_query=FakeCallbackQuery(bot, user_id, callback_data) if callback_data else None,
+    )
+
+
+class FakeContext:
+    """Per-update context: the user's own user_data plus the shared bot_data."""
+
+    def __init__(self, bot: FakeBot, user_data: Dict[Any, Any], bot_data: Dict[str, Any], job=None):
+        self.bot = bot
+        self.user_data = user_data
+        self.bot_data = bot_data
+        self.job = job
+        self.args = []
+        # confirm_and_schedule only checks that a JobQueue exists; deadlines live in the wheel.
+        self.job_queue = object()
+
+
+class StubRequest(BaseRequest):
+    """Bot API transport that answers every call locally after ``latency`` seconds.
+
+    Plugged into a real ``Application`` via ``build_app(request=...)``, so the
+    whole PTB stack (handlers, persistence, rate limiter) runs unchanged.
+    """
+
+    def __init__(self, latency: float = 0.0, username: str = "SafeRunnersBot"):
+        self.latency = latency
+        self.username = username
+        self.calls: Counter = Counter()
+        self._message_id = 0
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    def _message(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        self._message_id += 1
+        chat_id = int(params.get("chat_id", 0))
+        msg = {"message_id": self._message_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}}
+        if "text" in params:
+            msg["text"] = params["text"]
+        return msg
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None) -> Tuple[int, bytes]:
+        endpoint = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data is not None else {}
+        return 200, await self.answer(endpoint, params)
+
+    async def answer(self, endpoint: str, params: Dict[str, Any]) -> bytes:
+        self.calls[endpoint] += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if endpoint == "getMe":
+            result: Any = {"id": 1, "is_bot": True, "first_name": "SafeRunners", "username": self.username}
+        elif endpoint == "getChat":
+            chat_id = int(params["chat_id"])
+            result = {"id": chat_id, "type": "private", "first_name": f"User {chat_id}",
+                      "accent_color_id": 0, "max_reaction_count": 0}
+        elif endpoint == "getUpdates":
+            result = []
+        elif endpoint.startswith(("send", "edit", "forward", "copy")) and "chat_id" in params:
+            result = self._message(params)
+        else:
+            result = True
+        return json.dumps({"ok": True, "result": result}).encode()
+
+
+class FakeBotApiServer:
+    """Local HTTP Bot API: ``POST /bot<token>/<method>`` answered like :class:`StubRequest`.
+
+    Every call is recorded in :attr:`requests` as ``(method, params)``; ``GET
+    /_calls`` returns the per-method counts as JSON. Point a bot at it with
+    ``BOT_API_BASE_URL=<server.base_url>``.
+    """
+
+    def __init__(self, latency: float = 0.0, username: str = "SafeRunnersBot"):
+        self.stub = StubRequest(latency, username)
+        self.requests: List[Tuple[str, Dict[str, Any]]] = []
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.port: Optional[int] = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}/bot"
+
+    def sent_to(self, chat_id: int) -> List[str]:
+        """Texts of the messages sent to ``chat_id`` so far."""
+        return [
+            params.get("text", "") for method, params in self.requests
+            if method.startswith("send") and str(params.get("chat_id")) == str(chat_id)
+        ]
+
+    async def start(self) -> "FakeBotApiServer":
+        self._server = await asyncio.start_server(self._serve, "127.0.0.1", 0)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @staticmethod
+    def _params(content_type: str, body: bytes) -> Dict[str, Any]:
+        if not body:
+            return {}
+        if content_type.startswith("application/json"):
+            return json.loads(body)
+        return dict(parse_qsl(body.decode()))
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers: Dict[str, str] = {}
+                while (line := await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                body = await reader.readexactly(length) if length else b""
+                endpoint = request_line.split()[1].decode().split("?")[0].rsplit("/", 1)[-1]
+                if endpoint == "_calls":
+                    # Not a Bot API method: lets another process read the call counts.
+                    answer = json.dumps(dict(self.stub.calls)).encode()
+                else:
+                    params = self._params(headers.get("content-type", ""), body)
+                    self.requests.append((endpoint, params))
+                    answer = await self.stub.answer(endpoint, params)
+                writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                             b"Content-Length: %d\r\n\r\n" % len(answer) + answer)
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
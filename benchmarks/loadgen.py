@@ -0,0 +1,254 @@
+"""Synthetic update load against the real ``build_app()`` handler stack.
+
+Builds ``telegram.Update`` objects (commands, GPS pins, time-button callback
+queries, deep-link ``/start link_<id>``, free text) and feeds them to a real
+Application through its update queue, exactly as polling would. The Bot API is
+replaced by :class:`benchmarks.fakes.StubRequest`, and persistence goes to a
+temporary directory.
+
+Load is open-loop: for each offered rate in ``--rates`` updates arrive on a
+fixed schedule for ``--duration`` seconds, whether or not the app keeps up.
+Latency is measured from enqueue until a last-group ``TypeHandler`` sees the
+update, so it includes time spent waiting in the update queue. A step counts as
+saturated when the app completes less than 95% of the offered rate or p99
+latency exceeds one second.
+
+Updates follow simple per-user scripts: ``begin`` users go on to send a GPS
+pin, then press a time button, and armed users eventually press Complete.
+``--mix`` sets the weight of each kind.
+
+    python -m benchmarks.loadgen --rates 50,100,200,500,1000 --duration 5
+    python -m benchmarks.loadgen --throttle          # include the outbound rate limiter
+"""
+import argparse
+import asyncio
+import itertools
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, deque
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Optional
+
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from bot import startup
+from bot.main import build_app
+from bot.persistence.sqlite import SqlitePersistence
+from bot.persistence.wal import WalPersistence
+
+from benchmarks.fakes import StubRequest
+from benchmarks.results import new_report, write_report
+
+DEFAULT_MIX = "begin=2,gps=3,time=2,complete=1,deeplink=1,text=2,help=1"
+LAST_GROUP = 1_000_000
+USER_BASE = 5_000_000
+
+
+def parse_mix(spec: str) -> Dict[str, float]:
+    mix = {}
+    for part in spec.split(","):
+        kind, _, weight = part.partition("=")
+        if kind not in UpdateFactory.KINDS:
+            raise SystemExit(f"unknown update kind {kind!r} (expected one of {', '.join(UpdateFactory.KINDS)})")
+        mix[kind] = float(weight or 1)
+    return mix
+
+
+class UpdateFactory:
+    """Builds Bot API update payloads and tracks which users are at which step."""
+
+    KINDS = ("begin", "gps", "time", "complete", "deeplink", "text", "help")
+
+    def __init__(self, bot, users: int, seed: int = 1):
+        self.bot = bot
+        self.users = users
+        self.rng = random.Random(seed)
+        self._update_id = itertools.count(1)
+        self._message_id = itertools.count(1)
+        self._awaiting_location: Deque[int] = deque()
+        self._awaiting_time: Deque[int] = deque()
+        self._armed: Deque[int] = deque()
+
+    def _random_user(self) -> int:
+        return USER_BASE + self.rng.randrange(self.users)
+
+    def _next(self, queue: Deque[int]) -> int:
+        return queue.popleft() if queue else self._random_user()
+
+    def _user(self, uid: int) -> Dict[str, Any]:
+        return {"id": uid, "is_bot": False, "first_name": f"Runner{uid}"}
+
+    def _message(self, uid: int, **fields) -> Dict[str, Any]:
+        return {
+            "message_id": next(self._message_id),
+            "date": int(time.time()),
+            "chat": {"id": uid, "type": "private"},
+            "from": self._user(uid),
+            **fields,
+        }
+
+    def _command(self, uid: int, text: str) -> Dict[str, Any]:
+        length = len(text.split(maxsplit=1)[0])
+        return self._message(uid, text=text, entities=[{"type": "bot_command", "offset": 0, "length": length}])
+
+    def _callback(self, uid: int, data: str) -> Dict[str, Any]:
+        return {
+            "id": str(next(self._update_id)),
+            "from": self._user(uid),
+            "chat_instance": str(uid),
+            "data": data,
+            "message": self._message(uid, text="Pick an end time"),
+        }
+
+    def make(self, kind: str) -> Update:
+        payload: Dict[str, Any] = {"update_id": next(self._update_id)}
+        if kind == "begin":
+            uid = self._random_user()
+            self._awaiting_location.append(uid)
+            payload["message"] = self._command(uid, "/begin")
+        elif kind == "gps":
+            uid = self._next(self._awaiting_location)
+            self._awaiting_time.append(uid)
+            lat, lon = 1.29 + self.rng.random() / 10, 103.8 + self.rng.random() / 10
+            payload["message"] = self._message(uid, location={"latitude": lat, "longitude": lon})
+        elif kind == "time":
+            uid = self._next(self._awaiting_time)
+            self._armed.append(uid)
+            payload["callback_query"] = self._callback(uid, f"mins:{self.rng.choice((15, 30, 45, 60))}")
+        elif kind == "complete":
+            payload["callback_query"] = self._callback(self._next(self._armed), "complete")
+        elif kind == "deeplink":
+            payload["message"] = self._command(self._random_user(), f"/start link_{self._random_user()}")
+        elif kind == "text":
+            payload["message"] = self._message(self._random_user(), text="Passing the reservoir")
+        else:
+            payload["message"] = self._command(self._random_user(), "/help")
+        return Update.de_json(payload, self.bot)
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, int(len(values) * q) - 1)]
+
+
+async def _run_step(app: Application, factory: UpdateFactory, kinds, weights, rate: float, duration: float,
+                    enqueued: Dict[int, float], done: List[float], drain_timeout: float) -> Dict[str, Any]:
+    done.clear()
+    total = int(rate * duration)
+    interval = 1.0 / rate
+    max_backlog = 0
+    kind_counts: Counter = Counter()
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    wall_start = time.perf_counter()
+    for i in range(total):
+        delay = start + i * interval - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = factory.rng.choices(kinds, weights)[0]
+        kind_counts[kind] += 1
+        update = factory.make(kind)
+        enqueued[update.update_id] = time.perf_counter()
+        await app.update_queue.put(update)
+        max_backlog = max(max_backlog, app.update_queue.qsize())
+    offered_seconds = time.perf_counter() - wall_start
+
+    deadline = loop.time() + drain_timeout
+    while len(done) < total and loop.time() < deadline:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - wall_start
+
+    achieved = len(done) / elapsed if elapsed else 0.0
+    p99 = _percentile(done, 0.99)
+    return {
+        "offered_per_s": rate,
+        "generated_per_s": total / offered_seconds if offered_seconds else None,
+        "completed": len(done),
+        "dropped": total - len(done),
+        "achieved_per_s": achieved,
+        "p50_ms": (statistics.median(done) * 1e3) if done else None,
+        "p99_ms": p99 * 1e3 if p99 is not None else None,
+        "max_backlog": max_backlog,
+        "kinds": dict(kind_counts),
+        "saturated": achieved < 0.95 * rate or p99 is None or p99 > 1.0,
+    }
+
+
+def _persistence(backend: str, directory: Path):
+    if backend == "sqlite":
+        return SqlitePersistence(directory / "loadgen.sqlite3")
+    return WalPersistence(directory / "loadgen.pkl")
+
+
+async def run(args) -> Dict[str, Any]:
+    mix = parse_mix(args.mix)
+    kinds, weights = list(mix), list(mix.values())
+    request = StubRequest(latency=args.api_latency / 1000)
+    enqueued: Dict[int, float] = {}
+    done: List[float] = []
+
+    async def _record(update: Update, context) -> None:
+        started = enqueued.pop(update.update_id, None)
+        if started is not None:
+            done.append(time.perf_counter() - started)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = build_app(persistence=_persistence(args.backend, Path(tmp)), request=request, throttle=args.throttle)
+        app.add_handler(TypeHandler(Update, _record), group=LAST_GROUP)
+        await app.initialize()
+        # post_init opens the delivery ledger; keep it out of the working directory.
+        startup.DELIVERY_LEDGER_FILE = str(Path(tmp) / "deliveries.jsonl")
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        try:
+            factory = UpdateFactory(app.bot, args.users, args.seed)
+            steps = []
+            for rate in (float(r) for r in args.rates.split(",")):
+                step = await _run_step(app, factory, kinds, weights, rate, args.duration, enqueued, done,
+                                       args.drain_timeout)
+                steps.append(step)
+                p50 = f"{step['p50_ms']:.2f}" if step["p50_ms"] is not None else "-"
+                p99 = f"{step['p99_ms']:.2f}" if step["p99_ms"] is not None else "-"
+                print(f"offered {rate:7.0f}/s  achieved {step['achieved_per_s']:7.1f}/s  "
+                      f"p50 {p50:>8} ms  p99 {p99:>8} ms  backlog {step['max_backlog']:6d}"
+                      + ("  SATURATED" if step["saturated"] else ""))
+                enqueued.clear()
+        finally:
+            await app.stop()
+            await app.shutdown()
+    return {"steps": steps, "api_calls": dict(request.calls)}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rates", default="50,100,200,500,1000,2000", help="offered updates/s, one step each")
+    parser.add_argument("--duration", type=float, default=5.0, help="seconds per step")
+    parser.add_argument("--users", type=int, default=1000, help="distinct synthetic users")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="kind=weight list; kinds: " + ", ".join(UpdateFactory.KINDS))
+    parser.add_argument("--api-latency", type=float, default=0.0, help="stub Bot API latency per call in ms")
+    parser.add_argument("--throttle", action="store_true", help="keep the outbound rate limiter (30 msg/s global)")
+    parser.add_argument("--backend", choices=("wal", "sqlite"), default="wal", help="persistence backend")
+    parser.add_argument("--drain-timeout", type=float, default=10.0, help="max seconds to wait for the backlog")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", help="JSON output path (default: bench_results/loadgen_<commit>.json)")
+    args = parser.parse_args()
+
+    report = new_report("loadgen", {k: v for k, v in vars(args).items() if k != "out"})
+    result = asyncio.run(run(args))
+    report["scenarios"] = result["steps"]
+    report["api_calls"] = result["api_calls"]
+    saturated = [s["offered_per_s"] for s in result["steps"] if s["saturated"]]
+    report["saturation_per_s"] = saturated[0] if saturated else None
+    if saturated:
+        print(f"saturates at about {max(s['achieved_per_s'] for s in result['steps']):.0f} updates/s")
+    print(f"wrote {write_report(report, args.out)}")
+
+
+if __name__ == "__main__":
+    main()
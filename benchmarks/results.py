@@ -0,0 +1,35 @@
+"""JSON result files tagged with the git commit, so runs can be compared across commits."""
+import json
+import platform
+import subprocess
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+
+def git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+        return out.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def new_report(benchmark: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "benchmark": benchmark,
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "params": params,
+        "scenarios": [],
+    }
+
+
+def write_report(report: Dict[str, Any], out: Optional[str] = None) -> Path:
+    """Write to ``out`` or ``bench_results/<benchmark>_<commit>.json``."""
+    path = Path(out or f"bench_results/{report['benchmark']}_{(report['commit'] or 'unknown')[:12]}.json")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2))
+    return path
@@ -0,0 +1,235 @@
+"""Multi-process webhook deployment: one dispatcher, N user-sharded workers.
+
+A single event loop tops out at one core, so ``WEBHOOK_WORKERS > 1`` makes
+``python -m bot.webhook`` run this instead of PTB's webhook server:
+
+* The **dispatcher** (parent process) owns the public port. It is a
+  :class:`bot.ingress.WebhookServer`, which checks the secret token and parses
+  the JSON. It reads the sender's user id (:func:`bot.sharding.route_key`),
+  forwards the body unchanged to that user's worker and answers 200. If the
+  worker is unreachable it answers 503, so Telegram retries later.
+* Each **worker** is a spawned process running the normal ``build_app()``
+  Application with :data:`bot.sharding.SHARD` set. It reads length-prefixed
+  update frames from a localhost socket into its
+  :class:`bot.ingress.UpdateIngress` queue.
+
+Routing by user keeps a runner's conversation state, ``user_data`` and armed
+deadline in one worker. ``bot_data`` (contacts, blacklists, sessions) is
+shared through ``STATE_BACKEND=sqlite``, which the cluster requires. Worker 0
+starts alone first so a legacy ``STATE_FILE`` is imported once, before the
+others open the database.
+"""
+import asyncio
+import logging
+import multiprocessing
+import signal
+import struct
+from typing import Any, Dict, List, Optional
+
+from telegram import Bot, Update
+
+from bot import sharding
+from bot.config import BOT_API_BASE_URL, PERSISTENCE_BACKEND, TELEGRAM_TOKEN
+from bot.ingress import UpdateIngress, WebhookServer, loads, running, stop_event
+
+logger = logging.getLogger(__name__)
+
+_FRAME = struct.Struct("!I")
+_READY_TIMEOUT = 60
+_STOP_TIMEOUT = 15
+
+
+# ---------- worker ----------
+
+async def _feed(ingress: UpdateIngress, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        while True:
+            (size,) = _FRAME.unpack(await reader.readexactly(_FRAME.size))
+            # Waits when the ingress queue is full, pushing back on the dispatcher.
+            await ingress.put(loads(await reader.readexactly(size)))
+    except asyncio.IncompleteReadError:
+        pass
+    finally:
+        writer.close()
+
+
+async def _run_worker(index: int, count: int, conn, throttle: bool) -> None:
+    # Imported here so the dispatcher process never builds an Application.
+    from bot.handlers.errors import on_error
+    from bot.main import build_app
+
+    sharding.configure(index, count)
+    application = build_app(throttle=throttle)
+    application.add_error_handler(on_error)
+
+    stop = stop_event(signal.SIGTERM)
+    async with running(application) as ingress:
+        server = await asyncio.start_server(lambda r, w: _feed(ingress, r, w), "127.0.0.1", 0)
+        conn.send(server.sockets[0].getsockname()[1])
+        conn.close()
+        logger.info("Worker %d/%d ready", index, count)
+        try:
+            await stop.wait()
+        finally:
+            server.close()
+            await server.wait_closed()
+    logger.info("Worker %d/%d stopped", index, count)
+
+
+def worker_main(index: int, count: int, conn, throttle: bool = True) -> None:
+    """Entry point of a worker process; sends its frame port through ``conn`` once ready."""
+    logging.basicConfig(
+        format=f"%(asctime)s %(levelname)s [w{index}] %(name)s %(message)s",
+        level=logging.INFO,
+    )
+    # Ctrl-C reaches the whole process group; the dispatcher decides when workers stop.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(index, count, conn, throttle))
+
+
+# ---------- dispatcher ----------
+
+class WorkerLink:
+    """One worker process and the dispatcher's connection to it."""
+
+    def __init__(self, index: int, count: int, throttle: bool = True):
+        self.index = index
+        self.count = count
+        self.throttle = throttle
+        self.process: Optional[multiprocessing.Process] = None
+        self.port: Optional[int] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    async def start(self) -> None:
+        ctx = multiprocessing.get_context("spawn")
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        self.process = ctx.Process(
+            target=worker_main,
+            args=(self.index, self.count, child_conn, self.throttle),
+            name=f"saferunner-worker-{self.index}",
+        )
+        self.process.start()
+        child_conn.close()
+        try:
+            if not await asyncio.to_thread(parent_conn.poll, _READY_TIMEOUT):
+                raise RuntimeError(f"worker {self.index} did not start within {_READY_TIMEOUT}s")
+            self.port = parent_conn.recv()
+        except EOFError:
+            raise RuntimeError(f"worker {self.index} exited during startup") from None
+        finally:
+            parent_conn.close()
+        _, self._writer = await asyncio.open_connection("127.0.0.1", self.port)
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    async def send(self, body: bytes) -> bool:
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            return False
+        try:
+            # One write per frame, so concurrent senders never interleave.
+            writer.write(_FRAME.pack(len(body)) + body)
+            await writer.drain()
+        except ConnectionError:
+            return False
+        return True
+
+    async def stop(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.terminate()
+        await asyncio.to_thread(self.process.join, _STOP_TIMEOUT)
+        if self.process.is_alive():
+            logger.warning("Worker %d did not stop in %ss; killing it", self.index, _STOP_TIMEOUT)
+            self.process.kill()
+            await asyncio.to_thread(self.process.join)
+
+
+class Dispatcher(WebhookServer):
+    """Webhook server that routes each update to the worker owning its user.
+
+    Args:
+        workers: Number of worker processes (one shard each).
+        path: Webhook request path.
+        secret: Expected ``X-Telegram-Bot-Api-Secret-Token``; None accepts any request.
+        throttle: Passed to ``build_app`` in every worker; benchmarks turn the
+            outbound rate limiter off to measure the handler stack alone.
+    """
+
+    def __init__(self, workers: int, path: str = "/telegram", secret: Optional[str] = None,
+                 throttle: bool = True):
+        if workers < 1:
+            raise ValueError("need at least one worker")
+        super().__init__(path, secret)
+        self.workers: List[WorkerLink] = [WorkerLink(i, workers, throttle) for i in range(workers)]
+        self.routed: Dict[int, int] = {i: 0 for i in range(workers)}
+
+    async def start(self, host: str, port: int) -> int:
+        """Start the workers, then listen on ``host:port``. Returns the bound port."""
+        first, *rest = self.workers
+        await first.start()
+        await asyncio.gather(*(w.start() for w in rest))
+        bound = await self.listen(host, port)
+        logger.info("Dispatching %s on %s:%s to %d worker(s)", self.path, host, bound, len(self.workers))
+        return bound
+
+    async def stop(self) -> None:
+        await self.close()
+        await asyncio.gather(*(w.stop() for w in self.workers))
+
+    async def watch(self, interval: float = 1.0) -> None:
+        """Restart workers that died; their updates get 503s (and Telegram retries) meanwhile."""
+        while True:
+            await asyncio.sleep(interval)
+            for worker in self.workers:
+                if not worker.alive:
+                    logger.error("Worker %d exited (code %s); restarting it", worker.index, worker.process.exitcode)
+                    await worker.stop()
+                    try:
+                        await worker.start()
+                    except RuntimeError:
+                        logger.exception("Worker %d failed to restart", worker.index)
+
+    def worker_for(self, update: dict) -> WorkerLink:
+        user_id = sharding.route_key(update)
+        if user_id is None:
+            return self.workers[0]
+        return self.workers[sharding.shard_of(user_id, len(self.workers))]
+
+    async def accept(self, update: Dict[str, Any], body: bytes) -> str:
+        worker = self.worker_for(update)
+        if not await worker.send(body):
+            logger.error("Worker %d unavailable; asking Telegram to retry", worker.index)
+            return "503 Service Unavailable"
+        self.routed[worker.index] += 1
+        return "200 OK"
+
+
+async def set_webhook(url: str, secret: Optional[str]) -> None:
+    async with Bot(TELEGRAM_TOKEN, base_url=BOT_API_BASE_URL) as bot:
+        await bot.set_webhook(url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+    logger.info("Webhook set to %s", url)
+
+
+async def serve(workers: int, host: str, port: int, path: str, secret: Optional[str],
+                webhook_url: Optional[str]) -> None:
+    """Run the dispatcher and its workers until SIGINT/SIGTERM."""
+    if PERSISTENCE_BACKEND != "sqlite":
+        raise SystemExit("WEBHOOK_WORKERS > 1 needs shared state: set STATE_BACKEND=sqlite")
+    dispatcher = Dispatcher(workers, path, secret)
+    stop = stop_event()
+    try:
+        await dispatcher.start(host, port)
+        if webhook_url:
+            await set_webhook(webhook_url, secret)
+        watchdog = asyncio.get_running_loop().create_task(dispatcher.watch(), name="cluster_watchdog")
+        await stop.wait()
+        watchdog.cancel()
+    finally:
+        await dispatcher.stop()
@@ -46,12 +46,28 @@ TELEGRAM_TOKEN = (
     or "PUT-YOUR-TOKEN-HERE"
 )
 
+# Bot API server base URL (the token is appended); point at a local Bot API server or a test fake
+BOT_API_BASE_URL = os.environ.get("BOT_API_BASE_URL", "https://api.telegram.org/bot")
+
 # Default IANA timezone for interpreting HH:MM
 DEFAULT_TZ = os.environ.get("DEFAULT_TZ", "Asia/Singapore")
 
-# Persistence filename (PicklePersistence)
+# Timezone database: "pytz" or "zoneinfo" (stdlib; needs system tzdata or the tzdata package)
+TZ_BACKEND = os.environ.get("TZ_BACKEND", "pytz").strip().lower()
+
+# Persistence filename (snapshot for the WAL backend, whole file for PicklePersistence)
 PERSISTENCE_FILE = os.environ.get("STATE_FILE", "saferunner_data.pkl")
 
+# Persistence backend: "wal" (snapshot + append-only log), "pickle" (PicklePersistence)
+# or "sqlite" (indexed tables in STATE_DB)
+PERSISTENCE_BACKEND = os.environ.get("STATE_BACKEND", "wal").strip().lower()
+
+# SQLite database path for STATE_BACKEND=sqlite
+PERSISTENCE_DB = os.environ.get("STATE_DB", "saferunner_data.sqlite3")
+
+# WAL backend: rewrite the snapshot after this many log records
+PERSISTENCE_COMPACT_EVERY = int(os.environ.get("STATE_COMPACT_EVERY", "1000"))
+
 
 def _env_flag(name: str, default: bool = False) -> bool:
     value = os.environ.get(name)
@@ -69,3 +85,49 @@ def _env_flag(name: str, default: bool = False) -> bool:
 
 # Whether admin will be alerted on being added as alert
 ALERT_WHEN_ADDED = _env_flag("ALERT", False)
+
+# Alert per contact: "single" (one message with a map link) or "split" (text, then a location pin)
+ALERT_MODE = "split" if os.environ.get("ALERT_MODE", "single").strip().lower() == "split" else "single"
+
+# Max contacts alerted in parallel when a deadline fires
+ALERT_CONCURRENCY = max(int(os.environ.get("ALERT_CONCURRENCY", "8")), 1)
+
+# Failed alert deliveries: attempts in total, backoff base and cap in seconds, retries in flight at once
+RETRY_MAX_ATTEMPTS = max(int(os.environ.get("RETRY_MAX_ATTEMPTS", "8")), 1)
+RETRY_BASE_SECONDS = max(float(os.environ.get("RETRY_BASE_SECONDS", "5")), 0)
+RETRY_MAX_SECONDS = max(float(os.environ.get("RETRY_MAX_SECONDS", "600")), 0)
+RETRY_CONCURRENCY = max(int(os.environ.get("RETRY_CONCURRENCY") or ALERT_CONCURRENCY), 1)
+
+# Delivery ledger (JSON lines): each contact's alert outcome per session, so an alert cut short by a
+# restart resumes without re-alerting anyone; empty keeps it in memory only
+DELIVERY_LEDGER_FILE = os.environ.get("DELIVERY_LEDGER_FILE", "saferunner_deliveries.jsonl")
+DELIVERY_LEDGER_FSYNC = _env_flag("DELIVERY_LEDGER_FSYNC", False)
+
+# Updates handled at once (different users only; each user's updates run in order)
+UPDATE_CONCURRENCY = max(int(os.environ.get("UPDATE_CONCURRENCY", "32")), 1)
+
+# Live location: write the latest fix into the session (and persistence) at most this often
+LIVE_LOCATION_PERSIST_SECONDS = max(float(os.environ.get("LIVE_LOCATION_PERSIST_SECONDS", "60")), 0)
+
+# Location trail per session: points kept, minimum spacing in metres, and points listed in alerts
+TRAIL_SIZE = max(int(os.environ.get("TRAIL_SIZE", "64")), 1)
+TRAIL_MIN_DISTANCE_M = max(float(os.environ.get("TRAIL_MIN_DISTANCE_M", "25")), 0)
+TRAIL_ALERT_POINTS = max(int(os.environ.get("TRAIL_ALERT_POINTS", "10")), 0)
+
+# Webhook ingress: updates acknowledged but not yet processed (503 beyond this), and drain tasks
+WEBHOOK_QUEUE_SIZE = max(int(os.environ.get("WEBHOOK_QUEUE_SIZE", "1000")), 1)
+WEBHOOK_CONCURRENCY = max(int(os.environ.get("WEBHOOK_CONCURRENCY") or UPDATE_CONCURRENCY), 1)
+
+# Prometheus metrics side port (GET /metrics); 0 disables it
+METRICS_PORT = int(os.environ.get("METRICS_PORT", "0"))
+METRICS_ADDR = os.environ.get("METRICS_ADDR", "0.0.0.0")
+
+# Span export (JSON lines) for per-update tracing; unset disables tracing
+TRACE_FILE = os.environ.get("TRACE_FILE") or None
+
+# Telegram user ids allowed to run admin commands (/profile), comma-separated
+ADMIN_IDS = frozenset(int(x) for x in os.environ.get("ADMIN_IDS", "").replace(" ", "").split(",") if x)
+
+# Sampling profiler: output directory and default duration for /profile and SIGUSR1
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "profiles")
+PROFILE_SECONDS = int(os.environ.get("PROFILE_SECONDS", "30"))
@@ -4,6 +4,12 @@ ASK_LOCATION, ASK_TIME, ASK_CUSTOM_TIME = range(3)
 # Keys for user_data / bot_data
 UD_TZ = "tz"                          # per-user timezone name
 UD_ACTIVE = "active_session"          # per-user session dict
-UD_JOB = "deadline_job"               # per-user Job reference
-BD_CONTACTS = "contacts_by_user"      # bot_data: owner_id (str) -> List[chat_id]
-BD_BLACKLIST = "blacklist_by_user"    # bot_data: owner_id (str) -> Set[blocked_chat_id]
\ No newline at end of file
+UD_RETRY = "alert_retries"            # per-user alert deliveries waiting to be retried (bot.jobs.retry)
+UD_JOB = "deadline_job"               # legacy per-user Job reference (deadlines now live in bot.jobs.wheel)
+BD_CONTACTS = "contacts_by_user"      # bot_data: owner_id -> contact chat ids (int, or sorted array('q') if several)
+BD_OWNERS = "owners_by_contact"       # bot_data: contact_id -> owner ids, same layout (reverse of BD_CONTACTS)
+BD_BLACKLIST = "blacklist_by_user"    # bot_data: contact_id -> blocked runner ids, same layout
+BD_AUDIENCE = "audience_by_user"      # bot_data: owner_id -> contacts that have not blacklisted them, same layout
+BD_REACH = "reachability"             # bot_data: chat_id -> REACHABLE/BLOCKED (bot.utils.reachability)
+BD_SCHEMA = "contacts_schema"         # bot_data: layout version of the relations above
+BD_STORE = "store"                    # bot_data: live SqliteStore handle (sqlite backend only, never persisted)
@@ -0,0 +1,38 @@
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from bot.config import ADMIN_IDS, PROFILE_SECONDS
+from bot.profiling import MAX_SECONDS, profile_event_loop
+
+logger = logging.getLogger(__name__)
+
+
+def is_admin(user_id: int) -> bool:
+    return user_id in ADMIN_IDS
+
+
+async def profile_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """/profile [seconds] – sample the event loop and write a folded-stack file (admins only)."""
+    if not is_admin(update.effective_user.id):
+        await update.effective_chat.send_message("This command is for bot admins.")
+        return
+    try:
+        seconds = int(context.args[0]) if context.args else PROFILE_SECONDS
+    except ValueError:
+        await update.effective_chat.send_message(f"Usage: /profile [seconds] (1-{MAX_SECONDS})")
+        return
+
+    chat = update.effective_chat
+    await chat.send_message(f"Profiling for {min(max(seconds, 1), MAX_SECONDS)}s…")
+
+    async def _run() -> None:
+        path = await profile_event_loop(seconds)
+        if path is None:
+            await chat.send_message("A profile is already running.")
+        else:
+            await chat.send_message(f"Profile written to <code>{path}</code>.")
+
+    # Don't hold up this chat's updates while sampling.
+    context.application.create_task(_run(), update=update, name="profile_cmd")
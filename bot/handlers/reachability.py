@@ -0,0 +1,21 @@
+from telegram import ChatMember, Update
+from telegram.constants import ChatType
+from telegram.ext import ContextTypes
+
+from bot.utils.reachability import mark_blocked, mark_reachable
+
+
+async def track_reachability(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Runs before every other handler (group -2): record who the bot can message."""
+    member = update.my_chat_member
+    if member is not None:
+        # The user blocked (kicked) or restarted the bot
+        if member.chat.type == ChatType.PRIVATE:
+            if member.new_chat_member.status == ChatMember.BANNED:
+                mark_blocked(context.bot_data, member.chat.id)
+            else:
+                mark_reachable(context.bot_data, member.chat.id)
+        return
+    chat = update.effective_chat
+    if chat is not None and chat.type == ChatType.PRIVATE:
+        mark_reachable(context.bot_data, chat.id)
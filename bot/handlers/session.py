@@ -1,3 +1,4 @@
+import time
 from datetime import datetime, timedelta
 from telegram import (
     Update,
@@ -14,22 +15,40 @@ from telegram.ext import (
 
 from bot.constants import ASK_LOCATION, ASK_TIME, ASK_CUSTOM_TIME, UD_ACTIVE, UD_JOB
 from bot.utils.time_utils import get_user_tz, parse_hhmm, local_hhmm_to_future_dt, to_utc, delay_seconds_from_utc_deadline
-from bot.jobs.deadline import deadline_job
+from bot.jobs.wheel import DEADLINES
 from bot.utils.session_utils import format_location_summary
+from bot.utils.live_location import LIVE_LOCATIONS
+from bot.utils.trail import TRAILS
 
 
-def clear_active_session(context: ContextTypes.DEFAULT_TYPE) -> None:
-    job = context.user_data.pop(UD_JOB, None)
-    if job:
-        try:
-            job.schedule_removal()
-        except Exception:
-            pass
+def clear_active_session(context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    DEADLINES.cancel(user_id)
+    # Sessions armed before the deadline wheel kept a Job reference here.
+    context.user_data.pop(UD_JOB, None)
     context.user_data.pop(UD_ACTIVE, None)
+    LIVE_LOCATIONS.discard(user_id)
+    TRAILS.discard(user_id)
+
+
+def _coords(loc) -> dict:
+    return {"type": "coords", "lat": loc.latitude, "lon": loc.longitude}
+
+
+def _is_live(update: Update) -> bool:
+    # A live location is sent once (with live_period) and then edited on every new fix
+    return update.edited_message is not None or bool(update.effective_message.location.live_period)
+
+
+def _set_session_location(context: ContextTypes.DEFAULT_TYPE, user_id: int, location: dict) -> None:
+    context.user_data[UD_ACTIVE]["location"] = location
+    # Also update the armed deadline's payload so the alert uses the latest location
+    entry = DEADLINES.get(user_id)
+    if entry is not None:
+        entry.data["location"] = location
 
 
 async def begin_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
-    clear_active_session(context)
+    clear_active_session(context, update.effective_user.id)
     context.user_data[UD_ACTIVE] = {"location": None, "end_dt_utc": None}
 
     kb = [[KeyboardButton(text="Send current location 📍", request_location=True)]]
@@ -43,11 +62,15 @@ async def begin_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
 
 async def got_location(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     session = context.user_data.get(UD_ACTIVE, {})
-    if update.message and update.message.location:
-        loc = update.message.location
-        session["location"] = {"type": "coords", "lat": loc.latitude, "lon": loc.longitude}
+    message = update.effective_message
+    if message and message.location:
+        loc = message.location
+        session["location"] = _coords(loc)
+        TRAILS.record(update.effective_user.id, loc.latitude, loc.longitude)
+        if _is_live(update):
+            LIVE_LOCATIONS.update(update.effective_user.id, loc.latitude, loc.longitude)
     else:
-        text = (update.message.text or "").strip()
+        text = (message.text or "").strip()
         if not text:
             await update.effective_chat.send_message("Please send a location pin or type a location.")
             return ASK_LOCATION
@@ -113,6 +136,7 @@ async def confirm_and_schedule(update: Update, context: ContextTypes.DEFAULT_TYP
     session = context.user_data.get(UD_ACTIVE, {})
     end_dt_utc = to_utc(end_local_dt)
     session["end_dt_utc"] = end_dt_utc.isoformat()
+    session["chat_id"] = update.effective_chat.id  # lets a restart re-arm the deadline
     context.user_data[UD_ACTIVE] = session
 
     ikb = InlineKeyboardMarkup([
@@ -141,19 +165,16 @@ async def confirm_and_schedule(update: Update, context: ContextTypes.DEFAULT_TYP
         )
         return ConversationHandler.END
 
-    job = context.job_queue.run_once(
-        deadline_job,
-        delay,
+    DEADLINES.arm(
+        update.effective_user.id,
+        time.time() + delay,
         chat_id=update.effective_chat.id,
-        user_id=update.effective_user.id,
-        name=f"deadline_{update.effective_user.id}",
         data={
             "location": session.get("location"),
             "owner_id": update.effective_user.id,
-            "deadline_iso": end_dt_utc.isoformat(),  
+            "deadline_iso": end_dt_utc.isoformat(),
         },
     )
-    context.user_data[UD_JOB] = job
     return ConversationHandler.END
 
 
@@ -163,19 +184,14 @@ async def button_handler(update, context):
     await query.answer()
 
     if data in ("complete", "cancel"):
-        job = context.user_data.pop(UD_JOB, None)
+        entry = DEADLINES.cancel(update.effective_user.id)
         # mark for clarity (not required)
-        try:
-            if job and job.data is not None:
-                job.data["cancelled"] = True
-        except Exception:
-            pass
-        if job:
-            try:
-                job.schedule_removal()
-            except Exception:
-                pass
+        if entry is not None:
+            entry.data["cancelled"] = True
+        context.user_data.pop(UD_JOB, None)
         context.user_data.pop(UD_ACTIVE, None)
+        LIVE_LOCATIONS.discard(update.effective_user.id)
+        TRAILS.discard(update.effective_user.id)
 
         if data == "complete":
             await query.edit_message_text("Nice work! Session marked complete. No alerts will be sent.")
@@ -189,23 +205,32 @@ async def free_text_during_session(update, context):
         return
     text = (update.message.text or "").strip()
     if text:
-        # Update session view (optional)
-        context.user_data[UD_ACTIVE]["location"] = {"type": "text", "text": text}
-        # Also update the scheduled job payload so the deadline uses latest location
-        job = context.user_data.get(UD_JOB)
-        if job and job.data is not None:
-            job.data["location"] = {"type": "text", "text": text}
+        _set_session_location(context, update.effective_user.id, {"type": "text", "text": text})
         await update.effective_chat.send_message("Location updated.")
 
 
 async def free_gps_during_session(update, context):
     if UD_ACTIVE not in context.user_data or not context.user_data[UD_ACTIVE]:
         return
-    if update.message and update.message.location:
-        loc = update.message.location
-        coords = {"type": "coords", "lat": loc.latitude, "lon": loc.longitude}
-        context.user_data[UD_ACTIVE]["location"] = coords
-        job = context.user_data.get(UD_JOB)
-        if job and job.data is not None:
-            job.data["location"] = coords
+    message = update.effective_message
+    if not (message and message.location):
+        return
+    loc = message.location
+    user_id = update.effective_user.id
+    TRAILS.record(user_id, loc.latitude, loc.longitude)
+
+    if not _is_live(update):
+        LIVE_LOCATIONS.discard(user_id)
+        _set_session_location(context, user_id, _coords(loc))
         await update.effective_chat.send_message("Location updated.")
+        return
+
+    # Live location: every fix is kept in memory (deadline_job reads it from there), but the
+    # session, and so persistence, is only rewritten every LIVE_LOCATION_PERSIST_SECONDS.
+    if LIVE_LOCATIONS.update(user_id, loc.latitude, loc.longitude):
+        _set_session_location(context, user_id, _coords(loc))
+    # Acknowledge the share once; the edits that follow are silent.
+    if update.edited_message is None:
+        await update.effective_chat.send_message(
+            "Live location received. If an alert goes out, contacts get your latest position."
+        )
@@ -6,10 +6,11 @@ from telegram import Update
 from telegram.ext import ContextTypes
 
 from bot.config import DEFAULT_TZ, ALERT_WHEN_ADDED
-from bot.utils.time_utils import is_valid_tz
+from bot.utils.time_utils import set_user_tz
 from bot.utils.contacts import (
     add_contact,
     list_contacts,
+    list_owners,
     remove_contact_everywhere,
     remove_contact,
     blacklist_add,
@@ -17,6 +18,8 @@ from bot.utils.contacts import (
     blacklist_list,
 )
 from bot.utils.links import build_deep_link, build_contact_offer_link, build_bundle_link
+from bot.utils.names import NAME_CACHE
+from bot.utils.reachability import BLOCKED, UNKNOWN, reachability, record_send
 from bot.constants import UD_TZ
 
 
@@ -125,6 +128,15 @@ HELP_ENTRIES: tuple[HelpEntry, ...] = (
             "Use it if you no longer wish to receive alerts from certain runners.",
         ),
     ),
+    HelpEntry(
+        command="runners",
+        summary="(for contacts) List the runners you receive alerts for.",
+        details=(
+            "Usage: /runners.",
+            "Shows every runner who has you on their alert list, with their IDs",
+            "for /blacklist.",
+        ),
+    ),
     HelpEntry(
         command="stopalerts",
         summary="Unsubscribe from every runner you alert.",
@@ -146,6 +158,24 @@ SHORT_HELP_TEXT = "\n".join(
 )
 
 
+_REACH_NOTES = {
+    UNKNOWN: "hasn’t messaged this bot yet",
+    BLOCKED: "has blocked this bot",
+}
+
+
+def unreachable_note(context: ContextTypes.DEFAULT_TYPE, contact_ids) -> str:
+    """Warning for the runner about contacts alerts cannot reach; empty if there are none."""
+    states = reachability(context.bot_data, contact_ids)
+    lines = [f"• {cid} {_REACH_NOTES[state]}" for cid, state in states.items() if state in _REACH_NOTES]
+    if not lines:
+        return ""
+    return (
+        "\n\n⚠️ Alerts can’t reach these contacts until they open "
+        f"@{context.bot.username} and press Start:\n" + "\n".join(lines)
+    )
+
+
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     user = update.effective_user
     tz = context.user_data.get(UD_TZ, DEFAULT_TZ)
@@ -191,17 +221,16 @@ async def tz_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
             f"Current: {context.user_data.get(UD_TZ, DEFAULT_TZ)}"
         )
         return
-    tzname = " ".join(context.args).strip()
-    if not is_valid_tz(tzname):
+    tzname = set_user_tz(context, " ".join(context.args).strip())
+    if tzname is None:
         await update.effective_chat.send_message("Sorry, that timezone is not recognized.")
         return
-    context.user_data[UD_TZ] = tzname
     await update.effective_chat.send_message(f"Timezone set to {tzname}.")
 
 
 async def link_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     owner_id = update.effective_user.id
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username  # identity fetched once by Bot.initialize(); no getMe round-trip
     deep_link = build_deep_link(bot_username, owner_id)
     cnt = len(list_contacts(context.bot_data, owner_id))
     await update.effective_chat.send_message(
@@ -216,7 +245,7 @@ async def contactlink_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     Any runner who taps this link will add THIS contact to their alert list.
     """
     contact_id = update.effective_user.id
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username
     deep_link = build_contact_offer_link(bot_username, contact_id)
     await update.effective_chat.send_message(
         "Share this with runners who want you as their alert contact:\n"
@@ -233,6 +262,18 @@ async def contacts_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> No
     await update.effective_chat.send_message(f"Authorized contacts: {len(ids)}")
 
 
+async def runners_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """For a CONTACT: list the runners whose alerts they receive."""
+    contact_id = update.effective_user.id
+    ids = list_owners(context.bot_data, contact_id)
+    if not ids:
+        await update.effective_chat.send_message("You’re not an alert contact for anyone yet.")
+        return
+    names = await NAME_CACHE.resolve_many(context.bot, ids)
+    lines = [f"• {names[rid] or rid} (ID {rid})" for rid in ids]
+    await update.effective_chat.send_message("You receive alerts for:\n" + "\n".join(lines))
+
+
 async def stopalerts_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     chat_id = update.effective_chat.id
     removed = remove_contact_everywhere(context.bot_data, chat_id)
@@ -275,16 +316,7 @@ async def start_param_entry(update: Update, context: ContextTypes.DEFAULT_TYPE)
         add_contact(context.bot_data, runner_id, contact_id)
 
         # Try to fetch contact's display name (may fail if Telegram restricts)
-        try:
-            contact_chat = await context.bot.get_chat(contact_id)
-            contact_name = contact_chat.full_name or "this contact"
-        except Exception:
-            contact_name = "this contact"
-
-        await update.effective_chat.send_message(
-            f"Added {contact_name} to your alert list. "
-            "Use /contacts to see how many are authorized."
-        )
+        contact_name = await NAME_CACHE.resolve(context.bot, contact_id) or "this contact"
 
         # (Optional) Let the contact know they were added by someone (best-effort)
         if ALERT_WHEN_ADDED:
@@ -294,9 +326,17 @@ async def start_param_entry(update: Update, context: ContextTypes.DEFAULT_TYPE)
                     contact_id,
                     f"Heads up: {runner.full_name or 'A runner'} added you as an alert contact."
                 )
-            except Exception:
-                pass
-            return
+                record_send(context.bot_data, contact_id, None)
+            except Exception as e:
+                record_send(context.bot_data, contact_id, e)
+
+        # After the ping, so the note reflects its outcome
+        await update.effective_chat.send_message(
+            f"Added {contact_name} to your alert list. "
+            "Use /contacts to see how many are authorized."
+            + unreachable_note(context, [contact_id])
+        )
+        return
     
     if param and param.startswith("bundle_"):
         payload = param.split("_", 1)[1]
@@ -324,9 +364,13 @@ async def start_param_entry(update: Update, context: ContextTypes.DEFAULT_TYPE)
                         cid,
                         f"Heads up: {runner.full_name or 'A runner'} added you as an alert contact (bundle)."
                     )
-                except Exception:
-                    pass
-        await update.effective_chat.send_message(f"Added {added} contact(s) from bundle link. Use /contactlist to view.")
+                    record_send(context.bot_data, cid, None)
+                except Exception as e:
+                    record_send(context.bot_data, cid, e)
+        await update.effective_chat.send_message(
+            f"Added {added} contact(s) from bundle link. Use /contactlist to view."
+            + unreachable_note(context, list(dict.fromkeys(contact_ids)))
+        )
         return
         
 async def unlink_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -353,14 +397,12 @@ async def contactlist_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
     if not ids:
         await update.effective_chat.send_message("You have no contacts yet. Use /link or tap someone’s /contactlink.")
         return
-    lines = []
-    for cid in ids:
-        try:
-            chat = await context.bot.get_chat(cid)
-            name = chat.full_name or str(cid)
-        except Exception:
-            name = str(cid)
-        lines.append(f"• {name} (ID {cid})")
+    names = await NAME_CACHE.resolve_many(context.bot, ids)
+    states = reachability(context.bot_data, ids)
+    lines = [
+        f"• {names[cid] or cid} (ID {cid})" + (f" – {_REACH_NOTES[states[cid]]}" if states[cid] in _REACH_NOTES else "")
+        for cid in ids
+    ]
     await update.effective_chat.send_message("Your contacts:\n" + "\n".join(lines))
 
 async def blacklist_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -439,7 +481,7 @@ async def bundle_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None
             "That’s a lot—Telegram limits deep-link length. I’ll include the first 6."
         )
         contact_ids = contact_ids[:6]
-    bot_username = (await context.bot.get_me()).username
+    bot_username = context.bot.username
     link = build_bundle_link(bot_username, contact_ids)
     listed = ", ".join(map(str, contact_ids))
     await update.effective_chat.send_message(
@@ -0,0 +1,291 @@
+"""Webhook ingress: acknowledge Telegram immediately, process from a bounded queue.
+
+:class:`WebhookServer` is a minimal HTTP/1.1 (keep-alive) server for the
+webhook path. It checks ``X-Telegram-Bot-Api-Secret-Token`` and parses the
+body with the fastest JSON decoder available (``orjson`` when installed). It
+then hands the update dict to :meth:`WebhookServer.accept`. Nothing else runs
+before the response is written.
+
+:class:`UpdateIngress` is the queue behind it. Updates are stored as plain
+dicts, queued per user and bounded in total (``WEBHOOK_QUEUE_SIZE``). A pool
+of ``WEBHOOK_CONCURRENCY`` drain tasks turns them into ``telegram.Update``
+objects and runs them through the Application's update processor, the same
+path polling takes. Each drain task works on one user at a time, so a user
+with a backlog cannot hold up everyone else's updates. A full queue makes the
+server answer 503, so Telegram backs off and retries instead of the backlog
+growing without limit.
+
+``python -m bot.webhook`` runs this via :func:`run_webhook`. The multi-process
+dispatcher (:mod:`bot.cluster`) reuses :class:`WebhookServer`, and its workers
+reuse :class:`UpdateIngress`.
+"""
+import abc
+import asyncio
+import hmac
+import logging
+import signal
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, Deque, Dict, Hashable, List, Optional
+
+from telegram import Update
+from telegram.ext import Application
+
+from bot.config import WEBHOOK_CONCURRENCY, WEBHOOK_QUEUE_SIZE
+from bot.metrics import METRICS
+from bot.sharding import route_key
+
+try:
+    from orjson import loads  # optional, several times faster than the stdlib decoder
+except ImportError:
+    from json import loads
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY = 1 << 20
+_DRAIN_TIMEOUT = 10
+
+INGRESS_REJECTED = METRICS.counter(
+    "saferunner_ingress_rejected_total", "Webhook updates answered with 503 because the ingress queue was full."
+)
+
+
+class WebhookServer(abc.ABC):
+    """HTTP front end for Telegram's webhook calls; subclasses decide what :meth:`accept` does.
+
+    Args:
+        path: Webhook request path.
+        secret: Expected ``X-Telegram-Bot-Api-Secret-Token``; None accepts any request.
+    """
+
+    def __init__(self, path: str = "/telegram", secret: Optional[str] = None):
+        self.path = path
+        self.secret = secret
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    @abc.abstractmethod
+    async def accept(self, update: Dict[str, Any], body: bytes) -> str:
+        """Take one parsed update; returns the HTTP status line to answer with."""
+
+    async def listen(self, host: str, port: int) -> int:
+        """Start listening on ``host:port``. Returns the bound port."""
+        self._server = await asyncio.start_server(self._serve, host, port)
+        return self._server.sockets[0].getsockname()[1]
+
+    async def close(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def handle(self, method: str, target: str, headers: Dict[str, str], body: bytes) -> str:
+        if method != "POST" or target.split("?")[0] != self.path:
+            return "404 Not Found"
+        token = headers.get("x-telegram-bot-api-secret-token", "")
+        if self.secret and not hmac.compare_digest(token.encode(), self.secret.encode()):
+            return "403 Forbidden"
+        try:
+            update = loads(body)
+        except ValueError:
+            return "400 Bad Request"
+        if not isinstance(update, dict):
+            return "400 Bad Request"
+        return await self.accept(update, body)
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        # HTTP/1.1 with keep-alive: Telegram reuses connections between updates.
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers: Dict[str, str] = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if length > MAX_BODY:
+                    writer.write(b"HTTP/1.1 413 Payload Too Large\r\nContent-Length: 0\r\nConnection: close\r\n\r\n")
+                    break
+                body = await reader.readexactly(length) if length else b""
+                parts = request_line.decode("latin-1").split()
+                if len(parts) < 2:
+                    break
+                status = await self.handle(parts[0], parts[1], headers, body)
+                writer.write(f"HTTP/1.1 {status}\r\nContent-Length: 0\r\n\r\n".encode())
+                await writer.drain()
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+class UpdateIngress:
+    """Bounded queue of raw updates drained by a pool of tasks into the Application.
+
+    Updates are queued per user (:func:`bot.sharding.route_key`). A drain task takes
+    the user next in line, runs that user's oldest update and, if more are queued,
+    puts the user back at the end of the line. A user's updates thus reach the
+    handlers in order and one at a time, and a user with a backlog occupies one
+    drain task rather than all of them.
+
+    Args:
+        application: Initialized Application whose handlers process the updates.
+        maxsize: Queue bound; :meth:`offer` fails once it is reached.
+        concurrency: Number of drain tasks. Handlers additionally respect the
+            Application's update processor limit (``concurrent_updates``).
+    """
+
+    def __init__(self, application: Application, maxsize: int = WEBHOOK_QUEUE_SIZE,
+                 concurrency: int = WEBHOOK_CONCURRENCY):
+        self.application = application
+        self.maxsize = max(maxsize, 1)
+        self.concurrency = max(concurrency, 1)
+        self._workers: List[asyncio.Task] = []
+        # route_key -> that user's queued updates, oldest first; present while the user has any queued or running
+        self._pending: Dict[Hashable, Deque[Dict[str, Any]]] = {}
+        # Users whose next update may start, in turn order
+        self._ready: asyncio.Queue = asyncio.Queue()
+        self._size = 0
+        self._room = asyncio.Event()
+        self._room.set()
+
+    @property
+    def depth(self) -> int:
+        return self._size
+
+    def offer(self, update: Dict[str, Any]) -> bool:
+        """Queue without waiting; False if the queue is full."""
+        if self._size >= self.maxsize:
+            INGRESS_REJECTED.inc()
+            return False
+        self._push(update)
+        return True
+
+    async def put(self, update: Dict[str, Any]) -> None:
+        """Queue, waiting for room (back-pressure for stream sources)."""
+        while self._size >= self.maxsize:
+            await self._room.wait()
+        self._push(update)
+
+    def _push(self, update: Dict[str, Any]) -> None:
+        key = route_key(update)
+        if key is None:
+            key = object()              # nobody to order against
+        self._size += 1
+        if self._size >= self.maxsize:
+            self._room.clear()
+        backlog = self._pending.get(key)
+        if backlog is None:
+            self._pending[key] = deque((update,))
+            self._ready.put_nowait(key)
+        else:
+            # Queued behind the user's earlier updates; _drain puts the user back in line.
+            backlog.append(update)
+
+    def start(self) -> None:
+        METRICS.gauge("saferunner_ingress_queue_depth", "Webhook updates acknowledged but not yet processed.",
+                      lambda: self.depth)
+        # The drain tasks bypass application.update_queue, so point the generic gauge at this queue.
+        METRICS.gauge("saferunner_update_queue_depth", "Updates received but not yet processed.", lambda: self.depth)
+        loop = asyncio.get_running_loop()
+        self._workers = [loop.create_task(self._drain(), name=f"ingress_{i}") for i in range(self.concurrency)]
+
+    async def stop(self, timeout: float = _DRAIN_TIMEOUT) -> None:
+        """Process what is queued (up to ``timeout`` seconds), then stop the pool."""
+        try:
+            await asyncio.wait_for(self._ready.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Ingress: %d update(s) still queued at shutdown", self.depth)
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    async def _drain(self) -> None:
+        application = self.application
+        while True:
+            key = await self._ready.get()
+            backlog = self._pending[key]
+            data = backlog.popleft()
+            self._size -= 1
+            self._room.set()
+            try:
+                update = Update.de_json(data, application.bot)
+                await application.update_processor.process_update(update, application.process_update(update))
+            except Exception:
+                logger.exception("Ingress: update %s could not be processed", data.get("update_id"))
+            finally:
+                # Back of the line, so one user's backlog takes turns with everyone else's.
+                if backlog:
+                    self._ready.put_nowait(key)
+                else:
+                    del self._pending[key]
+                self._ready.task_done()
+
+
+class IngressServer(WebhookServer):
+    """Webhook server that queues every update on an :class:`UpdateIngress` and answers 200."""
+
+    def __init__(self, ingress: UpdateIngress, path: str = "/telegram", secret: Optional[str] = None):
+        super().__init__(path, secret)
+        self.ingress = ingress
+
+    async def accept(self, update: Dict[str, Any], body: bytes) -> str:
+        if self.ingress.offer(update):
+            return "200 OK"
+        return "503 Service Unavailable"
+
+
+@asynccontextmanager
+async def running(application: Application, ingress: Optional[UpdateIngress] = None):
+    """Start ``application`` (with post_init) and ``ingress`` (default settings if None); undo both on exit.
+
+    This is ``run_polling``/``run_webhook``'s lifecycle, minus PTB's updater.
+    """
+    await application.initialize()
+    if application.post_init:
+        await application.post_init(application)
+    await application.start()
+    ingress = ingress or UpdateIngress(application)
+    ingress.start()
+    try:
+        yield ingress
+    finally:
+        await ingress.stop()
+        await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def stop_event(*signals: signal.Signals) -> asyncio.Event:
+    """An event set by any of ``signals`` (default SIGINT and SIGTERM)."""
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in signals or (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    return stop
+
+
+async def run_webhook(application: Application, host: str, port: int, path: str, secret: Optional[str],
+                      webhook_url: Optional[str]) -> None:
+    """Run ``application`` behind an :class:`IngressServer` until SIGINT/SIGTERM."""
+    stop = stop_event()
+    async with running(application) as ingress:
+        server = IngressServer(ingress, path, secret)
+        try:
+            bound = await server.listen(host, port)
+            logger.info("Webhook ingress on %s:%s%s (queue %d, %d drain tasks)",
+                        host, bound, path, ingress.maxsize, ingress.concurrency)
+            if webhook_url:
+                await application.bot.set_webhook(webhook_url, secret_token=secret, allowed_updates=Update.ALL_TYPES)
+                logger.info("Webhook set to %s", webhook_url)
+            await stop.wait()
+        finally:
+            await server.close()
@@ -1,11 +1,97 @@
+import asyncio
+import html
 import logging
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Set
+
 from telegram.ext import ContextTypes
-from bot.utils.contacts import list_contacts
-from bot.constants import UD_ACTIVE, UD_JOB, BD_BLACKLIST
+from bot.config import ALERT_CONCURRENCY, ALERT_MODE, TRAIL_ALERT_POINTS
+from bot.jobs.retry import Send, deliver, schedule_retry
+from bot.persistence.ledger import (
+    BLOCKED, CLOSED, DELIVERED, FAILED, LEDGER, OPTED_OUT, RETRYING, DeliveryLedger, session_key,
+)
+from bot.utils.contacts import list_audience, list_contacts
+from bot.utils.live_location import LIVE_LOCATIONS
+from bot.utils.names import NAME_CACHE
+from bot.utils.reachability import by_reachability, record_send
+from bot.utils.session_utils import format_trail_summary
+from bot.utils.time_utils import get_user_tz
+from bot.utils.trail import TRAILS
+from bot.constants import UD_ACTIVE, UD_JOB, UD_RETRY
 
 logger = logging.getLogger(__name__)
 
-async def deadline_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+
+def map_link(lat: float, lon: float) -> str:
+    return f"https://maps.google.com/?q={lat:.5f},{lon:.5f}"
+
+
+def compose_alert(alert_text: str, loc: Optional[Dict[str, Any]], path_text: Optional[str] = None,
+                  planned_end: Optional[str] = None, mode: str = ALERT_MODE) -> List[Send]:
+    """The calls each contact gets, in order.
+
+    ``single`` puts everything in one HTML message, with the location as a map
+    link. ``split`` sends the text, then a location pin (or the text location),
+    then the path: up to three calls per contact. Both are sent as HTML, so
+    ``alert_text`` must already be escaped.
+    """
+    if mode == "split":
+        sends: List[Send] = [("send_message", {"text": alert_text})]
+        if loc:
+            if loc.get("type") == "coords":
+                sends.append(("send_location", {"latitude": loc["lat"], "longitude": loc["lon"]}))
+            elif loc.get("type") == "text":
+                sends.append(("send_message", {"text": f"Last reported location: {html.escape(loc['text'])}"}))
+        if path_text:
+            sends.append(("send_message", {"text": path_text}))
+        return sends
+
+    lines = [alert_text.rstrip("\n")]
+    if planned_end:
+        lines.append(f"Planned end: {planned_end}")
+    if loc and loc.get("type") == "coords":
+        lines.append(f'Last known location: <a href="{map_link(loc["lat"], loc["lon"])}">'
+                     f'{loc["lat"]:.5f}, {loc["lon"]:.5f}</a>')
+    elif loc and loc.get("type") == "text":
+        lines.append(f"Last reported location: {html.escape(loc['text'])}")
+    if path_text:
+        lines += ["", path_text]
+    return [("send_message", {"text": "\n".join(lines)})]
+
+
+async def _alert_contact(context: ContextTypes.DEFAULT_TYPE, ledger: DeliveryLedger, owner_id: int, key: str,
+                         cid: int, sends: List[Send], limit: asyncio.Semaphore) -> None:
+    """Make the alert's calls for one contact, in order, and record the outcome in the ledger."""
+    async with limit:
+        remaining = list(sends)
+        error = await deliver(context.bot, cid, remaining)
+    record_send(context.bot_data, cid, error)
+    if error is None:
+        outcome = DELIVERED
+    else:
+        # Common case: contact never pressed Start => 403, which is not retried
+        logger.info("deadline_job: failed DM to contact %s: %s", cid, error)
+        retrying = schedule_retry(context.user_data, owner_id, cid, remaining, error, session=key)
+        outcome = RETRYING if retrying else FAILED
+    await ledger.append(key, cid, outcome)
+
+
+def _settled(context: ContextTypes.DEFAULT_TYPE, key: str, done: Dict[int, str]) -> Set[int]:
+    """Contacts of an earlier run of this alert that need nothing more."""
+    # A retry recorded in the ledger may not have been persisted before the restart.
+    queued = {d["chat_id"] for d in context.user_data.get(UD_RETRY) or () if d.get("session") == key}
+    return {cid for cid, outcome in done.items() if outcome != RETRYING or cid in queued}
+
+
+def _clear_session(context: ContextTypes.DEFAULT_TYPE, owner_id: int) -> None:
+    context.user_data.pop(UD_ACTIVE, None)
+    context.user_data.pop(UD_JOB, None)
+    LIVE_LOCATIONS.discard(owner_id)
+    TRAILS.discard(owner_id)
+
+
+async def deadline_job(context: ContextTypes.DEFAULT_TYPE, ledger: DeliveryLedger = LEDGER) -> None:
     job = context.job
     chat_id = job.chat_id
     payload = getattr(job, "data", None) or {}
@@ -15,69 +101,97 @@ async def deadline_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     if payload.get("cancelled"):
         return
 
-    # For friendliness, we still DM the runner (chat_id)
-    try:
-        await context.bot.send_message(
-            chat_id,
-            "⚠️ End time reached and no completion recorded. Notifying your contacts now.",
-        )
-    except Exception as e:
-        logger.warning("deadline_job: failed to notify runner chat_id=%s: %s", chat_id, e)
-
     # Alert contacts (fetched live from bot_data so additions/removals since scheduling are reflected)
     if not owner_id:
         # fallback: try to resolve owner as chat_id (runner), which is typical
         owner_id = chat_id
 
-    contacts = list_contacts(context.bot_data, owner_id)
-    # Skip contacts who blacklisted this runner
-    blmap = context.bot_data.get(BD_BLACKLIST, {})
     session = context.user_data.get(UD_ACTIVE, {})
-    loc = payload.get("location") or session.get("location")
+    end_iso = payload.get("deadline_iso") or session.get("end_dt_utc")
+    key = session_key(owner_id, end_iso)
+    if ledger.is_closed(key):
+        # Alerted and summarised before a restart; only clearing the session was lost.
+        logger.info("deadline_job: alert for user %s already completed; clearing the session", owner_id)
+        _clear_session(context, owner_id)
+        return
+    # Outcomes from a run cut short by a restart: those contacts are not alerted again.
+    done = ledger.outcomes(key)
 
-    if not contacts:
+    # For friendliness, we still DM the runner (chat_id)
+    if not done:
+        try:
+            await context.bot.send_message(
+                chat_id,
+                "⚠️ End time reached and no completion recorded. Notifying your contacts now.",
+            )
+        except Exception as e:
+            logger.warning("deadline_job: failed to notify runner chat_id=%s: %s", chat_id, e)
+
+    # Contacts minus those who blacklisted this runner, maintained at write time
+    contacts = list_contacts(context.bot_data, owner_id)
+    audience = list_audience(context.bot_data, owner_id)
+    # A live location's latest fix is only in memory; the session copy may be up to a minute old
+    loc = LIVE_LOCATIONS.latest(owner_id) or payload.get("location") or session.get("location")
+
+    if not audience and not contacts:
         try:
             await context.bot.send_message(chat_id, "No authorized contacts found. Use /link to add some.")
         except Exception:
             pass
+        # Nobody to alert still ends the session; otherwise every restart would fire it again.
+        await ledger.append(key, None, CLOSED)
+        _clear_session(context, owner_id)
         return
 
     # Compose + send
-    who = "the user"
-    try:
-        chat_info = await context.bot.get_chat(owner_id)  # safe; just for name
-        who = chat_info.full_name or "the user"
-    except Exception:
-        pass
+    who = await NAME_CACHE.resolve(context.bot, owner_id) or "the user"
 
     owner_identifier = owner_id
 
     alert_text = (
-        f"⚠️ Safety alert for {who}, {owner_identifier}\n"
+        # Display names may contain <, > or &; unescaped they fail every send with "can't parse entities".
+        f"⚠️ Safety alert for {html.escape(who)}, {owner_identifier}\n"
         "They did not check in as completed by their planned end time.\n"
     )
 
-    for cid in contacts:
-        bl = blmap.get(str(cid), [])
-        if owner_identifier in bl:
-            continue
-        try:
-            await context.bot.send_message(cid, alert_text)
-            if loc:
-                if loc.get("type") == "coords":
-                    await context.bot.send_location(cid, latitude=loc["lat"], longitude=loc["lon"])
-                elif loc.get("type") == "text":
-                    await context.bot.send_message(cid, f"Last reported location: {loc['text']}")
-        except Exception as e:
-            # Common case: contact never pressed Start => 403; we ignore individual failures
-            logger.info("deadline_job: failed DM to contact %s: %s", cid, e)
+    # The path is only worth a message once the runner has moved
+    trail = TRAILS.get(owner_id)
+    points = trail.points(TRAIL_ALERT_POINTS) if trail is not None and TRAIL_ALERT_POINTS else []
+    tz = get_user_tz(context)
+    path_text = format_trail_summary(points, tz) if len(points) > 1 else None
+    planned_end = datetime.fromisoformat(end_iso).astimezone(tz).strftime("%Y-%m-%d %H:%M (%Z)") if end_iso else None
+    sends = compose_alert(alert_text, loc, path_text, planned_end, mode=ALERT_MODE)
+
+    settled = _settled(context, key, done)
+    audience_ids = set(audience)
+    opted_out = [cid for cid in contacts if cid not in audience_ids and cid not in settled]
+    # Contacts known to have blocked the bot are skipped; those who never wrote to it go last.
+    targets, blocked = by_reachability(context.bot_data, [cid for cid in audience if cid not in settled])
 
-    # Tell runner how many we attempted
+    # Fan out concurrently; a contact's calls (several in split mode) still go out in order. Outcomes
+    # that finish together are written to the ledger together.
+    limit = asyncio.Semaphore(ALERT_CONCURRENCY)
+    await asyncio.gather(
+        *(ledger.append(key, cid, OPTED_OUT) for cid in opted_out),
+        *(ledger.append(key, cid, BLOCKED) for cid in blocked),
+        *(_alert_contact(context, ledger, owner_id, key, cid, sends, limit) for cid in targets),
+    )
+
+    # Tell runner how many we attempted, counting any run before a restart
+    counts = Counter(ledger.outcomes(key).values())
+    sent, failed = counts[DELIVERED], counts[FAILED] + counts[RETRYING]
+    summary = f"Attempted to notify {sent + failed} contact(s): {sent} delivered, {failed} failed"
+    if counts[OPTED_OUT]:
+        summary += f", {counts[OPTED_OUT]} skipped (opted out)"
+    if counts[BLOCKED]:
+        summary += f", {counts[BLOCKED]} skipped (blocked this bot)"
+    if counts[RETRYING]:
+        summary += f"; retrying {counts[RETRYING]} in the background"
     try:
-        await context.bot.send_message(chat_id, f"Attempted to notify {len(contacts)} contact(s).")
+        await context.bot.send_message(chat_id, summary + ".")
     except Exception:
         pass
+    await ledger.append(key, None, CLOSED)
 
     # Clear session state now that the deadline ran.
-    context.user_data.pop(UD_ACTIVE, None)
-    context.user_data.pop(UD_JOB, None)
+    _clear_session(context, owner_id)
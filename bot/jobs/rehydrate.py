@@ -0,0 +1,89 @@
+"""Re-arm persisted sessions after a restart.
+
+Deadlines live in memory (:mod:`bot.jobs.wheel`), but ``user_data[UD_ACTIVE]``
+is persisted. On startup we walk the persisted sessions in batches, yielding
+to the event loop between batches so updates keep flowing, and re-arm each
+deadline. Sessions whose deadline passed while the bot was down are armed in
+the past and fire on the first tick.
+
+In a sharded deployment (:mod:`bot.cluster`) each worker only re-arms the
+sessions of the users routed to it, so every alert still fires exactly once.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable
+
+from telegram.ext import Application
+
+from bot.constants import BD_STORE, UD_ACTIVE
+from bot.jobs.wheel import DEADLINES, DeadlineWheel
+from bot.sharding import owns_user
+
+logger = logging.getLogger(__name__)
+
+# Filled in by rehydrate_deadlines(); read by logging and the metrics endpoint.
+REHYDRATION_STATS: Dict[str, Any] = {
+    "sessions": 0,
+    "overdue": 0,
+    "seconds": None,
+    "per_second": None,
+}
+
+
+def _armed_user_ids(application: Application) -> Iterable[int]:
+    store = application.bot_data.get(BD_STORE)
+    if store is not None:
+        # Indexed sessions table: no need to look at users without a session.
+        return [user_id for user_id, _, _ in store.iter_sessions() if owns_user(user_id)]
+    return [user_id for user_id in application.user_data if owns_user(user_id)]
+
+
+def rearm_session(wheel: DeadlineWheel, user_id: int, session: Dict[str, Any], now: float) -> bool:
+    """Arm one persisted session. Returns True if it was overdue."""
+    end_iso = session["end_dt_utc"]
+    deadline = datetime.fromisoformat(end_iso).timestamp()
+    wheel.arm(
+        user_id,
+        deadline,
+        chat_id=session.get("chat_id", user_id),
+        data={
+            "location": session.get("location"),
+            "owner_id": user_id,
+            "deadline_iso": end_iso,
+        },
+    )
+    return deadline <= now
+
+
+async def rehydrate_deadlines(
+    application: Application, wheel: DeadlineWheel = DEADLINES, batch_size: int = 1000
+) -> Dict[str, Any]:
+    started = time.perf_counter()
+    now = time.time()
+    sessions = overdue = 0
+    for i, user_id in enumerate(_armed_user_ids(application), 1):
+        # Read the live session: the runner may have started a new one since startup.
+        session = (application.user_data.get(user_id) or {}).get(UD_ACTIVE)
+        if session and session.get("end_dt_utc") and wheel.get(user_id) is None:
+            try:
+                overdue += rearm_session(wheel, user_id, session, now)
+                sessions += 1
+            except (KeyError, ValueError) as e:
+                logger.warning("rehydrate: skipping malformed session for user %s: %s", user_id, e)
+        if i % batch_size == 0:
+            await asyncio.sleep(0)
+
+    elapsed = time.perf_counter() - started
+    REHYDRATION_STATS.update(
+        sessions=sessions,
+        overdue=overdue,
+        seconds=elapsed,
+        per_second=sessions / elapsed if elapsed > 0 else None,
+    )
+    logger.info(
+        "Rehydrated %d armed session(s) (%d overdue) in %.3fs",
+        sessions, overdue, elapsed,
+    )
+    return REHYDRATION_STATS
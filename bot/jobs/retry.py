@@ -0,0 +1,217 @@
+"""Durable retry queue for alert deliveries that failed.
+
+``deadline_job`` makes each contact's calls in order (see
+:func:`bot.jobs.deadline.compose_alert`). When one fails, :func:`classify`
+decides what happens to the calls that are left:
+
+* ``RetryAfter``: retry once the delay Telegram asked for has passed;
+* network errors, timeouts and anything unrecognised: retry with exponential
+  backoff, ``RETRY_BASE_SECONDS * 2**(attempt - 1)`` capped at ``RETRY_MAX_SECONDS``;
+* ``Forbidden`` (blocked, never pressed Start), ``BadRequest`` (chat not
+  found, ...), ``ChatMigrated`` and ``InvalidToken``: give up.
+
+A delivery to retry is stored in the runner's ``user_data[UD_RETRY]``, so it is
+persisted with the rest of the runner's state (and stays on the runner's shard),
+and pushed on the in-memory :data:`RETRIES` heap. :func:`retry_tick`, a
+repeating JobQueue job, starts due deliveries as separate tasks, at most
+``RETRY_CONCURRENCY`` at once, so a backlog of retries never holds up deadline
+ticks; their sends queue behind fresh alerts (``PRIORITY_RETRY``). After
+``RETRY_MAX_ATTEMPTS`` attempts a delivery is dropped and logged. Either way the
+final outcome goes into the delivery ledger (:mod:`bot.persistence.ledger`). On startup
+:func:`rehydrate_retries` re-queues the persisted deliveries.
+"""
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, RetryAfter
+from telegram.ext import Application, ContextTypes
+
+from bot.config import RETRY_BASE_SECONDS, RETRY_CONCURRENCY, RETRY_MAX_ATTEMPTS, RETRY_MAX_SECONDS
+from bot.constants import UD_RETRY
+from bot.metrics import METRICS
+from bot.persistence.ledger import DELIVERED, FAILED, LEDGER, DeliveryLedger
+from bot.sharding import owns_user
+from bot.utils.reachability import record_send
+from bot.utils.outbound import PRIORITY_RETRY, send_priority
+
+logger = logging.getLogger(__name__)
+
+# One Bot API call: bot method name and its keyword arguments (the chat id is added per contact)
+Send = Tuple[str, Dict[str, Any]]
+
+RETRY_AFTER, TRANSIENT, PERMANENT = "retry_after", "transient", "permanent"
+
+DELIVERY_FAILURES = METRICS.counter(
+    "saferunner_alert_delivery_failures_total",
+    "Failed alert delivery attempts, by error kind (retry_after, transient, permanent) and attempt (first, retry).",
+    ("kind", "attempt"),
+)
+RETRY_OUTCOMES = METRICS.counter(
+    "saferunner_alert_retries_total",
+    "Outcome of each alert delivery retry (delivered, rescheduled, gave_up).",
+    ("outcome",),
+)
+
+
+def classify(error: BaseException) -> str:
+    if isinstance(error, RetryAfter):
+        return RETRY_AFTER
+    # BadRequest subclasses NetworkError, so check the permanent errors first.
+    if isinstance(error, (Forbidden, BadRequest, ChatMigrated, InvalidToken)):
+        return PERMANENT
+    return TRANSIENT
+
+
+def retry_delay(error: BaseException, attempt: int) -> Optional[float]:
+    """Seconds until attempt ``attempt + 1``; None to give up."""
+    kind = classify(error)
+    if kind == PERMANENT or attempt >= RETRY_MAX_ATTEMPTS:
+        return None
+    if kind == RETRY_AFTER:
+        return float(error.retry_after)
+    return min(RETRY_BASE_SECONDS * 2 ** (attempt - 1), RETRY_MAX_SECONDS)
+
+
+async def deliver(bot, chat_id: int, sends: List[Send]) -> Optional[Exception]:
+    """Make ``sends`` in order, removing each once it succeeded. Returns the error that stopped them, if any."""
+    while sends:
+        method, kwargs = sends[0]
+        try:
+            await getattr(bot, method)(chat_id, **kwargs)
+        except Exception as e:
+            return e
+        del sends[0]
+    return None
+
+
+class RetryQueue:
+    """Deliveries by due time (epoch seconds), with a cap on how many are in flight.
+
+    A delivery is the dict stored in ``user_data[UD_RETRY]``: ``chat_id``,
+    the ``sends`` still to make, ``attempt`` (attempts made so far), ``due``
+    and the last ``error``.
+    """
+
+    def __init__(self, concurrency: int = RETRY_CONCURRENCY, clock=time.time):
+        self.concurrency = concurrency
+        self.clock = clock
+        self.in_flight = 0
+        self._seq = itertools.count()
+        self._heap: List[Tuple[float, int, int, Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return len(self._heap) + self.in_flight
+
+    def push(self, user_id: int, delivery: Dict[str, Any]) -> None:
+        heapq.heappush(self._heap, (delivery["due"], next(self._seq), user_id, delivery))
+
+    def take_due(self, now: Optional[float] = None) -> List[Tuple[int, Dict[str, Any]]]:
+        """Pop due deliveries, as many as there are free slots; each must be passed to :meth:`done`."""
+        now = self.clock() if now is None else now
+        due = []
+        while self._heap and self._heap[0][0] <= now and self.in_flight < self.concurrency:
+            _, _, user_id, delivery = heapq.heappop(self._heap)
+            self.in_flight += 1
+            due.append((user_id, delivery))
+        return due
+
+    def done(self) -> None:
+        self.in_flight -= 1
+
+    def clear(self) -> None:
+        self._heap.clear()
+        self.in_flight = 0
+
+
+# Process-wide queue; drained by retry_tick via the Application's JobQueue.
+RETRIES = RetryQueue()
+
+
+def schedule_retry(user_data: Dict[Any, Any], user_id: int, chat_id: int, sends: List[Send],
+                   error: Exception, queue: RetryQueue = RETRIES, session: Optional[str] = None) -> bool:
+    """Queue the calls left after ``error`` on a first delivery attempt. Returns whether it will be retried.
+
+    ``session`` is the alert's delivery-ledger key; the final outcome is recorded under it.
+    """
+    DELIVERY_FAILURES.inc(kind=classify(error), attempt="first")
+    delay = retry_delay(error, 1)
+    if delay is None:
+        return False
+    delivery = {"chat_id": chat_id, "sends": list(sends), "attempt": 1,
+                "due": queue.clock() + delay, "error": type(error).__name__, "session": session}
+    user_data.setdefault(UD_RETRY, []).append(delivery)
+    queue.push(user_id, delivery)
+    return True
+
+
+def _forget(user_data: Dict[Any, Any], delivery: Dict[str, Any]) -> None:
+    pending = user_data.get(UD_RETRY) or []
+    for i, item in enumerate(pending):
+        if item is delivery:
+            del pending[i]
+            break
+    if not pending:
+        user_data.pop(UD_RETRY, None)
+
+
+async def retry_delivery(application: Application, user_id: int, delivery: Dict[str, Any],
+                         queue: RetryQueue = RETRIES, ledger: DeliveryLedger = LEDGER) -> None:
+    try:
+        with send_priority(PRIORITY_RETRY):
+            error = await deliver(application.bot, delivery["chat_id"], delivery["sends"])
+        delivery["attempt"] += 1
+        record_send(application.bot_data, delivery["chat_id"], error)
+        user_data = application.user_data[user_id]
+        if error is None:
+            RETRY_OUTCOMES.inc(outcome="delivered")
+            logger.info("Alert retry: delivered to %s for user %s after %d attempt(s)",
+                        delivery["chat_id"], user_id, delivery["attempt"])
+            _forget(user_data, delivery)
+            outcome = DELIVERED
+        else:
+            DELIVERY_FAILURES.inc(kind=classify(error), attempt="retry")
+            delay = retry_delay(error, delivery["attempt"])
+            if delay is None:
+                RETRY_OUTCOMES.inc(outcome="gave_up")
+                logger.warning("Alert retry: giving up on %s for user %s after %d attempt(s): %s",
+                               delivery["chat_id"], user_id, delivery["attempt"], error)
+                _forget(user_data, delivery)
+                outcome = FAILED
+            else:
+                RETRY_OUTCOMES.inc(outcome="rescheduled")
+                delivery["due"] = queue.clock() + delay
+                delivery["error"] = type(error).__name__
+                queue.push(user_id, delivery)
+                outcome = None
+        application.mark_data_for_update_persistence(user_ids=user_id)
+        if outcome is not None and delivery.get("session"):
+            await ledger.append(delivery["session"], delivery["chat_id"], outcome)
+    finally:
+        queue.done()
+
+
+async def retry_tick(context: ContextTypes.DEFAULT_TYPE) -> None:
+    application = context.application
+    for user_id, delivery in RETRIES.take_due():
+        application.create_task(retry_delivery(application, user_id, delivery),
+                                name=f"alert_retry_{user_id}_{delivery['chat_id']}")
+
+
+def schedule_retry_ticks(application: Application, interval: float = 1.0) -> None:
+    application.job_queue.run_repeating(retry_tick, interval=interval, first=interval, name="alert_retry_tick")
+
+
+def rehydrate_retries(application: Application, queue: RetryQueue = RETRIES) -> int:
+    """Queue the deliveries persisted in ``user_data``; overdue ones run on the first tick."""
+    count = 0
+    for user_id, user_data in application.user_data.items():
+        if owns_user(user_id):
+            for delivery in user_data.get(UD_RETRY) or ():
+                queue.push(user_id, delivery)
+                count += 1
+    if count:
+        logger.info("Re-queued %d alert delivery retry(ies)", count)
+    return count
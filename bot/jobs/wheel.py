@@ -0,0 +1,144 @@
+"""Deadline timer wheel.
+
+One APScheduler job per armed session is a heavy object, and arming or
+cancelling one goes through the scheduler's heap and lock. Sessions only need
+second resolution, so :class:`DeadlineWheel` buckets deadlines by absolute tick
+number: arming and cancelling are dict operations, and a single repeating
+JobQueue job (:func:`deadline_tick`) pops every bucket that has come due and
+runs :func:`bot.jobs.deadline.deadline_job` for each entry.
+"""
+import logging
+import math
+import time
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from telegram.ext import Application, ContextTypes
+
+from bot.constants import UD_ACTIVE
+from bot.jobs.deadline import deadline_job
+from bot.metrics import DEADLINE_LAG
+from bot.ordering import USER_LOCKS
+from bot.tracing import span
+from bot.utils.outbound import PRIORITY_ALERT, send_priority
+
+logger = logging.getLogger(__name__)
+
+
+class DeadlineEntry:
+    """An armed deadline. Quacks like ``telegram.ext.Job`` where ``deadline_job`` needs it."""
+
+    __slots__ = ("user_id", "chat_id", "deadline", "data", "tick")
+
+    def __init__(self, user_id: int, chat_id: int, deadline: float, data: Dict[str, Any], tick: int):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.deadline = deadline
+        self.data = data
+        self.tick = tick
+
+
+class DeadlineWheel:
+    """Deadlines bucketed by ``ceil(deadline / tick)``, keyed by user id (one session per user).
+
+    ``arm`` and ``cancel`` are O(1); ``advance`` costs O(ticks elapsed + entries due).
+    """
+
+    def __init__(self, tick: float = 1.0, clock=time.time):
+        self.tick = tick
+        self._clock = clock
+        self._buckets: Dict[int, Dict[int, DeadlineEntry]] = {}
+        self._entries: Dict[int, DeadlineEntry] = {}
+        self._last_tick = self._tick_of(clock())
+
+    def _tick_of(self, ts: float) -> int:
+        return math.floor(ts / self.tick)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def arm(self, user_id: int, deadline: float, chat_id: int, data: Dict[str, Any]) -> DeadlineEntry:
+        """Arm (or re-arm) ``user_id``'s deadline at epoch seconds ``deadline``.
+
+        The deadline goes in the first bucket at or after it, so it fires up to one
+        tick late but never early. Deadlines that are already due fire on the next tick.
+        """
+        self.cancel(user_id)
+        tick = max(math.ceil(deadline / self.tick), self._last_tick + 1)
+        entry = DeadlineEntry(user_id, chat_id, deadline, data, tick)
+        self._buckets.setdefault(tick, {})[user_id] = entry
+        self._entries[user_id] = entry
+        return entry
+
+    def get(self, user_id: int) -> Optional[DeadlineEntry]:
+        return self._entries.get(user_id)
+
+    def cancel(self, user_id: int) -> Optional[DeadlineEntry]:
+        entry = self._entries.pop(user_id, None)
+        if entry is None:
+            return None
+        bucket = self._buckets.get(entry.tick)
+        if bucket is not None:
+            bucket.pop(user_id, None)
+            if not bucket:
+                del self._buckets[entry.tick]
+        return entry
+
+    def advance(self, now: Optional[float] = None) -> List[DeadlineEntry]:
+        """Pop and return every entry whose tick has passed."""
+        now_tick = self._tick_of(self._clock() if now is None else now)
+        due: List[DeadlineEntry] = []
+        if now_tick <= self._last_tick:
+            return due
+        if now_tick - self._last_tick > len(self._buckets):
+            # Long gap (e.g. the loop was blocked): cheaper to walk the buckets than the ticks.
+            ticks = sorted(t for t in self._buckets if t <= now_tick)
+        else:
+            ticks = range(self._last_tick + 1, now_tick + 1)
+        for t in ticks:
+            bucket = self._buckets.pop(t, None)
+            if bucket:
+                for user_id, entry in bucket.items():
+                    del self._entries[user_id]
+                    due.append(entry)
+        self._last_tick = now_tick
+        return due
+
+
+# Process-wide wheel; driven by deadline_tick via the Application's JobQueue.
+DEADLINES = DeadlineWheel()
+
+
+def fire_deadline(application: Application, entry: DeadlineEntry) -> None:
+    context = application.context_types.context.from_job(entry, application)
+
+    async def _run() -> None:
+        iso = entry.data.get("deadline_iso")
+        deadline = datetime.fromisoformat(iso).timestamp() if iso else entry.deadline
+        lag = max(0.0, time.time() - deadline)
+        DEADLINE_LAG.observe(lag)
+        # Serialised with the runner's own updates: deadline_job clears user_data.
+        async with USER_LOCKS.hold(entry.user_id):
+            session = (context.user_data or {}).get(UD_ACTIVE) or {}
+            if iso and session.get("end_dt_utc") != iso:
+                # Completed, cancelled or replaced while this alert waited for the lock.
+                logger.info("Deadline for user %s no longer active; not alerting", entry.user_id)
+                return
+            with span("job", job="deadline", user=entry.user_id, lag_s=round(lag, 3)):
+                # Safety alerts go ahead of interactive replies in the outbound queue.
+                with send_priority(PRIORITY_ALERT):
+                    await deadline_job(context)
+                application.mark_data_for_update_persistence(chat_ids=entry.chat_id, user_ids=entry.user_id)
+
+    application.create_task(_run(), name=f"deadline_{entry.user_id}")
+
+
+async def deadline_tick(context: ContextTypes.DEFAULT_TYPE) -> None:
+    for entry in DEADLINES.advance():
+        fire_deadline(context.application, entry)
+
+
+def schedule_deadline_ticks(application: Application) -> None:
+    application.job_queue.run_repeating(
+        deadline_tick, interval=DEADLINES.tick, first=DEADLINES.tick, name="deadline_tick"
+    )
@@ -1,4 +1,6 @@
 import logging
+from typing import Optional
+
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -6,13 +8,26 @@ from telegram.ext import (
     ConversationHandler,
     CallbackQueryHandler,
     PicklePersistence,
+    TypeHandler,
     filters,
     Defaults
 )
 
+from telegram import Update
 from telegram.constants import ParseMode
-
-from bot.config import TELEGRAM_TOKEN, PERSISTENCE_FILE
+from telegram.request import BaseRequest
+
+from bot.config import (
+    TELEGRAM_TOKEN,
+    BOT_API_BASE_URL,
+    PERSISTENCE_FILE,
+    PERSISTENCE_BACKEND,
+    PERSISTENCE_COMPACT_EVERY,
+    PERSISTENCE_DB,
+    UPDATE_CONCURRENCY,
+)
+from bot.persistence.wal import WalPersistence
+from bot.persistence.sqlite import SqlitePersistence
 from bot.constants import ASK_LOCATION, ASK_TIME, ASK_CUSTOM_TIME
 from bot.handlers.start import (
     start,
@@ -26,6 +41,7 @@ from bot.handlers.start import (
     blacklist_cmd,
     bundle_cmd,
     contacts_cmd,
+    runners_cmd,
     stopalerts_cmd,
 )
 from bot.handlers.session import (
@@ -37,18 +53,57 @@ from bot.handlers.session import (
     free_gps_during_session,
     free_text_during_session,
 )
+from bot.handlers.admin import profile_cmd
+from bot.handlers.reachability import track_reachability
 from bot.handlers.errors import on_error
-
-def build_app() -> Application:
-    persistence = PicklePersistence(filepath=PERSISTENCE_FILE)
-
-    app = (
+from bot.jobs.retry import schedule_retry_ticks
+from bot.jobs.wheel import schedule_deadline_ticks
+from bot.metrics import count_update, instrument_handlers
+from bot.startup import post_init, post_shutdown
+from bot.sharding import SHARD
+from bot.ordering import OrderedUpdateProcessor
+from bot.utils.outbound import GLOBAL_RATE, OutboundScheduler
+
+def build_persistence():
+    if PERSISTENCE_BACKEND == "pickle":
+        return PicklePersistence(filepath=PERSISTENCE_FILE)
+    if PERSISTENCE_BACKEND == "wal":
+        return WalPersistence(PERSISTENCE_FILE, compact_every=PERSISTENCE_COMPACT_EVERY)
+    if PERSISTENCE_BACKEND == "sqlite":
+        return SqlitePersistence(PERSISTENCE_DB, legacy_file=PERSISTENCE_FILE)
+    raise SystemExit(f"Unknown STATE_BACKEND {PERSISTENCE_BACKEND!r} (expected wal, pickle or sqlite)")
+
+
+def build_app(persistence=None, request: Optional[BaseRequest] = None, throttle: bool = True) -> Application:
+    """Build the bot's Application.
+
+    ``persistence`` defaults to :func:`build_persistence`. ``request`` replaces
+    the HTTP transport (the load generator passes a stub), and ``throttle=False``
+    drops the outbound rate limiter so only the handler stack is measured.
+    """
+    builder = (
         Application.builder()
         .token(TELEGRAM_TOKEN)
-        .persistence(persistence)
+        .base_url(BOT_API_BASE_URL)
+        .persistence(persistence if persistence is not None else build_persistence())
         .defaults(Defaults(parse_mode=ParseMode.HTML))
-        .build()
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        # Different users' updates run concurrently, each user's in order;
+        # also opens the per-update trace span (no-op unless TRACE_FILE is set)
+        .concurrent_updates(OrderedUpdateProcessor(UPDATE_CONCURRENCY))
     )
+    if throttle:
+        # Every outgoing request goes through one rate-limited, prioritised queue.
+        # The global limit is per token, so sharded workers split it between them.
+        # Per-chat buckets are per process and are not coordinated: alerts to a contact
+        # come from each runner's worker, and the contact's own replies from theirs.
+        # A mass deadline can therefore still exceed a chat's ~1 msg/s. The 429
+        # (RetryAfter) is then retried here, and after that by bot.jobs.retry.
+        builder = builder.rate_limiter(OutboundScheduler(global_rate=GLOBAL_RATE / SHARD.count))
+    if request is not None:
+        builder = builder.request(request).get_updates_request(request)
+    app = builder.build()
 
     # Deep-link /start with parameter *before* bare /start so it can catch the param variant
     app.add_handler(
@@ -71,7 +126,9 @@ def build_app() -> Application:
     app.add_handler(CommandHandler("blacklist", blacklist_cmd))
     app.add_handler(CommandHandler("bundle", bundle_cmd))
     app.add_handler(CommandHandler("contacts", contacts_cmd))
+    app.add_handler(CommandHandler("runners", runners_cmd))
     app.add_handler(CommandHandler("stopalerts", stopalerts_cmd))
+    app.add_handler(CommandHandler("profile", profile_cmd))
 
     # Exercise flow
     conv = ConversationHandler(
@@ -103,6 +160,17 @@ def build_app() -> Application:
     app.add_handler(MessageHandler(filters.LOCATION, free_gps_during_session))
     app.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, free_text_during_session))
 
+    # Metrics: time every handler above, and count updates before any of them run
+    instrument_handlers(app)
+    app.add_handler(TypeHandler(Update, count_update), group=-1)
+    # Who the bot can message (alerts skip blocked contacts); its own group so both run
+    app.add_handler(TypeHandler(Update, track_reachability), group=-2)
+
+    # One repeating job drives every armed deadline, another the alert delivery retries
+    if app.job_queue is not None:
+        schedule_deadline_ticks(app)
+        schedule_retry_ticks(app)
+
     return app
 
 
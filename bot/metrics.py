@@ -0,0 +1,260 @@
+"""Prometheus metrics in the text exposition format, served on a side port.
+
+A tiny in-process registry (counters, histograms and callback gauges) keeps the
+bot free of extra dependencies. Instrumentation points:
+
+* handler latency: :func:`instrument_handlers` wraps every handler callback;
+* update counts by type: :func:`count_update`, a group ``-1`` TypeHandler;
+* Bot API latency and send failures: :class:`bot.utils.outbound.OutboundScheduler`;
+* deadline firing lag: :func:`bot.jobs.wheel.fire_deadline`;
+* alert delivery failures and retry outcomes: :mod:`bot.jobs.retry`;
+* armed sessions and queue depths: gauges registered in ``post_init``.
+
+Set ``METRICS_PORT`` to expose ``GET /metrics`` (see :func:`start_metrics_server`).
+"""
+import asyncio
+import functools
+import logging
+import math
+import time
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+from telegram import Update
+from telegram.ext import Application, BaseHandler, ConversationHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+LAG_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels[n]) for n in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        return self.header() + [
+            f"{self.name}{_labels(self.labelnames, key)} {_number(v)}" for key, v in sorted(self._values.items())
+        ]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets: Iterable[float] = LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (math.inf,)
+        # labels -> [per-bucket counts..., sum, count]
+        self._values: Dict[Tuple[str, ...], List[float]] = {}
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        row = self._values.get(key)
+        if row is None:
+            row = self._values[key] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                row[i] += 1
+                break
+        row[-2] += value
+        row[-1] += 1
+
+    def count(self, **labels) -> int:
+        row = self._values.get(self._key(labels))
+        return int(row[-1]) if row else 0
+
+    def render(self) -> List[str]:
+        lines = self.header()
+        for key, row in sorted(self._values.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets, row):
+                cumulative += n
+                le = 'le="%s"' % _number(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labelnames, key)} {_number(row[-2])}")
+            lines.append(f"{self.name}_count{_labels(self.labelnames, key)} {int(row[-1])}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback."""
+
+    kind = "gauge"
+
+    def __init__(self, name, documentation, fn: Callable[[], float]):
+        super().__init__(name, documentation)
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception:
+            logger.exception("metrics: gauge %s failed", self.name)
+            return []
+        return self.header() + [f"{self.name} {_number(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _register(self, metric: _Metric) -> _Metric:
+        existing = self._metrics.get(metric.name)
+        if existing is not None and not isinstance(existing, Gauge):
+            return existing
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name: str, documentation: str, fn: Callable[[], float]) -> Gauge:
+        """Register (or re-point) a callback gauge."""
+        return self._register(Gauge(name, documentation, fn))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Registry()
+
+HANDLER_SECONDS = METRICS.histogram(
+    "saferunner_handler_seconds", "Time spent in each update handler callback.", ("handler",)
+)
+UPDATES = METRICS.counter("saferunner_updates_total", "Updates received, by update type.", ("type",))
+API_SECONDS = METRICS.histogram(
+    "saferunner_bot_api_seconds", "Bot API request latency, by method (excludes rate-limit wait).", ("method",)
+)
+SEND_WAIT = METRICS.histogram(
+    "saferunner_outbound_wait_seconds", "Time a send waited on the outbound rate limiter, by priority.", ("priority",)
+)
+SEND_FAILURES = METRICS.counter(
+    "saferunner_bot_api_failures_total", "Failed Bot API requests, by method and error class.", ("method", "error")
+)
+DEADLINE_LAG = METRICS.histogram(
+    "saferunner_deadline_lag_seconds", "Deadline alert start time minus the session's deadline.", buckets=LAG_BUCKETS
+)
+
+
+# ---------- handlers ----------
+
+def _timed(callback, name: str):
+    @functools.wraps(callback)
+    async def wrapper(update, context):
+        start = time.perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            HANDLER_SECONDS.observe(time.perf_counter() - start, handler=name)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _instrument(handler: BaseHandler) -> None:
+    if isinstance(handler, ConversationHandler):
+        for child in handler.entry_points + handler.fallbacks:
+            _instrument(child)
+        for handlers in handler.states.values():
+            for child in handlers:
+                _instrument(child)
+        return
+    if not getattr(handler.callback, "timed", False):
+        handler.callback = _timed(handler.callback, handler.callback.__name__)
+
+
+def instrument_handlers(application: Application) -> None:
+    """Time every registered handler callback (including those inside conversations)."""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            _instrument(handler)
+
+
+def update_type(update: Update) -> str:
+    for kind in Update.ALL_TYPES:
+        if getattr(update, kind, None) is not None:
+            return str(kind)
+    return "unknown"
+
+
+async def count_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    UPDATES.inc(type=update_type(update))
+
+
+# ---------- HTTP ----------
+
+async def _serve(registry: Registry, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), 5)
+        while (await asyncio.wait_for(reader.readline(), 5)) not in (b"\r\n", b"\n", b""):
+            pass
+        parts = request_line.decode("latin-1").split()
+        if len(parts) >= 2 and parts[0] == "GET" and parts[1].split("?")[0] == "/metrics":
+            status, body = "200 OK", registry.render().encode()
+        else:
+            status, body = "404 Not Found", b"not found\n"
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+            f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n".encode() + body
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(host: str, port: int, registry: Registry = METRICS) -> asyncio.AbstractServer:
+    """Serve ``GET /metrics`` for ``registry`` on ``host:port`` from the bot's event loop."""
+    server = await asyncio.start_server(functools.partial(_serve, registry), host, port)
+    logger.info("Metrics on http://%s:%s/metrics", host, server.sockets[0].getsockname()[1])
+    return server
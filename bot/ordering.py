@@ -0,0 +1,85 @@
+"""Concurrent update processing that keeps each user's updates in order.
+
+Updates from different users run concurrently (up to ``UPDATE_CONCURRENCY``),
+but a user's updates run one at a time, in the order they arrived. The
+``exercise_flow`` conversation state and ``user_data`` are only touched by
+their own user's updates, so they stay race-free without locks in the handlers.
+
+:data:`USER_LOCKS` is also taken by work that is not an update but mutates a
+user's ``user_data`` (the deadline job in :mod:`bot.jobs.wheel`).
+
+Shared ``bot_data`` needs no lock: every function in :mod:`bot.utils.contacts`
+mutates it without awaiting, so each call is atomic on the event loop (and one
+autocommit statement with the SQLite store).
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Hashable, List, Optional
+
+from bot.tracing import TracingUpdateProcessor
+
+
+class KeyedLocks:
+    """``asyncio.Lock`` per key, created on demand and dropped once nobody holds or waits for it.
+
+    Waiters are served in arrival order, which is what keeps a user's updates ordered.
+    """
+
+    def __init__(self):
+        # key -> [lock, holders + waiters]
+        self._locks: Dict[Hashable, List[Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def locked(self, key: Hashable) -> bool:
+        slot = self._locks.get(key)
+        return slot is not None and slot[0].locked()
+
+    @asynccontextmanager
+    async def hold(self, key: Hashable):
+        slot = self._locks.get(key)
+        if slot is None:
+            slot = self._locks[key] = [asyncio.Lock(), 0]
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._locks[key]
+
+
+USER_LOCKS = KeyedLocks()
+
+
+def update_key(update: object) -> Optional[int]:
+    """Whose updates must not overlap: the sender, else the chat (channel posts, etc.)."""
+    user = getattr(update, "effective_user", None)
+    if user is not None:
+        return user.id
+    chat = getattr(update, "effective_chat", None)
+    return chat.id if chat is not None else None
+
+
+class OrderedUpdateProcessor(TracingUpdateProcessor):
+    """Up to ``max_concurrent_updates`` updates at once, but one at a time per user.
+
+    The user's lock is taken before a concurrency slot, so a user with a backlog
+    occupies one slot rather than all of them. A caller that awaits
+    :meth:`process_update` waits on that lock too; :class:`bot.ingress.UpdateIngress`
+    therefore hands over one update per user at a time.
+    """
+
+    def __init__(self, max_concurrent_updates: int, locks: KeyedLocks = USER_LOCKS):
+        super().__init__(max_concurrent_updates)
+        self.locks = locks
+
+    async def process_update(self, update: object, coroutine) -> None:
+        key = update_key(update)
+        if key is None:
+            await super().process_update(update, coroutine)
+            return
+        async with self.locks.hold(key):
+            await super().process_update(update, coroutine)
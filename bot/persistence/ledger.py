@@ -0,0 +1,245 @@
+"""Delivery ledger: what happened to each contact's alert, per session.
+
+``deadline_job`` alerts contacts concurrently and only clears the session once
+it has sent the runner's summary. Without a record of which contacts were
+already reached, a crash partway through re-fires the whole alert after the
+restart: some contacts are alerted twice, and if the session had been persisted
+as cleared, the ones left are never alerted at all.
+
+:class:`DeliveryLedger` keeps one outcome per (session, contact) and one
+``closed`` mark per session, appended as JSON lines to its own file. Each
+outcome is written as soon as that contact's delivery finishes. Outcomes that
+finish during the same event-loop iteration share one write (and one ``fsync``
+when enabled): the first append starts a batch, the write runs on the next
+loop iteration, and every append in the batch returns once it is on disk.
+
+On restart :meth:`DeliveryLedger.open` replays the file, drops sessions not
+touched for ``keep_seconds`` and rewrites what is left. Each worker of a
+cluster (:mod:`bot.cluster`) writes its own ``<file>.<n>`` but replays every
+sibling file too, so a runner whose shard changed with ``WEBHOOK_WORKERS``
+still resumes. A re-fired deadline
+then alerts only the contacts without an outcome, and a closed session is not
+alerted again. One window remains: if a send succeeds and the process dies
+before the batch is written, that contact is alerted again after the restart.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from bot.sharding import owns_user
+from bot.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Per-contact outcomes
+DELIVERED = "delivered"
+FAILED = "failed"           # permanent error, or retries exhausted
+RETRYING = "retrying"       # handed to bot.jobs.retry
+BLOCKED = "blocked"         # skipped: the contact blocked the bot
+OPTED_OUT = "opted_out"     # skipped: the contact blacklisted the runner
+# Per-session mark: alerts done and the runner's summary sent
+CLOSED = "closed"
+
+
+def session_key(owner_id: int, deadline_iso: Optional[str]) -> str:
+    """Ledger key of the session ending at ``deadline_iso``.
+
+    Without a deadline there is nothing to resume by, so the key is unique.
+    """
+    return f"{owner_id}@{deadline_iso or uuid.uuid4().hex}"
+
+
+class DeliveryLedger:
+    """Outcomes by session key and contact id, appended to ``path`` in batches.
+
+    Args:
+        path: JSON-lines file. ``None`` keeps the ledger in memory only (see :meth:`open`).
+        fsync: Whether to ``fsync`` after each batch.
+        keep_seconds: On open, drop sessions whose last record is older than this.
+        compact_every: Rewrite the file after this many records.
+    """
+
+    def __init__(self, path=None, fsync: bool = False, keep_seconds: float = 86400.0,
+                 compact_every: int = 10000, clock=time.time):
+        self.path = Path(path) if path else None
+        self.fsync = fsync
+        self.keep_seconds = keep_seconds
+        self.compact_every = max(int(compact_every), 1)
+        self.clock = clock
+        self.writes = 0             # batches written since open
+        self._sessions: Dict[str, Dict[int, str]] = {}
+        self._touched: Dict[str, float] = {}
+        self._closed: Set[str] = set()
+        self._file = None
+        self._buffer: List[str] = []
+        self._batch: Optional[asyncio.Future] = None
+        self._records = 0
+        self._pruned_at = clock()
+
+    def __len__(self) -> int:
+        return len(self._touched)
+
+    # ---------- reading ----------
+
+    def outcomes(self, key: str) -> Dict[int, str]:
+        """Contact id -> outcome recorded for session ``key``."""
+        return dict(self._sessions.get(key, ()))
+
+    def is_closed(self, key: str) -> bool:
+        return key in self._closed
+
+    # ---------- file handling ----------
+
+    def open(self, path=None, siblings: Iterable[Path] = ()) -> None:
+        """Load ``path`` (default: the constructor's), compact it and append to it from now on.
+
+        ``siblings`` are other ledger files to take this shard's sessions over from, e.g.
+        those of a cluster with a different worker count (see :func:`ledger_files`).
+        Their records are merged with this file's in time order; the files themselves
+        are left alone.
+        """
+        self.close()
+        if path is not None:
+            self.path = Path(path)
+        if self.path is None:
+            return
+        self.clear()
+        records = []
+        for file in {Path(f) for f in siblings} - {self.path}:
+            records += [r for r in self._read(file) if owns_user(_owner(r[0]))]
+        records += self._read(self.path)
+        for record in sorted(records, key=lambda r: r[3]):
+            self._apply(*record)
+        self._compact()
+
+    def close(self) -> None:
+        """Write any pending batch and close the file."""
+        if self._batch is not None:
+            self._flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def clear(self) -> None:
+        """Forget every session in memory (the file is left alone)."""
+        self._sessions.clear()
+        self._touched.clear()
+        self._closed.clear()
+
+    @staticmethod
+    def _read(path: Path) -> List[Tuple[str, Optional[int], str, float]]:
+        try:
+            file = path.open("r", encoding="utf-8")
+        except FileNotFoundError:
+            return []
+        records = []
+        with file:
+            for line in file:
+                try:
+                    key, contact_id, outcome, ts = json.loads(line)
+                except ValueError:
+                    # A crash mid-write leaves a torn last line; compaction drops it.
+                    logger.warning("Delivery ledger: skipping unreadable record in %s", path)
+                    continue
+                records.append((key, contact_id, outcome, ts))
+        return records
+
+    def _apply(self, key: str, contact_id: Optional[int], outcome: str, ts: float) -> None:
+        self._touched[key] = ts
+        if outcome == CLOSED:
+            self._closed.add(key)
+        else:
+            self._sessions.setdefault(key, {})[contact_id] = outcome
+
+    @traced("ledger.compact")
+    def _compact(self) -> None:
+        """Rewrite the file with the sessions touched within ``keep_seconds``."""
+        self._prune(self.clock())
+        lines = []
+        for key, ts in self._touched.items():
+            lines += [_line(key, cid, outcome, ts) for cid, outcome in self._sessions.get(key, {}).items()]
+            if key in self._closed:
+                lines.append(_line(key, None, CLOSED, ts))
+        if self._file is not None:
+            self._file.close()
+        tmp = self.path.with_name(self.path.name + ".tmp")
+        with tmp.open("w", encoding="utf-8") as file:
+            file.write("".join(lines))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+        self._file = self.path.open("a", encoding="utf-8")
+        self._records = len(lines)
+
+    def _prune(self, now: float) -> None:
+        """Forget sessions not touched within ``keep_seconds``."""
+        horizon = now - self.keep_seconds
+        for key in [k for k, ts in self._touched.items() if ts < horizon]:
+            del self._touched[key]
+            self._sessions.pop(key, None)
+            self._closed.discard(key)
+        self._pruned_at = now
+
+    # ---------- appending ----------
+
+    async def append(self, key: str, contact_id: Optional[int], outcome: str) -> None:
+        """Record ``outcome`` for ``contact_id`` (``None`` with ``CLOSED``); returns once it is written."""
+        ts = self.clock()
+        self._apply(key, contact_id, outcome, ts)
+        # Memory-only ledgers are never compacted, so prune here too (at most once per hour by default).
+        if ts - self._pruned_at >= self.keep_seconds / 24:
+            self._prune(ts)
+        if self._file is None:
+            return
+        self._buffer.append(_line(key, contact_id, outcome, ts))
+        batch = self._batch
+        if batch is None:
+            loop = asyncio.get_running_loop()
+            batch = self._batch = loop.create_future()
+            loop.call_soon(self._flush)
+        # Shielded: a cancelled caller must not cancel the batch it shares with others.
+        await asyncio.shield(batch)
+
+    @traced("ledger.append")
+    def _flush(self) -> None:
+        batch, self._batch = self._batch, None
+        if batch is None:
+            return                  # already written by close()
+        lines, self._buffer = self._buffer, []
+        try:
+            self._file.write("".join(lines))
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+            self.writes += 1
+            self._records += len(lines)
+            if self._records >= self.compact_every:
+                self._compact()
+        except OSError:
+            # Alerts matter more than their bookkeeping: log and carry on.
+            logger.exception("Delivery ledger: failed to write %d record(s) to %s", len(lines), self.path)
+        batch.set_result(None)
+
+
+def ledger_files(base) -> List[Path]:
+    """``base`` and every ``base.<n>`` next to it: the ledgers of one process or of any cluster size."""
+    base = Path(base)
+    shards = [p for p in base.parent.glob(f"{base.name}.*") if p.suffix[1:].isdigit()]
+    return [base, *sorted(shards)]
+
+
+def _owner(key: str) -> int:
+    return int(key.split("@", 1)[0])
+
+
+def _line(key: str, contact_id: Optional[int], outcome: str, ts: float) -> str:
+    return json.dumps([key, contact_id, outcome, round(ts, 3)]) + "\n"
+
+
+# Process-wide ledger; opened on DELIVERY_LEDGER_FILE by bot.startup.post_init.
+LEDGER = DeliveryLedger()
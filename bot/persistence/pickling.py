@@ -0,0 +1,30 @@
+"""Pickle helpers shared by the persistence backends.
+
+PTB's own (un)pickler keeps Bot references out of the files, exactly as
+``PicklePersistence`` does. It is private API, but python-telegram-bot is
+pinned in requirements.txt.
+"""
+import io
+import pickle
+from typing import Any, Optional
+
+from telegram import Bot
+from telegram.ext._picklepersistence import _BotPickler, _BotUnpickler
+
+
+def dumps(bot: Optional[Bot], obj: object) -> bytes:
+    if bot is None:
+        return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
+    buf = io.BytesIO()
+    _BotPickler(bot, buf, protocol=pickle.HIGHEST_PROTOCOL).dump(obj)
+    return buf.getvalue()
+
+
+def unpickler(bot: Optional[Bot], file) -> pickle.Unpickler:
+    if bot is None:
+        return pickle.Unpickler(file)
+    return _BotUnpickler(bot, file)
+
+
+def loads(bot: Optional[Bot], data: bytes) -> Any:
+    return unpickler(bot, io.BytesIO(data)).load()
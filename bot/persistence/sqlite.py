@@ -0,0 +1,393 @@
+"""SQLite-backed state.
+
+:class:`SqliteStore` keeps the contact graph (contacts, blacklists), chat
+reachability and the armed sessions in indexed tables, so ``bot/utils/contacts.py``
+(and ``bot/utils/reachability.py``) can answer with one indexed query instead of holding the whole graph in ``bot_data``.
+
+:class:`SqlitePersistence` stores everything else PTB persists (user_data,
+chat_data, the remaining bot_data keys, conversations) as one row per key and
+hands the live store to handlers as ``bot_data[BD_STORE]``.
+"""
+import json
+import logging
+import pickle
+import sqlite3
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.constants import (
+    BD_AUDIENCE, BD_BLACKLIST, BD_CONTACTS, BD_OWNERS, BD_REACH, BD_SCHEMA, BD_STORE, UD_ACTIVE,
+)
+from bot.persistence import pickling
+from bot.utils.contacts import members_of
+from bot.utils.reachability import REACHABLE
+from bot.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# meta key set once the legacy STATE_FILE import has committed (or there was nothing to import)
+_LEGACY_IMPORT = "legacy_import"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS contacts (
+    owner_id   INTEGER NOT NULL,
+    contact_id INTEGER NOT NULL,
+    PRIMARY KEY (owner_id, contact_id)
+);
+CREATE INDEX IF NOT EXISTS contacts_by_contact ON contacts (contact_id);
+
+CREATE TABLE IF NOT EXISTS blacklist (
+    contact_id INTEGER NOT NULL,
+    runner_id  INTEGER NOT NULL,
+    PRIMARY KEY (contact_id, runner_id)
+);
+CREATE INDEX IF NOT EXISTS blacklist_by_runner ON blacklist (runner_id);
+
+CREATE TABLE IF NOT EXISTS reachability (
+    chat_id INTEGER PRIMARY KEY,
+    state   INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS sessions (
+    user_id    INTEGER PRIMARY KEY,
+    end_dt_utc TEXT,
+    location   TEXT
+);
+CREATE INDEX IF NOT EXISTS sessions_by_end ON sessions (end_dt_utc);
+
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+
+CREATE TABLE IF NOT EXISTS user_data (user_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS chat_data (chat_id INTEGER PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS bot_data (key TEXT PRIMARY KEY, data BLOB NOT NULL);
+CREATE TABLE IF NOT EXISTS conversations (
+    name  TEXT NOT NULL,
+    key   BLOB NOT NULL,
+    state BLOB,
+    PRIMARY KEY (name, key)
+);
+"""
+
+
+class SqliteStore:
+    """Contact graph, blacklist, reachability and session tables in one SQLite file (WAL mode)."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        # Autocommit: every statement below is its own (small) transaction.
+        self.conn = sqlite3.connect(str(self.path), isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self._reachable: Set[int] = set()  # chats this process has written as REACHABLE
+
+    def __deepcopy__(self, memo):
+        # Application.update_persistence deep-copies bot_data; the handle is shared.
+        return self
+
+    def close(self) -> None:
+        self.conn.close()
+
+    # ---------- contacts ----------
+
+    def add_contact(self, owner_id: int, contact_id: int) -> bool:
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO contacts (owner_id, contact_id) VALUES (?, ?)", (owner_id, contact_id)
+        )
+        return cur.rowcount > 0
+
+    def list_contacts(self, owner_id: int) -> List[int]:
+        rows = self.conn.execute(
+            "SELECT contact_id FROM contacts WHERE owner_id = ? ORDER BY rowid", (owner_id,)
+        )
+        return [r[0] for r in rows]
+
+    def list_owners(self, contact_id: int) -> List[int]:
+        rows = self.conn.execute(
+            "SELECT owner_id FROM contacts WHERE contact_id = ? ORDER BY rowid", (contact_id,)
+        )
+        return [r[0] for r in rows]
+
+    def list_audience(self, owner_id: int) -> List[int]:
+        """Contacts of ``owner_id`` that have not blacklisted them (blacklist PK lookup per row)."""
+        rows = self.conn.execute(
+            "SELECT c.contact_id FROM contacts c WHERE c.owner_id = ? AND NOT EXISTS ("
+            "SELECT 1 FROM blacklist b WHERE b.contact_id = c.contact_id AND b.runner_id = c.owner_id"
+            ") ORDER BY c.rowid",
+            (owner_id,),
+        )
+        return [r[0] for r in rows]
+
+    def remove_contact(self, owner_id: int, contact_id: int) -> bool:
+        cur = self.conn.execute(
+            "DELETE FROM contacts WHERE owner_id = ? AND contact_id = ?", (owner_id, contact_id)
+        )
+        return cur.rowcount > 0
+
+    def remove_contact_everywhere(self, contact_id: int) -> int:
+        cur = self.conn.execute("DELETE FROM contacts WHERE contact_id = ?", (contact_id,))
+        return cur.rowcount
+
+    # ---------- blacklist ----------
+
+    def blacklist_add(self, contact_id: int, runner_id: int) -> bool:
+        cur = self.conn.execute(
+            "INSERT OR IGNORE INTO blacklist (contact_id, runner_id) VALUES (?, ?)", (contact_id, runner_id)
+        )
+        return cur.rowcount > 0
+
+    def blacklist_remove(self, contact_id: int, runner_id: int) -> bool:
+        cur = self.conn.execute(
+            "DELETE FROM blacklist WHERE contact_id = ? AND runner_id = ?", (contact_id, runner_id)
+        )
+        return cur.rowcount > 0
+
+    def blacklist_list(self, contact_id: int) -> List[int]:
+        rows = self.conn.execute(
+            "SELECT runner_id FROM blacklist WHERE contact_id = ? ORDER BY rowid", (contact_id,)
+        )
+        return [r[0] for r in rows]
+
+    # ---------- reachability ----------
+
+    def set_reachability(self, chat_id: int, state: int) -> bool:
+        # Called with REACHABLE for every private-chat update, so those writes are skipped once this
+        # process has made one. A block is always written; Telegram also reports it (my_chat_member)
+        # to the chat's own worker, which drops the chat from its cache.
+        if state == REACHABLE and chat_id in self._reachable:
+            return False
+        cur = self.conn.execute(
+            "INSERT INTO reachability (chat_id, state) VALUES (?, ?) "
+            "ON CONFLICT (chat_id) DO UPDATE SET state = excluded.state WHERE state != excluded.state",
+            (chat_id, state),
+        )
+        if state == REACHABLE:
+            self._reachable.add(chat_id)
+        else:
+            self._reachable.discard(chat_id)
+        return cur.rowcount > 0
+
+    def reachability(self, chat_ids: List[int]) -> Dict[int, int]:
+        states: Dict[int, int] = {}
+        for i in range(0, len(chat_ids), 500):
+            chunk = chat_ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT chat_id, state FROM reachability WHERE chat_id IN ({','.join('?' * len(chunk))})", chunk
+            )
+            states.update(rows)
+        return states
+
+    # ---------- sessions ----------
+
+    def save_session(self, user_id: int, session: Optional[Dict[str, Any]]) -> None:
+        if not session or not session.get("end_dt_utc"):
+            self.conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+            return
+        self.conn.execute(
+            "INSERT OR REPLACE INTO sessions (user_id, end_dt_utc, location) VALUES (?, ?, ?)",
+            (user_id, session["end_dt_utc"], json.dumps(session.get("location"))),
+        )
+
+    def iter_sessions(self) -> Iterator[Tuple[int, str, Optional[Dict[str, Any]]]]:
+        """Armed sessions ordered by deadline: (user_id, end_dt_utc iso, location)."""
+        rows = self.conn.execute("SELECT user_id, end_dt_utc, location FROM sessions ORDER BY end_dt_utc")
+        for user_id, end_iso, location in rows:
+            yield user_id, end_iso, json.loads(location) if location else None
+
+    # ---------- migration ----------
+
+    def get_meta(self, key: str) -> Optional[str]:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key: str, value: str) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, value))
+
+    def import_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        """Move dict-based contacts/blacklists/reachability (pickle/WAL layout) into the tables."""
+        with self.conn:
+            self.conn.execute("BEGIN")
+            self._import_bot_data(bot_data)
+
+    def _import_bot_data(self, bot_data: Dict[str, Any]) -> None:
+        # Runs inside the caller's transaction.
+        contacts = bot_data.pop(BD_CONTACTS, None) or {}
+        blacklist = bot_data.pop(BD_BLACKLIST, None) or {}
+        bot_data.pop(BD_OWNERS, None)  # the contacts_by_contact index replaces it
+        bot_data.pop(BD_AUDIENCE, None)  # derived by list_audience()
+        bot_data.pop(BD_SCHEMA, None)
+        reach = bot_data.pop(BD_REACH, None) or {}
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO contacts (owner_id, contact_id) VALUES (?, ?)",
+            ((int(owner), int(cid)) for owner, value in contacts.items() for cid in members_of(value)),
+        )
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO blacklist (contact_id, runner_id) VALUES (?, ?)",
+            ((int(contact), int(rid)) for contact, value in blacklist.items() for rid in members_of(value)),
+        )
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO reachability (chat_id, state) VALUES (?, ?)", reach.items()
+        )
+
+
+class SqlitePersistence(BasePersistence):
+    """One row per user/chat/bot_data key/conversation key, next to the :class:`SqliteStore` tables.
+
+    Args:
+        filepath: SQLite database path (``STATE_DB``).
+        legacy_file: Optional pickle/WAL snapshot (``STATE_FILE``) imported once, in a
+            single transaction that also sets the ``legacy_import`` meta marker. Until
+            the marker is set (a crash or unreadable file), every start tries again.
+        store_data: Which kinds of data to persist. Callback data is not used by the bot.
+        update_interval: Seconds between two persistence updates by the Application.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        legacy_file=None,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+    ):
+        super().__init__(store_data=store_data or PersistenceInput(callback_data=False), update_interval=update_interval)
+        self.filepath = Path(filepath)
+        self.legacy_file = Path(legacy_file) if legacy_file else None
+        self.store: Optional[SqliteStore] = None
+        self._bot_data: Dict[str, Any] = {}
+
+    def _open(self) -> SqliteStore:
+        if self.store is None:
+            self.store = SqliteStore(self.filepath)
+            if self.store.get_meta(_LEGACY_IMPORT) is None:
+                if self.legacy_file and self.legacy_file.exists():
+                    try:
+                        self._import_legacy()
+                    except BaseException:
+                        self.store.close()
+                        self.store = None
+                        raise
+                else:
+                    # Nothing to import; a STATE_FILE appearing later must not overwrite live data.
+                    self.store.set_meta(_LEGACY_IMPORT, "none")
+        return self.store
+
+    def _import_legacy(self) -> None:
+        with self.legacy_file.open("rb") as file:
+            data = pickling.unpickler(self.bot, file).load()
+        bot_data = data.get("bot_data") or {}
+        conn = self.store.conn
+        # One transaction, marker included: a failure part-way leaves nothing behind and is retried.
+        with conn:
+            conn.execute("BEGIN")
+            self.store._import_bot_data(bot_data)
+            for user_id, ud in (data.get("user_data") or {}).items():
+                self._write_user(user_id, ud)
+            for chat_id, cd in (data.get("chat_data") or {}).items():
+                conn.execute("INSERT OR REPLACE INTO chat_data VALUES (?, ?)", (chat_id, self._dumps(cd)))
+            for key, value in bot_data.items():
+                conn.execute("INSERT OR REPLACE INTO bot_data VALUES (?, ?)", (key, self._dumps(value)))
+            for name, conv in (data.get("conversations") or {}).items():
+                for key, state in conv.items():
+                    conn.execute(
+                        "INSERT OR REPLACE INTO conversations VALUES (?, ?, ?)",
+                        (name, pickle.dumps(key), self._dumps(state)),
+                    )
+            self.store.set_meta(_LEGACY_IMPORT, str(self.legacy_file))
+        logger.info("SqlitePersistence: imported %s into %s", self.legacy_file, self.filepath)
+
+    def _dumps(self, obj: object) -> bytes:
+        return pickling.dumps(self.bot, obj)
+
+    def _loads(self, data: bytes) -> Any:
+        return pickling.loads(self.bot, data)
+
+    def _write_user(self, user_id: int, data) -> None:
+        self.store.conn.execute("INSERT OR REPLACE INTO user_data VALUES (?, ?)", (user_id, self._dumps(data)))
+        self.store.save_session(user_id, (data or {}).get(UD_ACTIVE))
+
+    # ---------- BasePersistence: loading ----------
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        rows = self._open().conn.execute("SELECT user_id, data FROM user_data")
+        return {uid: self._loads(data) for uid, data in rows}
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        rows = self._open().conn.execute("SELECT chat_id, data FROM chat_data")
+        return {cid: self._loads(data) for cid, data in rows}
+
+    async def get_bot_data(self) -> Dict[str, Any]:
+        store = self._open()
+        rows = store.conn.execute("SELECT key, data FROM bot_data")
+        self._bot_data = {key: self._loads(data) for key, data in rows}
+        bot_data = deepcopy(self._bot_data)
+        bot_data[BD_STORE] = store
+        return bot_data
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str):
+        rows = self._open().conn.execute("SELECT key, state FROM conversations WHERE name = ?", (name,))
+        return {pickle.loads(key): self._loads(state) for key, state in rows}
+
+    # ---------- BasePersistence: updates ----------
+
+    @traced("persistence.write")
+    async def update_user_data(self, user_id: int, data) -> None:
+        self._open()
+        self._write_user(user_id, data)
+
+    @traced("persistence.write")
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        self._open().conn.execute("INSERT OR REPLACE INTO chat_data VALUES (?, ?)", (chat_id, self._dumps(data)))
+
+    @traced("persistence.write")
+    async def update_bot_data(self, data) -> None:
+        conn = self._open().conn
+        data = {k: v for k, v in data.items() if k != BD_STORE}
+        changed = [(k, v) for k, v in data.items() if k not in self._bot_data or self._bot_data[k] != v]
+        removed = self._bot_data.keys() - data.keys()
+        if not changed and not removed:
+            return
+        with conn:
+            conn.execute("BEGIN")
+            for key, value in changed:
+                conn.execute("INSERT OR REPLACE INTO bot_data VALUES (?, ?)", (key, self._dumps(value)))
+            for key in removed:
+                conn.execute("DELETE FROM bot_data WHERE key = ?", (key,))
+        self._bot_data = data
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    @traced("persistence.write")
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._open().conn.execute(
+            "INSERT OR REPLACE INTO conversations VALUES (?, ?, ?)",
+            (name, pickle.dumps(key), self._dumps(new_state)),
+        )
+
+    async def drop_user_data(self, user_id: int) -> None:
+        conn = self._open().conn
+        conn.execute("DELETE FROM user_data WHERE user_id = ?", (user_id,))
+        conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._open().conn.execute("DELETE FROM chat_data WHERE chat_id = ?", (chat_id,))
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        if self.store is not None:
+            self.store.close()
+            self.store = None
@@ -0,0 +1,289 @@
+"""Write-ahead-log persistence.
+
+``PicklePersistence`` re-pickles the whole state (all users, all of ``bot_data``
+and every conversation) whenever one of its ``update_*`` hooks reports a change.
+:class:`WalPersistence` instead appends one small record per changed key to a
+log next to the snapshot and only rewrites the snapshot every
+``compact_every`` records, so a flush costs time in proportion to what
+changed rather than to the total state size.
+
+The snapshot uses the exact single-file layout of ``PicklePersistence``: an
+existing ``STATE_FILE`` is picked up as the initial snapshot, and a compacted
+snapshot can be read back by ``PicklePersistence`` if we ever need to switch
+back.
+"""
+import logging
+import os
+import pickle
+from copy import deepcopy
+from pathlib import Path
+from typing import Any, Dict, Optional, Tuple
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+from bot.persistence import pickling
+from bot.tracing import traced
+
+logger = logging.getLogger(__name__)
+
+# Log record kinds: (kind, key, value)
+_USER_SET = "user_set"
+_USER_DEL = "user_del"
+_CHAT_SET = "chat_set"
+_CHAT_DEL = "chat_del"
+_BOT_SET = "bot_set"            # key: top-level bot_data key
+_BOT_DEL = "bot_del"
+_BOT_ITEM_SET = "bot_item_set"  # key: (top-level key, nested key) for dict values
+_BOT_ITEM_DEL = "bot_item_del"
+_CONV_SET = "conv_set"          # key: (handler name, conversation key)
+_CALLBACK_SET = "callback_set"
+
+
+class WalPersistence(BasePersistence):
+    """Snapshot + append-only log persistence.
+
+    Args:
+        filepath: Snapshot path (``STATE_FILE``). The log lives at ``<filepath>.wal``.
+        store_data: Which kinds of data to persist, as for ``PicklePersistence``.
+        update_interval: Seconds between two persistence updates by the Application.
+        compact_every: Rewrite the snapshot and truncate the log after this many
+            log records. ``flush()`` (shutdown) always compacts.
+        fsync: Whether to ``fsync`` the log after each batch of appends.
+    """
+
+    def __init__(
+        self,
+        filepath,
+        store_data: Optional[PersistenceInput] = None,
+        update_interval: float = 60,
+        compact_every: int = 1000,
+        fsync: bool = False,
+    ):
+        super().__init__(store_data=store_data, update_interval=update_interval)
+        self.filepath = Path(filepath)
+        self.log_path = Path(f"{self.filepath}.wal")
+        self.compact_every = max(int(compact_every), 1)
+        self.fsync = fsync
+
+        self.user_data: Dict[int, Any] = {}
+        self.chat_data: Dict[int, Any] = {}
+        self.bot_data: Dict[Any, Any] = {}
+        self.callback_data = None
+        self.conversations: Dict[str, Dict[Tuple, object]] = {}
+
+        self._loaded = False
+        self._log = None
+        self._records_since_snapshot = 0
+
+    # ---------- file handling ----------
+
+    def _dumps(self, obj: object) -> bytes:
+        return pickling.dumps(self.bot, obj)
+
+    def _unpickler(self, file):
+        return pickling.unpickler(self.bot, file)
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+
+        try:
+            with self.filepath.open("rb") as file:
+                data = self._unpickler(file).load()
+            self.user_data = data.get("user_data") or {}
+            self.chat_data = data.get("chat_data") or {}
+            self.bot_data = data.get("bot_data") or {}
+            self.callback_data = data.get("callback_data")
+            self.conversations = data.get("conversations") or {}
+        except FileNotFoundError:
+            pass
+        except (pickle.UnpicklingError, EOFError) as exc:
+            raise TypeError(f"File {self.filepath.name} does not contain valid pickle data") from exc
+
+        self._replay()
+        self._log = self.log_path.open("ab")
+
+    def _replay(self) -> None:
+        try:
+            file = self.log_path.open("rb")
+        except FileNotFoundError:
+            return
+        good_offset = 0
+        with file:
+            unpickler = self._unpickler(file)
+            while True:
+                try:
+                    record = unpickler.load()
+                except EOFError:
+                    break
+                except Exception:
+                    # A crash mid-append leaves a torn tail; everything before it is intact.
+                    logger.warning("WalPersistence: dropping torn tail of %s at byte %d", self.log_path, good_offset)
+                    break
+                self._apply(*record)
+                self._records_since_snapshot += 1
+                good_offset = file.tell()
+        if good_offset != self.log_path.stat().st_size:
+            os.truncate(self.log_path, good_offset)
+
+    def _apply(self, kind: str, key: Any, value: Any) -> None:
+        if kind == _USER_SET:
+            self.user_data[key] = value
+        elif kind == _USER_DEL:
+            self.user_data.pop(key, None)
+        elif kind == _CHAT_SET:
+            self.chat_data[key] = value
+        elif kind == _CHAT_DEL:
+            self.chat_data.pop(key, None)
+        elif kind == _BOT_SET:
+            self.bot_data[key] = value
+        elif kind == _BOT_DEL:
+            self.bot_data.pop(key, None)
+        elif kind == _BOT_ITEM_SET:
+            self.bot_data.setdefault(key[0], {})[key[1]] = value
+        elif kind == _BOT_ITEM_DEL:
+            self.bot_data.get(key[0], {}).pop(key[1], None)
+        elif kind == _CONV_SET:
+            self.conversations.setdefault(key[0], {})[key[1]] = value
+        elif kind == _CALLBACK_SET:
+            self.callback_data = value
+
+    @traced("persistence.append")
+    def _append(self, records: list) -> None:
+        if not records:
+            return
+        self._log.write(b"".join(self._dumps(r) for r in records))
+        self._log.flush()
+        if self.fsync:
+            os.fsync(self._log.fileno())
+        self._records_since_snapshot += len(records)
+        if self._records_since_snapshot >= self.compact_every:
+            self.compact()
+
+    @traced("persistence.compact")
+    def compact(self) -> None:
+        """Write a full snapshot and truncate the log."""
+        self._load()
+        data = {
+            "conversations": self.conversations,
+            "user_data": self.user_data,
+            "chat_data": self.chat_data,
+            "bot_data": self.bot_data,
+            "callback_data": self.callback_data,
+        }
+        tmp = self.filepath.with_name(self.filepath.name + ".tmp")
+        with tmp.open("wb") as file:
+            file.write(self._dumps(data))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.filepath)
+        # The snapshot now holds everything in the log.
+        self._log.close()
+        self._log = self.log_path.open("wb")
+        self._records_since_snapshot = 0
+
+    # ---------- BasePersistence: loading ----------
+
+    async def get_user_data(self) -> Dict[int, Any]:
+        self._load()
+        return deepcopy(self.user_data)
+
+    async def get_chat_data(self) -> Dict[int, Any]:
+        self._load()
+        return deepcopy(self.chat_data)
+
+    async def get_bot_data(self) -> Dict[Any, Any]:
+        self._load()
+        return deepcopy(self.bot_data)
+
+    async def get_callback_data(self):
+        self._load()
+        return deepcopy(self.callback_data)
+
+    async def get_conversations(self, name: str):
+        self._load()
+        return self.conversations.get(name, {}).copy()
+
+    # ---------- BasePersistence: updates ----------
+    # The Application hands us deep copies, so we can keep them as the
+    # last-persisted state without copying again.
+
+    async def update_user_data(self, user_id: int, data) -> None:
+        self._load()
+        if self.user_data.get(user_id) == data:
+            return
+        self.user_data[user_id] = data
+        self._append([(_USER_SET, user_id, data)])
+
+    async def update_chat_data(self, chat_id: int, data) -> None:
+        self._load()
+        if self.chat_data.get(chat_id) == data:
+            return
+        self.chat_data[chat_id] = data
+        self._append([(_CHAT_SET, chat_id, data)])
+
+    async def update_bot_data(self, data) -> None:
+        self._load()
+        old = self.bot_data
+        records = []
+        for key, value in data.items():
+            if key not in old:
+                records.append((_BOT_SET, key, value))
+                continue
+            prev = old[key]
+            if isinstance(prev, dict) and isinstance(value, dict):
+                # Two-level diff: bot_data values are mostly per-user mappings.
+                for sub, sub_value in value.items():
+                    if sub not in prev or prev[sub] != sub_value:
+                        records.append((_BOT_ITEM_SET, (key, sub), sub_value))
+                for sub in prev.keys() - value.keys():
+                    records.append((_BOT_ITEM_DEL, (key, sub), None))
+            elif prev != value:
+                records.append((_BOT_SET, key, value))
+        for key in old.keys() - data.keys():
+            records.append((_BOT_DEL, key, None))
+        self.bot_data = data
+        self._append(records)
+
+    async def update_callback_data(self, data) -> None:
+        self._load()
+        if self.callback_data == data:
+            return
+        self.callback_data = data
+        self._append([(_CALLBACK_SET, None, data)])
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        self._load()
+        if self.conversations.setdefault(name, {}).get(key) == new_state:
+            return
+        self.conversations[name][key] = new_state
+        self._append([(_CONV_SET, (name, key), new_state)])
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._load()
+        if self.user_data.pop(user_id, None) is not None:
+            self._append([(_USER_DEL, user_id, None)])
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._load()
+        if self.chat_data.pop(chat_id, None) is not None:
+            self._append([(_CHAT_DEL, chat_id, None)])
+
+    async def refresh_user_data(self, user_id: int, user_data) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """Compact on shutdown so the next start only has to read the snapshot."""
+        if not self._loaded:
+            return
+        if self._records_since_snapshot:
+            self.compact()
+        self._log.close()
+        self._loaded = False
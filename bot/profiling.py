@@ -0,0 +1,93 @@
+"""On-demand sampling profiler writing flamegraph-compatible folded stacks.
+
+A helper thread samples the event-loop thread's Python stack every
+``interval`` seconds for the requested duration and writes one line per
+distinct stack, ``outer;...;inner <count>``, the format read by
+``flamegraph.pl``, speedscope and inferno. Nothing runs between profiles.
+
+Started by the admin-only ``/profile [seconds]`` command or by ``SIGUSR1``
+(see :func:`install_signal_handler`).
+"""
+import asyncio
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Optional
+
+from bot.config import PROFILE_DIR, PROFILE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+MAX_SECONDS = 300
+
+_running = threading.Lock()
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+def sample_stacks(thread_id: int, seconds: float, interval: float = 0.005) -> Counter:
+    """Sample ``thread_id``'s stack; returns folded stack -> sample count."""
+    stacks: Counter = Counter()
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        frame = sys._current_frames().get(thread_id)
+        if frame is None:
+            break
+        labels = []
+        while frame is not None:
+            labels.append(_frame_label(frame))
+            frame = frame.f_back
+        stacks[";".join(reversed(labels))] += 1
+        del frame
+        time.sleep(interval)
+    return stacks
+
+
+def write_folded(stacks: Counter, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as fh:
+        for stack, count in stacks.most_common():
+            fh.write(f"{stack} {count}\n")
+    return path
+
+
+async def profile_event_loop(seconds: float, directory: str = PROFILE_DIR, interval: float = 0.005) -> Optional[Path]:
+    """Profile the calling event loop's thread for ``seconds``; None if a profile is already running."""
+    if not _running.acquire(blocking=False):
+        return None
+    try:
+        seconds = min(max(seconds, 1), MAX_SECONDS)
+        thread_id = threading.get_ident()
+        logger.info("Profiling the event loop for %.0fs", seconds)
+        stacks = await asyncio.to_thread(sample_stacks, thread_id, seconds, interval)
+        path = Path(directory) / time.strftime("profile-%Y%m%d-%H%M%S.folded")
+        write_folded(stacks, path)
+        logger.info("Wrote %d samples to %s", sum(stacks.values()), path)
+        return path
+    finally:
+        _running.release()
+
+
+def install_signal_handler(loop: asyncio.AbstractEventLoop, seconds: float = PROFILE_SECONDS) -> bool:
+    """``kill -USR1 <pid>`` profiles the loop for ``seconds``. Returns False where unsupported."""
+    sig = getattr(signal, "SIGUSR1", None)
+    if sig is None:
+        return False
+
+    def _start() -> None:
+        loop.create_task(profile_event_loop(seconds), name="profile_event_loop")
+
+    try:
+        loop.add_signal_handler(sig, _start)
+    except (NotImplementedError, RuntimeError, ValueError):
+        return False
+    return True
@@ -0,0 +1,56 @@
+"""User-sharded workers: which process owns which user.
+
+In the multi-process webhook deployment (:mod:`bot.cluster`) every update is
+routed by its sender's user id, so a runner's conversation state, ``user_data``
+and armed deadline all live in exactly one worker. Each worker calls
+:func:`configure` with its index before building the Application; the
+defaults describe the single-process bot (one shard owning everyone).
+"""
+from typing import Any, Dict, Optional
+
+
+class Shard:
+    """This process's position among the workers; updated in place by :func:`configure`."""
+
+    __slots__ = ("index", "count")
+
+    def __init__(self, index: int = 0, count: int = 1):
+        self.index = index
+        self.count = count
+
+    def __repr__(self) -> str:
+        return f"Shard({self.index}/{self.count})"
+
+
+SHARD = Shard()
+
+
+def configure(index: int, count: int) -> None:
+    if not 0 <= index < count:
+        raise ValueError(f"shard index {index} out of range for {count} shard(s)")
+    SHARD.index = index
+    SHARD.count = count
+
+
+def shard_of(user_id: int, count: int) -> int:
+    return user_id % count
+
+
+def owns_user(user_id: int) -> bool:
+    """Whether this process is responsible for ``user_id``."""
+    return SHARD.count == 1 or shard_of(user_id, SHARD.count) == SHARD.index
+
+
+def route_key(update: Dict[str, Any]) -> Optional[int]:
+    """User id a raw Bot API update belongs to (its sender), falling back to the chat id."""
+    for field, value in update.items():
+        if field == "update_id" or not isinstance(value, dict):
+            continue
+        sender = value.get("from") or value.get("user")
+        if isinstance(sender, dict) and "id" in sender:
+            return sender["id"]
+        chat = value.get("chat") or (value.get("message") or {}).get("chat")
+        if isinstance(chat, dict) and "id" in chat:
+            return chat["id"]
+        return None
+    return None
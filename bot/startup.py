@@ -0,0 +1,126 @@
+"""Application startup stage (``post_init``)."""
+import asyncio
+import logging
+import time
+from typing import Any, Dict, Optional, Set
+
+from telegram.ext import Application
+
+from bot import tracing
+from bot.config import (
+    DEFAULT_TZ, DELIVERY_LEDGER_FILE, DELIVERY_LEDGER_FSYNC, METRICS_ADDR, METRICS_PORT, TRACE_FILE,
+)
+from bot.jobs.rehydrate import REHYDRATION_STATS, rehydrate_deadlines
+from bot.jobs.retry import RETRIES, rehydrate_retries
+from bot.jobs.wheel import DEADLINES
+from bot.metrics import METRICS, start_metrics_server
+from bot.persistence.ledger import LEDGER, ledger_files
+from bot.profiling import install_signal_handler
+from bot.sharding import SHARD
+from bot.utils.links import start_link_prefix
+from bot.utils.names import NAME_CACHE
+from bot.utils.time_utils import is_valid_tz
+
+logger = logging.getLogger(__name__)
+
+_PROCESS_STARTED = time.perf_counter()
+
+# Seconds from process start until post_init finished (persistence loaded, bot initialized).
+STARTUP_STATS: Dict[str, Any] = {"startup_seconds": None}
+
+_background: Set[asyncio.Task] = set()
+_metrics_server: Optional[asyncio.AbstractServer] = None
+
+
+def _spawn(coro, name: str) -> None:
+    # Application.create_task warns when the app is not running yet, so keep our own reference.
+    task = asyncio.get_running_loop().create_task(coro, name=name)
+    _background.add(task)
+
+    def _done(t: asyncio.Task) -> None:
+        _background.discard(t)
+        if not t.cancelled() and t.exception() is not None:
+            logger.error("Startup task %s failed", name, exc_info=t.exception())
+
+    task.add_done_callback(_done)
+
+
+def warm_caches(application: Application) -> None:
+    """Resolve per-process data once so handlers never pay for it.
+
+    ``Application.initialize()`` already fetched the bot identity (getMe); link
+    commands read ``context.bot.username`` from it.
+    """
+    logger.info("Running as @%s (id %s)", application.bot.username, application.bot.id)
+    start_link_prefix(application.bot.username)
+    # Loads the default zone from the tz database.
+    if not is_valid_tz(DEFAULT_TZ):
+        logger.warning("DEFAULT_TZ %r is not a valid IANA timezone", DEFAULT_TZ)
+
+
+def register_gauges(application: Application) -> None:
+    """Gauges that show whether the bot is falling behind, and how long startup took."""
+    METRICS.gauge("saferunner_armed_sessions", "Sessions with an armed deadline.", lambda: len(DEADLINES))
+    METRICS.gauge("saferunner_alert_retries_pending", "Failed alert deliveries waiting for a retry.",
+                  lambda: len(RETRIES))
+    METRICS.gauge("saferunner_name_cache_entries", "Display names held by the get_chat name cache.",
+                  lambda: len(NAME_CACHE))
+    METRICS.gauge("saferunner_name_cache_hit_ratio",
+                  "Share of name lookups answered without a get_chat call (cache hits and coalesced lookups).",
+                  lambda: NAME_CACHE.hit_rate)
+    # Startup timings (0 until the stage has finished)
+    METRICS.gauge("saferunner_startup_seconds", "Process start until post_init finished.",
+                  lambda: STARTUP_STATS["startup_seconds"] or 0)
+    METRICS.gauge("saferunner_rehydrated_sessions", "Persisted sessions re-armed at startup.",
+                  lambda: REHYDRATION_STATS["sessions"])
+    METRICS.gauge("saferunner_rehydrated_overdue_sessions", "Re-armed sessions whose deadline passed while down.",
+                  lambda: REHYDRATION_STATS["overdue"])
+    METRICS.gauge("saferunner_rehydration_seconds", "Time taken to re-arm persisted sessions.",
+                  lambda: REHYDRATION_STATS["seconds"] or 0)
+    METRICS.gauge(
+        "saferunner_update_queue_depth", "Updates received but not yet processed.", application.update_queue.qsize
+    )
+    limiter = getattr(application.bot, "rate_limiter", None)
+    if hasattr(limiter, "queue_depth"):
+        METRICS.gauge(
+            "saferunner_outbound_queue_depth", "Sends waiting on the outbound rate limiter.",
+            lambda: limiter.queue_depth,
+        )
+
+
+async def post_init(application: Application) -> None:
+    global _metrics_server
+    warm_caches(application)
+
+    register_gauges(application)
+    # Sharded workers (bot.cluster) each get their own metrics port and trace file.
+    if METRICS_PORT:
+        _metrics_server = await start_metrics_server(METRICS_ADDR, METRICS_PORT + SHARD.index)
+    if TRACE_FILE:
+        tracing.configure(TRACE_FILE if SHARD.count == 1 else f"{TRACE_FILE}.{SHARD.index}")
+    # kill -USR1 <pid> writes a sampling profile of the event loop
+    install_signal_handler(asyncio.get_running_loop())
+
+    # Alert outcomes from before the restart, so re-fired deadlines resume instead of repeating
+    if DELIVERY_LEDGER_FILE:
+        LEDGER.fsync = DELIVERY_LEDGER_FSYNC
+        # Every worker-count layout is replayed, so a runner whose shard changed with WEBHOOK_WORKERS resumes too.
+        LEDGER.open(DELIVERY_LEDGER_FILE if SHARD.count == 1 else f"{DELIVERY_LEDGER_FILE}.{SHARD.index}",
+                    siblings=ledger_files(DELIVERY_LEDGER_FILE))
+    # Failed alert deliveries from before the restart; overdue ones go out on the first retry tick.
+    rehydrate_retries(application)
+    # Re-arm persisted sessions in the background so polling/webhook starts right away.
+    _spawn(rehydrate_deadlines(application), "rehydrate_deadlines")
+
+    STARTUP_STATS["startup_seconds"] = time.perf_counter() - _PROCESS_STARTED
+    logger.info("Startup completed in %.3fs", STARTUP_STATS["startup_seconds"])
+
+
+async def post_shutdown(application: Application) -> None:
+    global _metrics_server
+    tracing.configure(None)
+    LEDGER.close()
+    if _metrics_server is not None:
+        _metrics_server.close()
+        await _metrics_server.wait_closed()
+        _metrics_server = None
@@ -0,0 +1,162 @@
+"""Per-update tracing with contextvar spans, exported as JSON lines.
+
+Every update runs inside an ``update`` span (opened by
+:class:`TracingUpdateProcessor`), every fired deadline inside a ``job`` span,
+and Bot API calls and persistence writes open child spans. Because spans live
+in a ContextVar, tasks created while handling an update inherit its trace.
+
+Tracing is off until :func:`configure` is given a file (``TRACE_FILE``); until
+then :func:`span` costs one global lookup. Each finished span becomes one line::
+
+    {"name": "bot_api", "trace": "5f0c...", "span": "a41e...", "parent": "77b2...",
+     "ts": 1718000000.123, "dur_ms": 41.7, "method": "sendMessage"}
+"""
+import functools
+import inspect
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+from telegram.ext import SimpleUpdateProcessor
+
+from bot.metrics import update_type
+
+logger = logging.getLogger(__name__)
+
+
+class Span:
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "start", "duration", "attrs", "error")
+
+    def __init__(self, name: str, parent: Optional["Span"], attrs: Dict[str, Any]):
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else "%016x" % random.getrandbits(64)
+        self.span_id = "%016x" % random.getrandbits(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.start = time.time()
+        self.duration = 0.0
+        self.attrs = attrs
+        self.error: Optional[str] = None
+
+    def set(self, **attrs) -> None:
+        self.attrs.update(attrs)
+
+    def to_dict(self) -> Dict[str, Any]:
+        record = {
+            "name": self.name,
+            "trace": self.trace_id,
+            "span": self.span_id,
+            "parent": self.parent_id,
+            "ts": round(self.start, 6),
+            "dur_ms": round(self.duration * 1e3, 3),
+        }
+        if self.error:
+            record["error"] = self.error
+        record.update(self.attrs)
+        return record
+
+
+class JsonlExporter:
+    """Appends one JSON object per span; the buffer is flushed when a trace's root span ends."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._fh = open(path, "a", encoding="utf-8")
+
+    def export(self, span: Span) -> None:
+        self._fh.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def flush(self) -> None:
+        self._fh.flush()
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+_current: ContextVar[Optional[Span]] = ContextVar("trace_span", default=None)
+_exporter: Optional[JsonlExporter] = None
+
+
+def configure(path: Optional[str]) -> None:
+    """Start exporting spans to ``path`` (JSON lines), or stop if ``path`` is None."""
+    global _exporter
+    if _exporter is not None:
+        _exporter.close()
+    _exporter = JsonlExporter(path) if path else None
+    if path:
+        logger.info("Tracing to %s", path)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+@contextmanager
+def span(name: str, **attrs):
+    exporter = _exporter
+    if exporter is None:
+        yield None
+        return
+    parent = _current.get()
+    s = Span(name, parent, attrs)
+    token = _current.set(s)
+    started = time.perf_counter()
+    try:
+        yield s
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.duration = time.perf_counter() - started
+        _current.reset(token)
+        exporter.export(s)
+        if parent is None:
+            exporter.flush()
+
+
+def traced(name: str):
+    """Decorator form of :func:`span` for sync and async functions."""
+
+    def decorate(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, fn=fn.__qualname__):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, fn=fn.__qualname__):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def _update_attrs(update: object) -> Dict[str, Any]:
+    attrs: Dict[str, Any] = {"update_id": getattr(update, "update_id", None)}
+    try:
+        attrs["type"] = update_type(update)
+        user = update.effective_user
+        if user is not None:
+            attrs["user"] = user.id
+    except AttributeError:
+        pass
+    return attrs
+
+
+class TracingUpdateProcessor(SimpleUpdateProcessor):
+    """Runs each update inside an ``update`` root span."""
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if _exporter is None:
+            await coroutine
+            return
+        with span("update", **_update_attrs(update)):
+            await coroutine
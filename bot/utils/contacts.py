@@ -1,53 +1,191 @@
-from typing import Dict, Any, List
-from bot.constants import BD_CONTACTS, BD_BLACKLIST
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, List, Sequence
+from bot.constants import BD_AUDIENCE, BD_CONTACTS, BD_BLACKLIST, BD_OWNERS, BD_SCHEMA, BD_STORE
 
+# With the sqlite backend, bot_data[BD_STORE] holds a SqliteStore and every
+# function below becomes one indexed query; otherwise the graph lives in bot_data.
+#
+# In bot_data every relation is an int-keyed dict whose value is the bare int
+# when there is a single member and a sorted array('q') otherwise (8 bytes per
+# id, O(log n) membership via bisect). Keys with no members are dropped.
+#
+# BD_AUDIENCE is BD_CONTACTS minus every contact who blacklisted the owner. It is
+# kept up to date by the write paths below, so firing an alert is one lookup.
+#
+# Updates from different users run concurrently (bot.ordering), so bot_data is
+# shared between handlers that interleave at every await. None of the functions
+# below awaits: each read or write is atomic on the event loop, and readers get
+# a copy. Keep it that way rather than adding locks here.
 
-def _ensure(bot_data: Dict[str, Any], owner_id: int) -> List[int]:
-    mapping = bot_data.setdefault(BD_CONTACTS, {})
-    return mapping.setdefault(str(owner_id), [])
+_SCHEMA_VERSION = 3
 
 
+# -------- Compact int sets --------
+def members_of(value) -> Sequence[int]:
+    """Members of one relation value: ``None``, a bare int or a sorted sequence."""
+    if value is None:
+        return ()
+    if isinstance(value, int):
+        return (value,)
+    return value
+
+def _contains(value, member: int) -> bool:
+    if value is None:
+        return False
+    if isinstance(value, int):
+        return value == member
+    i = bisect_left(value, member)
+    return i < len(value) and value[i] == member
+
+def _add(mapping: Dict[int, Any], key: int, member: int) -> bool:
+    value = mapping.get(key)
+    if value is None:
+        mapping[key] = member
+        return True
+    if isinstance(value, int):
+        if value == member:
+            return False
+        mapping[key] = array("q", sorted((value, member)))
+        return True
+    i = bisect_left(value, member)
+    if i < len(value) and value[i] == member:
+        return False
+    value.insert(i, member)
+    return True
+
+def _discard(mapping: Dict[int, Any], key: int, member: int) -> bool:
+    value = mapping.get(key)
+    if not _contains(value, member):
+        return False
+    if isinstance(value, int):
+        del mapping[key]
+        return True
+    del value[bisect_left(value, member)]
+    if len(value) == 1:
+        mapping[key] = value[0]
+    return True
+
+
+# -------- Layout / migration --------
+def _compact(mapping: Dict[Any, Any]) -> Dict[int, Any]:
+    compact = {}
+    for key, values in mapping.items():
+        members = sorted(set(int(v) for v in members_of(values)))
+        if members:
+            compact[int(key)] = members[0] if len(members) == 1 else array("q", members)
+    return compact
+
+def migrate_contact_storage(bot_data: Dict[str, Any]) -> None:
+    """Convert ``str(id) -> list`` relations (older pickles) to the compact layout.
+
+    Also (re)builds the BD_OWNERS reverse index and the BD_AUDIENCE view.
+    Idempotent and cheap once done.
+    """
+    if bot_data.get(BD_SCHEMA) == _SCHEMA_VERSION:
+        return
+    contacts = _compact(bot_data.get(BD_CONTACTS, {}))
+    blacklist = _compact(bot_data.get(BD_BLACKLIST, {}))
+    owners: Dict[int, Any] = {}
+    audience: Dict[int, Any] = {}
+    for owner, value in contacts.items():
+        for cid in members_of(value):
+            _add(owners, cid, owner)
+            if not _contains(blacklist.get(cid), owner):
+                _add(audience, owner, cid)
+    bot_data[BD_CONTACTS] = contacts
+    bot_data[BD_OWNERS] = owners
+    bot_data[BD_BLACKLIST] = blacklist
+    bot_data[BD_AUDIENCE] = audience
+    bot_data[BD_SCHEMA] = _SCHEMA_VERSION
+
+def _relation(bot_data: Dict[str, Any], key: str) -> Dict[int, Any]:
+    migrate_contact_storage(bot_data)
+    return bot_data[key]
+
+
+# -------- Contacts (runner -> people alerted) --------
 def add_contact(bot_data: Dict[str, Any], owner_id: int, contact_chat_id: int) -> None:
-    lst = _ensure(bot_data, owner_id)
-    if contact_chat_id not in lst:
-        lst.append(contact_chat_id)
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        store.add_contact(owner_id, contact_chat_id)
+        return
+    if _add(_relation(bot_data, BD_CONTACTS), owner_id, contact_chat_id):
+        _add(bot_data[BD_OWNERS], contact_chat_id, owner_id)
+        if not _contains(bot_data[BD_BLACKLIST].get(contact_chat_id), owner_id):
+            _add(bot_data[BD_AUDIENCE], owner_id, contact_chat_id)
 
 
 def list_contacts(bot_data: Dict[str, Any], owner_id: int) -> List[int]:
-    return list(_ensure(bot_data, owner_id))
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.list_contacts(owner_id)
+    return list(members_of(_relation(bot_data, BD_CONTACTS).get(owner_id)))
 
 
 def remove_contact_everywhere(bot_data: Dict[str, Any], chat_id: int) -> int:
-    mapping = bot_data.setdefault(BD_CONTACTS, {})
-    removed = 0
-    for _, lst in mapping.items():
-        if chat_id in lst:
-            lst.remove(chat_id)
-            removed += 1
-    return removed
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.remove_contact_everywhere(chat_id)
+    # O(degree): only the owners that list this contact are touched
+    contacts = _relation(bot_data, BD_CONTACTS)
+    owners = members_of(bot_data[BD_OWNERS].pop(chat_id, None))
+    for owner_id in owners:
+        _discard(contacts, owner_id, chat_id)
+        _discard(bot_data[BD_AUDIENCE], owner_id, chat_id)
+    return len(owners)
 
 def remove_contact(bot_data: Dict[str, Any], owner_id: int, contact_chat_id: int) -> bool:
-    lst = _ensure(bot_data, owner_id)
-    if contact_chat_id in lst:
-        lst.remove(contact_chat_id)
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.remove_contact(owner_id, contact_chat_id)
+    if _discard(_relation(bot_data, BD_CONTACTS), owner_id, contact_chat_id):
+        _discard(bot_data[BD_OWNERS], contact_chat_id, owner_id)
+        _discard(bot_data[BD_AUDIENCE], owner_id, contact_chat_id)
         return True
     return False
 
-# -------- Blacklist (contacts control who can alert them) --------
-def _bl_map(bot_data: Dict[str, Any]) -> Dict[str, List[int]]:
-    return bot_data.setdefault(BD_BLACKLIST, {})
+def list_owners(bot_data: Dict[str, Any], contact_id: int) -> List[int]:
+    """Runners who have ``contact_id`` on their alert list."""
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.list_owners(contact_id)
+    return list(members_of(_relation(bot_data, BD_OWNERS).get(contact_id)))
+
+def list_audience(bot_data: Dict[str, Any], owner_id: int) -> List[int]:
+    """Contacts to alert for ``owner_id``: their contacts minus those who blacklisted them."""
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.list_audience(owner_id)
+    return list(members_of(_relation(bot_data, BD_AUDIENCE).get(owner_id)))
 
+# -------- Blacklist (contacts control who can alert them) --------
 def blacklist_add(bot_data: Dict[str, Any], contact_id: int, runner_id: int) -> None:
-    bl = _bl_map(bot_data).setdefault(str(contact_id), [])
-    if runner_id not in bl:
-        bl.append(runner_id)
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        store.blacklist_add(contact_id, runner_id)
+        return
+    if _add(_relation(bot_data, BD_BLACKLIST), contact_id, runner_id):
+        _discard(bot_data[BD_AUDIENCE], runner_id, contact_id)
 
 def blacklist_remove(bot_data: Dict[str, Any], contact_id: int, runner_id: int) -> bool:
-    bl = _bl_map(bot_data).setdefault(str(contact_id), [])
-    if runner_id in bl:
-        bl.remove(runner_id)
-        return True
-    return False
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.blacklist_remove(contact_id, runner_id)
+    if not _discard(_relation(bot_data, BD_BLACKLIST), contact_id, runner_id):
+        return False
+    if _contains(bot_data[BD_CONTACTS].get(runner_id), contact_id):
+        _add(bot_data[BD_AUDIENCE], runner_id, contact_id)
+    return True
 
 def blacklist_list(bot_data: Dict[str, Any], contact_id: int) -> List[int]:
-    return list(_bl_map(bot_data).get(str(contact_id), []))
\ No newline at end of file
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.blacklist_list(contact_id)
+    return list(members_of(_relation(bot_data, BD_BLACKLIST).get(contact_id)))
+
+def is_blacklisted(bot_data: Dict[str, Any], contact_id: int, runner_id: int) -> bool:
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return runner_id in store.blacklist_list(contact_id)
+    return _contains(_relation(bot_data, BD_BLACKLIST).get(contact_id), runner_id)
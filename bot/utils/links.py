@@ -1,6 +1,15 @@
-def build_deep_link(bot_username: str, owner_id: int) -> str:
+from functools import lru_cache
+
+
+@lru_cache(maxsize=8)
+def start_link_prefix(bot_username: str) -> str:
+    """``https://t.me/<bot>?start=`` — computed once per bot (warmed at startup)."""
     username = bot_username.lstrip("@")
-    return f"https://t.me/{username}?start=link_{owner_id}"
+    return f"https://t.me/{username}?start="
+
+
+def build_deep_link(bot_username: str, owner_id: int) -> str:
+    return f"{start_link_prefix(bot_username)}link_{owner_id}"
 
 
 def build_webhook_url(base_url: str, path: str) -> str:
@@ -14,8 +23,7 @@ def build_contact_offer_link(bot_username: str, contact_id: int) -> str:
     Deep link a CONTACT can share. When a runner taps it, the bot adds this contact
     to the runner's alert list.
     """
-    username = bot_username.lstrip("@")
-    return f"https://t.me/{username}?start=contact_{contact_id}"
+    return f"{start_link_prefix(bot_username)}contact_{contact_id}"
 
 def build_bundle_link(bot_username: str, contact_ids: list[int]) -> str:
     """
@@ -23,6 +31,5 @@ def build_bundle_link(bot_username: str, contact_ids: list[int]) -> str:
     Encodes as: start=bundle_<id1,id2,id3>
     (Keep it short—Telegram's start parameter is limited; prefer ≤5 IDs.)
     """
-    username = bot_username.lstrip("@")
     payload = ",".join(str(i) for i in contact_ids)
-    return f"https://t.me/{username}?start=bundle_{payload}"
\ No newline at end of file
+    return f"{start_link_prefix(bot_username)}bundle_{payload}"
\ No newline at end of file
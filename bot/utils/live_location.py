@@ -0,0 +1,64 @@
+"""Latest live-location fix per runner, kept in memory.
+
+A shared live location arrives as one message followed by a stream of
+``edited_message`` updates, often one every few seconds. Every fix replaces the
+runner's entry here; the session in ``user_data`` (and with it persistence) is
+only rewritten once per ``LIVE_LOCATION_PERSIST_SECONDS``. ``deadline_job``
+reads the fix from here first, so an alert always carries the freshest position.
+"""
+import time
+from typing import Callable, Dict, Optional
+
+from bot.config import LIVE_LOCATION_PERSIST_SECONDS
+
+
+class LiveFix:
+    __slots__ = ("lat", "lon", "at", "persisted_at")
+
+    def __init__(self, lat: float, lon: float, at: float, persisted_at: float):
+        self.lat = lat
+        self.lon = lon
+        self.at = at
+        self.persisted_at = persisted_at
+
+    def as_location(self) -> Dict[str, float]:
+        return {"type": "coords", "lat": self.lat, "lon": self.lon}
+
+
+class LiveLocations:
+    """user id -> latest :class:`LiveFix`, with a per-user persistence throttle."""
+
+    def __init__(self, persist_every: float = LIVE_LOCATION_PERSIST_SECONDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.persist_every = persist_every
+        self.clock = clock
+        self._fixes: Dict[int, LiveFix] = {}
+
+    def __len__(self) -> int:
+        return len(self._fixes)
+
+    def update(self, user_id: int, lat: float, lon: float) -> bool:
+        """Record a fix; True when it should also be written to the session now."""
+        now = self.clock()
+        fix = self._fixes.get(user_id)
+        if fix is None:
+            self._fixes[user_id] = LiveFix(lat, lon, now, now)
+            return True
+        fix.lat, fix.lon, fix.at = lat, lon, now
+        if now - fix.persisted_at >= self.persist_every:
+            fix.persisted_at = now
+            return True
+        return False
+
+    def latest(self, user_id: int) -> Optional[Dict[str, float]]:
+        fix = self._fixes.get(user_id)
+        return fix.as_location() if fix is not None else None
+
+    def discard(self, user_id: int) -> None:
+        self._fixes.pop(user_id, None)
+
+    def clear(self) -> None:
+        self._fixes.clear()
+
+
+LIVE_LOCATIONS = LiveLocations()
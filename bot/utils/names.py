@@ -0,0 +1,94 @@
+"""Shared display-name cache for ``get_chat`` lookups.
+
+Names are cached with a TTL in a size-bounded LRU, failures are cached for a
+shorter time (a contact who never pressed Start keeps failing), and concurrent
+lookups of the same chat share one in-flight request.
+"""
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class NameCache:
+    def __init__(self, ttl: float = 3600, negative_ttl: float = 300, maxsize: int = 10_000, clock=time.monotonic):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.maxsize = maxsize
+        self._clock = clock
+        self._entries: "OrderedDict[int, Tuple[float, Optional[str]]]" = OrderedDict()
+        self._inflight: Dict[int, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses + self.coalesced
+        return (self.hits + self.coalesced) / lookups if lookups else 0.0
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": self.hit_rate,
+        }
+
+    def invalidate(self, chat_id: int) -> None:
+        self._entries.pop(chat_id, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self.hits = self.misses = self.coalesced = 0
+
+    def _store(self, chat_id: int, name: Optional[str]) -> None:
+        ttl = self.ttl if name else self.negative_ttl
+        self._entries[chat_id] = (self._clock() + ttl, name)
+        self._entries.move_to_end(chat_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def resolve(self, bot, chat_id: int) -> Optional[str]:
+        """Best-effort ``full_name`` of ``chat_id``; ``None`` if Telegram won't tell us."""
+        cached = self._entries.get(chat_id)
+        if cached is not None and cached[0] > self._clock():
+            self._entries.move_to_end(chat_id)
+            self.hits += 1
+            return cached[1]
+
+        pending = self._inflight.get(chat_id)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[chat_id] = fut
+        name = None
+        try:
+            chat = await bot.get_chat(chat_id)
+            name = chat.full_name or None
+        except Exception as e:
+            logger.debug("get_chat(%s) failed: %s", chat_id, e)
+        finally:
+            self._store(chat_id, name)
+            del self._inflight[chat_id]
+            fut.set_result(name)
+        return name
+
+    async def resolve_many(self, bot, chat_ids: Iterable[int]) -> Dict[int, Optional[str]]:
+        ids = list(dict.fromkeys(chat_ids))
+        names = await asyncio.gather(*(self.resolve(bot, cid) for cid in ids))
+        return dict(zip(ids, names))
+
+
+# Process-wide cache used by handlers and the deadline job.
+NAME_CACHE = NameCache()
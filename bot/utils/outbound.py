@@ -0,0 +1,241 @@
+"""Central outbound send scheduler.
+
+Every Bot API request made through the Application's bot passes through
+:class:`OutboundScheduler` (installed as PTB's rate limiter in ``build_app``).
+Message-producing requests are throttled by two token buckets, one global
+(Telegram allows roughly 30 msg/s) and one per chat (roughly 1 msg/s with short
+bursts). When the queue backs up, safety alerts go out before interactive replies.
+
+The priority of a request comes from the surrounding context, so call sites do
+not change::
+
+    with send_priority(PRIORITY_ALERT):
+        await context.bot.send_message(...)
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Tuple
+
+from telegram.error import RetryAfter
+from telegram.ext import BaseRateLimiter
+
+from bot.metrics import API_SECONDS, SEND_FAILURES, SEND_WAIT
+from bot.tracing import span
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_ALERT = 0
+PRIORITY_RETRY = 1        # retried alert deliveries: after fresh alerts, before interactive replies
+PRIORITY_INTERACTIVE = 2
+_PRIORITY_NAMES = {PRIORITY_ALERT: "alert", PRIORITY_RETRY: "retry", PRIORITY_INTERACTIVE: "interactive"}
+
+# Telegram's broadcast limit, per bot token
+GLOBAL_RATE = 30
+
+_priority: ContextVar[int] = ContextVar("send_priority", default=PRIORITY_INTERACTIVE)
+
+# Requests that put a message in a chat; everything else (getMe, getChat,
+# getUpdates, answerCallbackQuery, ...) is not throttled.
+_THROTTLED_PREFIXES = ("send", "edit", "forward", "copy")
+
+
+@contextmanager
+def send_priority(priority: int):
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations; tokens may go negative (debt)."""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = now
+
+    def _refill(self, now: float) -> None:
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self, now: float) -> float:
+        """Take one token and return the time at which it may be used."""
+        self._refill(now)
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return now
+        return now - self.tokens / self.rate
+
+    def idle(self, now: float) -> bool:
+        self._refill(now)
+        return self.tokens >= self.capacity
+
+
+class OutboundScheduler(BaseRateLimiter):
+    """Priority queue in front of the Bot API with global and per-chat token buckets.
+
+    Args:
+        global_rate: Messages per second across all chats.
+        per_chat_rate: Messages per second to a single chat.
+        per_chat_burst: Messages a single chat may receive back-to-back.
+        max_retries: How often a request is retried after a ``RetryAfter``.
+    """
+
+    def __init__(
+        self,
+        global_rate: float = GLOBAL_RATE,
+        per_chat_rate: float = 1,
+        per_chat_burst: float = 3,
+        max_retries: int = 2,
+    ):
+        self.global_rate = global_rate
+        self.per_chat_rate = per_chat_rate
+        self.per_chat_burst = per_chat_burst
+        self.max_retries = max_retries
+
+        self._global: Optional[TokenBucket] = None
+        self._chats: Dict[Any, TokenBucket] = {}
+        self._seq = itertools.count()
+        # (ready_at, seq, priority, future): waiting on their chat's bucket
+        self._delayed: List[Tuple[float, int, int, asyncio.Future]] = []
+        # (priority, seq, future): chat bucket satisfied, waiting on the global bucket
+        self._ready: List[Tuple[int, int, asyncio.Future]] = []
+        self._paused_until = 0.0
+        self._wakeup: Optional[asyncio.Event] = None
+        self._pump_task: Optional[asyncio.Task] = None
+
+        self.sent = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    # ---------- introspection ----------
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._delayed) + len(self._ready)
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth,
+            "sent": self.sent,
+            "wait_avg": self.wait_total / self.sent if self.sent else 0.0,
+            "wait_max": self.wait_max,
+        }
+
+    # ---------- BaseRateLimiter ----------
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        if self._pump_task is not None:
+            self._pump_task.cancel()
+            try:
+                await self._pump_task
+            except asyncio.CancelledError:
+                pass
+            self._pump_task = None
+
+    async def _timed_call(self, callback, args, kwargs, endpoint):
+        start = time.perf_counter()
+        try:
+            with span("bot_api", method=endpoint):
+                return await callback(*args, **kwargs)
+        except Exception as e:
+            SEND_FAILURES.inc(method=endpoint, error=type(e).__name__)
+            raise
+        finally:
+            API_SECONDS.observe(time.perf_counter() - start, method=endpoint)
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        chat_id = data.get("chat_id")
+        if chat_id is None or not endpoint.startswith(_THROTTLED_PREFIXES):
+            return await self._timed_call(callback, args, kwargs, endpoint)
+
+        priority = _priority.get()
+        attempt = 0
+        while True:
+            with span("bot_api.queue", method=endpoint, priority=priority):
+                await self._acquire(chat_id, priority)
+            try:
+                return await self._timed_call(callback, args, kwargs, endpoint)
+            except RetryAfter as e:
+                if attempt >= self.max_retries:
+                    raise
+                attempt += 1
+                delay = float(e.retry_after)
+                logger.warning("RetryAfter %.1fs on %s to %s; pausing sends", delay, endpoint, chat_id)
+                self._paused_until = max(self._paused_until, time.monotonic() + delay)
+
+    # ---------- scheduling ----------
+
+    def _ensure_pump(self) -> None:
+        if self._pump_task is None or self._pump_task.done():
+            now = time.monotonic()
+            self._global = self._global or TokenBucket(self.global_rate, self.global_rate, now)
+            self._wakeup = asyncio.Event()
+            self._pump_task = asyncio.get_running_loop().create_task(self._pump(), name="outbound_pump")
+
+    async def _acquire(self, chat_id, priority: int) -> None:
+        self._ensure_pump()
+        now = time.monotonic()
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            bucket = self._chats[chat_id] = TokenBucket(self.per_chat_rate, self.per_chat_burst, now)
+        fut = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._delayed, (bucket.reserve(now), next(self._seq), priority, fut))
+        self._wakeup.set()
+
+        enqueued = now
+        await fut
+        waited = time.monotonic() - enqueued
+        self.sent += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        SEND_WAIT.observe(waited, priority=_PRIORITY_NAMES.get(priority, str(priority)))
+
+    def _promote(self, now: float) -> None:
+        while self._delayed and self._delayed[0][0] <= now:
+            _, seq, priority, fut = heapq.heappop(self._delayed)
+            heapq.heappush(self._ready, (priority, seq, fut))
+
+    async def _pump(self) -> None:
+        while True:
+            now = time.monotonic()
+            self._promote(now)
+
+            if not self._ready:
+                timeout = self._delayed[0][0] - now if self._delayed else None
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if self._paused_until > now:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+
+            at = self._global.reserve(now)
+            if at > now:
+                await asyncio.sleep(at - now)
+                self._promote(time.monotonic())
+            # Highest priority at grant time, so alerts that arrived while we slept go first.
+            _, _, fut = heapq.heappop(self._ready)
+            if not fut.done():
+                fut.set_result(None)
+
+            if len(self._chats) > 10_000:
+                now = time.monotonic()
+                self._chats = {c: b for c, b in self._chats.items() if not b.idle(now)}
@@ -0,0 +1,76 @@
+"""Whether the bot can message a chat: reachable, blocked, or unknown.
+
+Telegram only lets a bot message users who have started it and not blocked it.
+A contact added through a ``contact_``/``bundle_`` link may never have pressed
+Start, and an alert to them costs a call (and rate budget) for a certain 403.
+
+* Any update from a private chat marks it reachable; so does a ``my_chat_member``
+  update when the user restarts the bot.
+* A ``my_chat_member`` update for a block, or a send that fails with
+  ``Forbidden: bot was blocked by the user``, marks the chat blocked.
+* Chats never seen are unknown (which is every contact from before this registry).
+  So are chats a send failed for with any other ``Forbidden``, such as "bot can't
+  initiate conversation with a user": that contact may still press Start.
+
+``deadline_job`` skips blocked contacts and alerts unknown ones after the
+reachable ones; runners are told about unreachable contacts when they add them.
+
+As in :mod:`bot.utils.contacts`, the registry is ``bot_data[BD_REACH]`` (chat id
+-> state, unknown chats absent), or the ``reachability`` table with the sqlite
+backend. No function awaits.
+"""
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from telegram.error import Forbidden
+
+from bot.constants import BD_REACH, BD_STORE
+
+UNKNOWN, REACHABLE, BLOCKED = 0, 1, 2
+
+# The one Forbidden that means the user blocked the bot
+_BLOCKED_BY_USER = "bot was blocked by the user"
+
+
+def _set(bot_data: Dict[str, Any], chat_id: int, state: int) -> bool:
+    store = bot_data.get(BD_STORE)
+    if store is not None:
+        return store.set_reachability(chat_id, state)
+    registry = bot_data.setdefault(BD_REACH, {})
+    if registry.get(chat_id) == state:
+        return False
+    registry[chat_id] = state
+    return True
+
+
+def mark_reachable(bot_data: Dict[str, Any], chat_id: int) -> bool:
+    """Returns whether the state changed."""
+    return _set(bot_data, chat_id, REACHABLE)
+
+
+def mark_blocked(bot_data: Dict[str, Any], chat_id: int) -> bool:
+    """Returns whether the state changed."""
+    return _set(bot_data, chat_id, BLOCKED)
+
+
+def reachability(bot_data: Dict[str, Any], chat_ids: Iterable[int]) -> Dict[int, int]:
+    """State of each of ``chat_ids`` (UNKNOWN when never seen)."""
+    chat_ids = list(chat_ids)
+    store = bot_data.get(BD_STORE)
+    known = store.reachability(chat_ids) if store is not None else bot_data.get(BD_REACH) or {}
+    return {cid: known.get(cid, UNKNOWN) for cid in chat_ids}
+
+
+def by_reachability(bot_data: Dict[str, Any], chat_ids: Iterable[int]) -> Tuple[List[int], List[int]]:
+    """(chats to message, reachable ones first then unknown; blocked chats), each in the given order."""
+    states = reachability(bot_data, chat_ids)
+    reachable = [cid for cid, state in states.items() if state == REACHABLE]
+    unknown = [cid for cid, state in states.items() if state == UNKNOWN]
+    return reachable + unknown, [cid for cid, state in states.items() if state == BLOCKED]
+
+
+def record_send(bot_data: Dict[str, Any], chat_id: int, error: Optional[BaseException]) -> None:
+    """After a send to ``chat_id``: delivered means reachable, a block by the user means blocked."""
+    if error is None:
+        mark_reachable(bot_data, chat_id)
+    elif isinstance(error, Forbidden) and _BLOCKED_BY_USER in error.message.lower():
+        mark_blocked(bot_data, chat_id)
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
-from typing import Optional, Dict, Any
+from datetime import datetime, tzinfo
+from typing import Optional, Dict, Any, Sequence, Tuple
 
 
 @dataclass
@@ -28,3 +29,9 @@ def format_location_summary(location: Optional[Dict[str, Any]]) -> str:
     if location.get("type") == "text":
         return f"Location: {location['text']}"
     return "Location: (unknown)"
+
+
+def format_trail_summary(points: Sequence[Tuple[float, float, float]], tz: tzinfo) -> str:
+    """One line per (epoch seconds, lat, lon) point, oldest first, in the runner's timezone."""
+    lines = [f"{datetime.fromtimestamp(t, tz):%H:%M} ({lat:.5f}, {lon:.5f})" for t, lat, lon in points]
+    return "Recent path, oldest first:\n" + "\n".join(lines)
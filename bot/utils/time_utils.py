@@ -1,27 +1,56 @@
-from datetime import datetime, timedelta, time as dtime, timezone
+from datetime import datetime, timedelta, time as dtime, timezone, tzinfo
+from functools import lru_cache
 from typing import Optional, Tuple
 
 from pytz import timezone as pytz_timezone, UnknownTimeZoneError
 from telegram.ext import ContextTypes
 
-from bot.config import DEFAULT_TZ
+from bot.config import DEFAULT_TZ, TZ_BACKEND
 from bot.constants import UD_TZ
 
 
-def get_user_tz(context: ContextTypes.DEFAULT_TYPE):
-    tzname = context.user_data.get(UD_TZ, DEFAULT_TZ)
+# Each zone name is resolved once per process; handlers then share the zone object.
+# Unknown names are cached too (as None), so bad /tz input cannot grow the cache.
+@lru_cache(maxsize=1024)
+def _load_tz(name: str, backend: str) -> Optional[tzinfo]:
+    if backend == "zoneinfo":
+        from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+        try:
+            return ZoneInfo(name)
+        except (ZoneInfoNotFoundError, ValueError):
+            return None
     try:
-        return pytz_timezone(tzname)
+        return pytz_timezone(name)
     except UnknownTimeZoneError:
-        return pytz_timezone(DEFAULT_TZ)
+        return None
+
+
+def resolve_tz(name: str, backend: str = TZ_BACKEND) -> Optional[tzinfo]:
+    """Zone object for an IANA name, or None if the name is unknown."""
+    return _load_tz(name, backend)
+
+
+def tz_name(tz: tzinfo) -> str:
+    """Canonical IANA name of a zone from either backend."""
+    return getattr(tz, "zone", None) or getattr(tz, "key", None) or str(tz)
+
+
+def get_user_tz(context: ContextTypes.DEFAULT_TYPE):
+    return resolve_tz(context.user_data.get(UD_TZ, DEFAULT_TZ)) or resolve_tz(DEFAULT_TZ)
+
+
+def set_user_tz(context: ContextTypes.DEFAULT_TYPE, name: str) -> Optional[str]:
+    """Validate ``name`` and store its canonical spelling for the user; None if unknown."""
+    tz = resolve_tz(name)
+    if tz is None:
+        return None
+    context.user_data[UD_TZ] = tz_name(tz)
+    return context.user_data[UD_TZ]
 
 
 def is_valid_tz(name: str) -> bool:
-    try:
-        pytz_timezone(name)
-        return True
-    except UnknownTimeZoneError:
-        return False
+    return resolve_tz(name) is not None
 
 
 def parse_hhmm(s: str) -> Optional[Tuple[int, int]]:
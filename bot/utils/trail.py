@@ -0,0 +1,106 @@
+"""Recent positions of each runner's session, for the path summary in alerts.
+
+A :class:`Trail` is a ring buffer of (time, lat, lon) kept in two flat arrays:
+int32 seconds since the trail's first point, and interleaved float32
+coordinates (float32 keeps lat/lon to about a metre). That is 12 bytes per
+point, and at most ``TRAIL_SIZE`` points per session. A fix closer than
+``TRAIL_MIN_DISTANCE_M`` to the newest point only refreshes that point's time,
+so a runner standing still does not push the path out of the buffer.
+
+Trails live in memory only, like :mod:`bot.utils.live_location`: recording a
+fix never writes to ``user_data`` (and persistence). A restart starts an empty
+trail; the alert then falls back to the session's last location alone.
+"""
+import math
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+from bot.config import TRAIL_MIN_DISTANCE_M, TRAIL_SIZE
+
+_EARTH_RADIUS_M = 6_371_000.0
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance in metres."""
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp, dl = p2 - p1, math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
+
+
+class Trail:
+    """Fixed-size ring of (time, lat, lon) points with distance thinning."""
+
+    __slots__ = ("size", "min_distance", "start", "_t", "_pos", "_head")
+
+    def __init__(self, size: int = TRAIL_SIZE, min_distance: float = TRAIL_MIN_DISTANCE_M):
+        self.size = max(size, 1)
+        self.min_distance = min_distance
+        self.start: Optional[float] = None   # epoch seconds of the first point
+        self._t = array("i")                  # seconds since start
+        self._pos = array("f")                # lat0, lon0, lat1, lon1, ...
+        self._head = 0                        # oldest point, once the ring is full
+
+    def __len__(self) -> int:
+        return len(self._t)
+
+    def add(self, lat: float, lon: float, at: Optional[float] = None) -> bool:
+        """Record a fix; False if it was thinned into the newest point."""
+        at = time.time() if at is None else at
+        if self.start is None:
+            self.start = at
+        offset = int(at - self.start)
+        count = len(self._t)
+        if count:
+            newest = (self._head - 1) % count
+            if distance_m(self._pos[2 * newest], self._pos[2 * newest + 1], lat, lon) < self.min_distance:
+                self._t[newest] = offset
+                return False
+        if count < self.size:
+            self._t.append(offset)
+            self._pos.append(lat)
+            self._pos.append(lon)
+        else:
+            head = self._head
+            self._t[head] = offset
+            self._pos[2 * head] = lat
+            self._pos[2 * head + 1] = lon
+            self._head = (head + 1) % count
+        return True
+
+    def points(self, last: Optional[int] = None) -> List[Tuple[float, float, float]]:
+        """(epoch seconds, lat, lon), oldest first; only the ``last`` newest if given."""
+        count = len(self._t)
+        order = [(self._head + i) % count for i in range(count)]
+        if last is not None:
+            order = order[max(count - last, 0):]
+        start = self.start or 0.0
+        return [(start + self._t[i], self._pos[2 * i], self._pos[2 * i + 1]) for i in order]
+
+
+class Trails:
+    """user id -> :class:`Trail` of the runner's current session."""
+
+    def __init__(self, size: int = TRAIL_SIZE, min_distance: float = TRAIL_MIN_DISTANCE_M):
+        self.size = size
+        self.min_distance = min_distance
+        self._trails: Dict[int, Trail] = {}
+
+    def __len__(self) -> int:
+        return len(self._trails)
+
+    def record(self, user_id: int, lat: float, lon: float, at: Optional[float] = None) -> None:
+        trail = self._trails.get(user_id)
+        if trail is None:
+            trail = self._trails[user_id] = Trail(self.size, self.min_distance)
+        trail.add(lat, lon, at)
+
+    def get(self, user_id: int) -> Optional[Trail]:
+        return self._trails.get(user_id)
+
+    def discard(self, user_id: int) -> None:
+        self._trails.pop(user_id, None)
+
+
+TRAILS = Trails()
@@ -1,9 +1,11 @@
+import asyncio
 import logging
 import os
 
 from bot.main import build_app
 from bot.config import TELEGRAM_TOKEN
 from bot.handlers.errors import on_error
+from bot.ingress import run_webhook
 
 # ENV:
 # WEBHOOK_URL         - full public base URL of your deployment (e.g., https://example.com)
@@ -11,6 +13,9 @@ from bot.handlers.errors import on_error
 # WEBHOOK_SECRET      - optional secret token to validate Telegram requests
 # LISTEN_ADDR         - bind address (default: 0.0.0.0)
 # PORT                - listen port (default: 8080)
+# WEBHOOK_WORKERS     - worker processes; > 1 runs bot.cluster (needs STATE_BACKEND=sqlite, default: 1)
+# WEBHOOK_QUEUE_SIZE  - updates acknowledged but not yet processed before answering 503 (default: 1000)
+# WEBHOOK_CONCURRENCY - tasks draining that queue into the handlers (default: UPDATE_CONCURRENCY)
 
 def main():
     logging.basicConfig(
@@ -35,17 +40,20 @@ def main():
     secret = os.getenv("WEBHOOK_SECRET", None)
     host = os.getenv("LISTEN_ADDR", "0.0.0.0")
     port = int(os.getenv("PORT", "8080"))
+    workers = int(os.getenv("WEBHOOK_WORKERS", "1"))
+
+    if workers > 1:
+        # Dispatcher + user-sharded worker processes
+        from bot.cluster import serve
+
+        asyncio.run(serve(workers, host, port, path, secret, base_url.rstrip("/") + path))
+        return
 
     app = build_app()
-    # PTB will spin an aiohttp server internally
     app.add_error_handler(on_error)
 
-    app.run_webhook(
-        listen=host,
-        port=port,
-        webhook_url=base_url.rstrip("/") + path,
-        secret_token=secret,
-    )
+    # Our own ingress answers 200 as soon as the update is queued (see bot.ingress)
+    asyncio.run(run_webhook(app, host, port, path, secret, base_url.rstrip("/") + path))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from benchmarks.fakes import FakeBotApiServer
+from bot.cluster import Dispatcher
+from bot.sharding import route_key, shard_of
+
+SECRET = "s3cret"
+RUNNERS = (7001, 7002, 7003, 7004)
+
+
+def _message(user_id, update_id, **fields):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": f"Runner{user_id}"},
+            **fields,
+        },
+    }
+
+
+def _command(user_id, update_id, text):
+    length = len(text.split()[0])
+    return _message(user_id, update_id, text=text, entities=[{"type": "bot_command", "offset": 0, "length": length}])
+
+
+def test_route_key_uses_the_sender():
+    assert route_key(_command(42, 1, "/begin")) == 42
+    assert route_key({"update_id": 2, "callback_query": {"id": "1", "from": {"id": 43}, "chat_instance": "x"}}) == 43
+    assert route_key({"update_id": 3, "channel_post": {"chat": {"id": -100}}}) == -100
+    assert route_key({"update_id": 4}) is None
+    assert {shard_of(uid, 2) for uid in RUNNERS} == {0, 1}
+
+
+async def _wait_for(predicate, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        await asyncio.sleep(0.05)
+    return False
+
+
+@pytest.mark.asyncio
+async def test_two_workers_keep_each_runner_on_one_shard(tmp_path, monkeypatch):
+    api = await FakeBotApiServer().start()
+    # Spawned workers read their configuration from the environment.
+    monkeypatch.setenv("BOT_TOKEN", "123:TEST")
+    monkeypatch.setenv("BOT_API_BASE_URL", api.base_url)
+    monkeypatch.setenv("STATE_BACKEND", "sqlite")
+    monkeypatch.setenv("STATE_DB", str(tmp_path / "state.sqlite3"))
+    monkeypatch.setenv("STATE_FILE", str(tmp_path / "missing.pkl"))
+    monkeypatch.setenv("DELIVERY_LEDGER_FILE", str(tmp_path / "deliveries.jsonl"))
+
+    dispatcher = Dispatcher(2, path="/telegram", secret=SECRET)
+    try:
+        port = await dispatcher.start("127.0.0.1", 0)
+        url = f"http://127.0.0.1:{port}/telegram"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": SECRET}
+        async with httpx.AsyncClient() as client:
+            denied = await client.post(url, content=b"{}", headers={"X-Telegram-Bot-Api-Secret-Token": "nope"})
+            assert denied.status_code == 403
+
+            update_id = 1
+            for uid in RUNNERS:
+                update = _command(uid, update_id, "/begin")
+                update_id += 1
+                assert (await client.post(url, content=json.dumps(update), headers=headers)).status_code == 200
+            for uid in RUNNERS:
+                update = _message(uid, update_id, location={"latitude": 1.3, "longitude": 103.8})
+                update_id += 1
+                assert (await client.post(url, content=json.dumps(update), headers=headers)).status_code == 200
+
+            # The location lands in the worker that saw /begin, so the conversation moves on.
+            assert await _wait_for(lambda: all(any("end time" in t for t in api.sent_to(uid)) for uid in RUNNERS))
+            assert dispatcher.routed == {0: 4, 1: 4}
+
+            # bot_data is shared: a link made on one shard is visible from the other.
+            owner, contact = RUNNERS[0], RUNNERS[1]
+            assert shard_of(owner, 2) != shard_of(contact, 2)
+            link = _command(contact, update_id, f"/start link_{owner}")
+            await client.post(url, content=json.dumps(link), headers=headers)
+            assert await _wait_for(lambda: any("authorized" in t for t in api.sent_to(contact)))
+            await client.post(url, content=json.dumps(_command(owner, update_id + 1, "/contacts")), headers=headers)
+            assert await _wait_for(lambda: "Authorized contacts: 1" in api.sent_to(owner))
+    finally:
+        await dispatcher.stop()
+        await api.stop()
+    assert all(w.process.exitcode == 0 for w in dispatcher.workers)
@@ -1,4 +1,7 @@
-from bot.utils.contacts import add_contact, list_contacts, remove_contact_everywhere
+from bot.utils.contacts import (
+    add_contact, blacklist_add, blacklist_remove, list_audience, list_contacts, remove_contact,
+    remove_contact_everywhere,
+)
 from bot.constants import BD_CONTACTS
 
 
@@ -18,3 +21,70 @@ def test_remove_contact_everywhere():
     assert removed == 2
     assert list_contacts(bot_data, 111) == [1]
     assert list_contacts(bot_data, 222) == [3]
+
+
+def test_reverse_index_tracks_add_and_remove():
+    from bot.utils.contacts import remove_contact, list_owners
+
+    bot_data = {}
+    add_contact(bot_data, 111, 5)
+    add_contact(bot_data, 222, 5)
+    add_contact(bot_data, 222, 6)
+    assert sorted(list_owners(bot_data, 5)) == [111, 222]
+
+    assert remove_contact(bot_data, 111, 5) is True
+    assert list_owners(bot_data, 5) == [222]
+
+    assert remove_contact_everywhere(bot_data, 5) == 1
+    assert list_owners(bot_data, 5) == []
+    assert list_contacts(bot_data, 222) == [6]
+
+
+def test_reverse_index_built_from_existing_contacts():
+    from bot.utils.contacts import list_owners
+
+    bot_data = {BD_CONTACTS: {"111": [1, 2], "222": [2]}}
+    assert sorted(list_owners(bot_data, 2)) == [111, 222]
+    assert list_owners(bot_data, 1) == [111]
+
+
+def test_migrates_str_keyed_list_storage():
+    from array import array
+    from bot.utils.contacts import migrate_contact_storage, blacklist_list, blacklist_add
+    from bot.constants import BD_BLACKLIST, BD_OWNERS
+
+    bot_data = {
+        BD_CONTACTS: {"111": [3, 1, 3], "222": []},
+        BD_BLACKLIST: {"1": [111]},
+    }
+    migrate_contact_storage(bot_data)
+    assert bot_data[BD_CONTACTS] == {111: array("q", [1, 3])}
+    assert bot_data[BD_OWNERS] == {1: 111, 3: 111}  # single members stay bare ints
+    assert blacklist_list(bot_data, 1) == [111]
+
+    blacklist_add(bot_data, 1, 5)
+    assert blacklist_list(bot_data, 1) == [5, 111]
+    assert bot_data[BD_BLACKLIST][1] == array("q", [5, 111])
+
+
+def test_audience_follows_contacts_and_blacklist():
+    bot_data = {BD_CONTACTS: {"111": [1, 2]}, "blacklist_by_user": {"2": [111]}}
+    assert list_audience(bot_data, 111) == [1]
+
+    blacklist_remove(bot_data, 2, 111)
+    assert list_audience(bot_data, 111) == [1, 2]
+    blacklist_add(bot_data, 1, 111)
+    assert list_audience(bot_data, 111) == [2]
+
+    blacklist_add(bot_data, 3, 111)  # not a contact yet: stays out once added
+    add_contact(bot_data, 111, 3)
+    assert list_audience(bot_data, 111) == [2]
+    blacklist_remove(bot_data, 3, 111)
+    assert list_audience(bot_data, 111) == [2, 3]
+
+    remove_contact(bot_data, 111, 2)
+    remove_contact_everywhere(bot_data, 3)
+    blacklist_remove(bot_data, 1, 111)
+    assert list_audience(bot_data, 111) == [1]
+    blacklist_remove(bot_data, 3, 111)  # no longer a contact: must not reappear
+    assert list_audience(bot_data, 111) == [1]
@@ -1,33 +1,56 @@
+import asyncio
+import time
 import types
 import pytest
+from telegram.error import Forbidden
 
 from bot.jobs.deadline import deadline_job
-from bot.constants import UD_ACTIVE, UD_JOB, BD_CONTACTS
+from bot.jobs.retry import RETRIES
+from bot.persistence.ledger import DeliveryLedger
+from bot.constants import UD_ACTIVE, UD_JOB, BD_CONTACTS, BD_BLACKLIST
+from bot.utils.names import NAME_CACHE
 
 
 class FakeBot:
-    def __init__(self):
+    def __init__(self, latency=0.0, fail_for=()):
         self.outbox = []
+        self.latency = latency          # seconds per API call
+        self.fail_for = set(fail_for)   # chat ids whose sends raise
+
+    async def _call(self, chat_id):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if chat_id in self.fail_for:
+            raise Forbidden("Forbidden: bot was blocked by the user")
 
     async def get_chat(self, chat_id):
         # Return minimal object with .full_name
         return types.SimpleNamespace(full_name="Owner Name")
 
     async def send_message(self, chat_id, text):
+        await self._call(chat_id)
         self.outbox.append(("message", chat_id, text))
 
     async def send_location(self, chat_id, latitude, longitude):
+        await self._call(chat_id)
         self.outbox.append(("location", chat_id, latitude, longitude))
 
 
+@pytest.fixture(autouse=True)
+def empty_retry_queue():
+    RETRIES.clear()
+    yield
+    RETRIES.clear()
+
+
 class FakeJob:
     def __init__(self, chat_id):
         self.chat_id = chat_id
 
 
 class FakeContext:
-    def __init__(self, owner_chat_id, contacts):
-        self.bot = FakeBot()
+    def __init__(self, owner_chat_id, contacts, bot=None):
+        self.bot = bot or FakeBot()
         self.job = FakeJob(owner_chat_id)
         # Preload user_data with an active session
         self.user_data = {
@@ -43,13 +66,14 @@ class FakeContext:
 
 
 @pytest.mark.asyncio
-async def test_deadline_notifies_all_contacts_and_owner_ack():
+async def test_deadline_notifies_all_contacts_and_owner_ack(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "split")
     owner = 999
     contacts = [11, 22]
     ctx = FakeContext(owner, contacts)
 
     # Run the job
-    await deadline_job(ctx)
+    await deadline_job(ctx, ledger=DeliveryLedger())
 
     # Owner should get two messages: "time reached" + "attempted to notify X"
     owner_msgs = [o for o in ctx.bot.outbox if o[1] == owner and o[0] == "message"]
@@ -63,3 +87,85 @@ async def test_deadline_notifies_all_contacts_and_owner_ack():
 
     # Session should be cleared
     assert ctx.user_data.get(UD_ACTIVE) is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_fans_out_concurrently_and_keeps_per_contact_order(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "split")
+    owner = 999
+    contacts = list(range(1, 21))
+    latency = 0.02
+    ctx = FakeContext(owner, contacts, bot=FakeBot(latency=latency))
+
+    started = time.perf_counter()
+    await deadline_job(ctx, ledger=DeliveryLedger())
+    elapsed = time.perf_counter() - started
+
+    # Sequentially this would be 2 calls x 20 contacts (+ owner messages) of latency each.
+    assert elapsed < 20 * latency
+    for cid in contacts:
+        kinds = [o[0] for o in ctx.bot.outbox if o[1] == cid]
+        assert kinds == ["message", "location"]
+    owner_msgs = [o[2] for o in ctx.bot.outbox if o[1] == owner]
+    assert any("Attempted to notify 20 contact(s): 20 delivered, 0 failed" in m for m in owner_msgs)
+
+
+@pytest.mark.asyncio
+async def test_deadline_reports_failed_and_skipped_contacts():
+    owner = 999
+    ctx = FakeContext(owner, [11, 22, 33], bot=FakeBot(fail_for={22}))
+    ctx.bot_data[BD_BLACKLIST] = {"33": [owner]}
+
+    await deadline_job(ctx, ledger=DeliveryLedger())
+
+    owner_msgs = [o[2] for o in ctx.bot.outbox if o[1] == owner]
+    assert any("Attempted to notify 2 contact(s): 1 delivered, 1 failed, 1 skipped" in m for m in owner_msgs)
+    assert not any(o[1] == 33 for o in ctx.bot.outbox)
+    # Blocked is permanent: nothing is queued for a retry
+    assert len(RETRIES) == 0 and "retrying" not in owner_msgs[-1]
+
+
+@pytest.mark.asyncio
+async def test_single_mode_sends_one_message_per_contact_with_a_map_link(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "single")
+    owner = 999
+    ctx = FakeContext(owner, [11, 22])
+
+    await deadline_job(ctx, ledger=DeliveryLedger())
+
+    for cid in (11, 22):
+        sent = [o for o in ctx.bot.outbox if o[1] == cid]
+        assert len(sent) == 1 and sent[0][0] == "message"
+        assert "https://maps.google.com/?q=1.30000,103.80000" in sent[0][2]
+        assert "Planned end: 2099-01-01" in sent[0][2]
+
+
+@pytest.mark.asyncio
+async def test_alert_escapes_the_runners_display_name(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "single")
+    NAME_CACHE.clear()
+    owner = 998
+    ctx = FakeContext(owner, [11])
+
+    async def get_chat(chat_id):
+        return types.SimpleNamespace(full_name="Ann <3 & Bo")
+
+    ctx.bot.get_chat = get_chat
+    await deadline_job(ctx, ledger=DeliveryLedger())
+    NAME_CACHE.clear()
+
+    [alert] = [o[2] for o in ctx.bot.outbox if o[1] == 11]
+    assert "Safety alert for Ann &lt;3 &amp; Bo, 998" in alert
+
+
+@pytest.mark.asyncio
+async def test_deadline_without_contacts_ends_the_session():
+    owner = 997
+    ctx = FakeContext(owner, [])
+    ledger = DeliveryLedger()
+
+    await deadline_job(ctx, ledger=ledger)
+
+    assert any("No authorized contacts found" in o[2] for o in ctx.bot.outbox if o[1] == owner)
+    assert ctx.user_data.get(UD_ACTIVE) is None
+    assert ledger.is_closed("997@2099-01-01T00:00:00+00:00")
@@ -0,0 +1,45 @@
+from bot.jobs.wheel import DeadlineWheel
+
+
+def test_arm_and_advance_fires_due_entries_only():
+    wheel = DeadlineWheel(tick=1.0, clock=lambda: 1000.0)
+    wheel.arm(1, 1005.2, chat_id=1, data={})
+    wheel.arm(2, 1010.0, chat_id=2, data={})
+    assert len(wheel) == 2
+
+    assert wheel.advance(1004.9) == []
+    due = wheel.advance(1006.0)
+    assert [e.user_id for e in due] == [1]
+    assert wheel.get(1) is None and wheel.get(2) is not None
+
+    due = wheel.advance(2000.0)  # long gap
+    assert [e.user_id for e in due] == [2]
+    assert len(wheel) == 0
+
+
+def test_deadline_never_fires_before_its_time():
+    wheel = DeadlineWheel(tick=1.0, clock=lambda: 1000.0)
+    wheel.arm(1, 1005.9, chat_id=1, data={})
+
+    assert wheel.advance(1005.95) == []       # tick 1005 has passed, the deadline has not
+    assert [e.user_id for e in wheel.advance(1006.0)] == [1]
+
+
+def test_cancel_and_rearm():
+    wheel = DeadlineWheel(tick=1.0, clock=lambda: 0.0)
+    wheel.arm(1, 5.0, chat_id=1, data={"n": 1})
+    entry = wheel.cancel(1)
+    assert entry.data == {"n": 1}
+    assert wheel.cancel(1) is None
+    assert wheel.advance(10.0) == []
+
+    wheel.arm(1, 15.0, chat_id=1, data={"n": 2})
+    wheel.arm(1, 20.0, chat_id=1, data={"n": 3})  # re-arm replaces
+    assert len(wheel) == 1
+    assert [e.data["n"] for e in wheel.advance(30.0)] == [3]
+
+
+def test_overdue_deadline_fires_on_next_tick():
+    wheel = DeadlineWheel(tick=1.0, clock=lambda: 100.0)
+    wheel.arm(1, 50.0, chat_id=1, data={})
+    assert [e.user_id for e in wheel.advance(101.0)] == [1]
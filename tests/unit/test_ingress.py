@@ -0,0 +1,101 @@
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fakes import StubRequest
+from bot.ingress import INGRESS_REJECTED, IngressServer, UpdateIngress, WebhookServer, running
+from bot.metrics import METRICS
+from bot.ordering import OrderedUpdateProcessor
+
+
+def _update(update_id, user_id=1):
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "hi",
+            "chat": {"id": user_id, "type": "private"}, "from": {"id": user_id, "is_bot": False, "first_name": "R"},
+        },
+    }
+
+
+@pytest.mark.asyncio
+async def test_ingress_acknowledges_before_handlers_and_sheds_when_full():
+    request = StubRequest()
+    app = Application.builder().token("123:TEST").request(request).get_updates_request(request).build()
+    release = asyncio.Event()
+    seen = []
+
+    async def slow(update, context):
+        await release.wait()
+        seen.append(update.update_id)
+
+    app.add_handler(TypeHandler(Update, slow))
+    async with running(app, UpdateIngress(app, maxsize=2, concurrency=1)) as ingress:
+        server = IngressServer(ingress, "/hook", "s3cret")
+        port = await server.listen("127.0.0.1", 0)
+        url = f"http://127.0.0.1:{port}/hook"
+        headers = {"X-Telegram-Bot-Api-Secret-Token": "s3cret"}
+        rejected = INGRESS_REJECTED.value()
+        try:
+            async with httpx.AsyncClient() as client:
+                assert (await client.post(url, content=b"{}")).status_code == 403
+                assert (await client.post(url, content=b"not json", headers=headers)).status_code == 400
+
+                started = time.perf_counter()
+                statuses = []
+                for i in range(1, 5):
+                    response = await client.post(url, content=json.dumps(_update(i)), headers=headers)
+                    statuses.append(response.status_code)
+                    await asyncio.sleep(0.01)
+                # Handlers are blocked, yet every request was answered right away.
+                assert time.perf_counter() - started < 2
+                assert statuses == [200, 200, 200, 503]
+                assert INGRESS_REJECTED.value() == rejected + 1
+                assert "saferunner_ingress_queue_depth 2" in METRICS.render()
+                assert "saferunner_update_queue_depth 2" in METRICS.render()
+
+                release.set()
+                await ingress.stop()
+                assert seen == [1, 2, 3]
+        finally:
+            await server.close()
+
+
+@pytest.mark.asyncio
+async def test_one_users_backlog_does_not_hold_up_another_user():
+    request = StubRequest()
+    app = (Application.builder().token("123:TEST").request(request).get_updates_request(request)
+           .concurrent_updates(OrderedUpdateProcessor(4)).build())
+    release = asyncio.Event()
+    seen = []
+
+    async def handler(update, context):
+        if update.effective_user.id == 1:
+            await release.wait()
+        seen.append(update.update_id)
+
+    app.add_handler(TypeHandler(Update, handler))
+    async with running(app, UpdateIngress(app, maxsize=10, concurrency=2)) as ingress:
+        for i in range(1, 4):
+            assert ingress.offer(_update(i, user_id=1))
+        assert ingress.offer(_update(4, user_id=2))
+        for _ in range(20):
+            if seen:
+                break
+            await asyncio.sleep(0.01)
+        # User 1's updates wait for one another; user 2's does not wait for them.
+        assert seen == [4]
+
+        release.set()
+        await ingress.stop()
+        assert seen == [4, 1, 2, 3]
+
+
+def test_webhook_server_requires_accept():
+    with pytest.raises(TypeError):
+        WebhookServer()
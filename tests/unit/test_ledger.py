@@ -0,0 +1,122 @@
+import asyncio
+import json
+import types
+
+import pytest
+
+from bot.constants import BD_CONTACTS, UD_ACTIVE
+from bot.jobs.deadline import deadline_job
+from bot.persistence.ledger import CLOSED, DELIVERED, FAILED, DeliveryLedger, ledger_files, session_key
+
+
+@pytest.mark.asyncio
+async def test_concurrent_appends_share_one_write_and_replay(tmp_path):
+    path = tmp_path / "deliveries.jsonl"
+    ledger = DeliveryLedger(path)
+    ledger.open()
+
+    await asyncio.gather(*(ledger.append("1@end", cid, DELIVERED) for cid in range(50)))
+    await ledger.append("1@end", 99, FAILED)
+    await ledger.append("1@end", None, CLOSED)
+    assert ledger.writes == 3
+    ledger.close()
+
+    with path.open("a") as f:
+        f.write('["1@end", 7, "deliv')            # torn by a crash mid-write
+    reopened = DeliveryLedger(path)
+    reopened.open()
+    assert reopened.outcomes("1@end") == {**{cid: DELIVERED for cid in range(50)}, 99: FAILED}
+    assert reopened.is_closed("1@end")
+    assert all(json.loads(line) for line in path.read_text().splitlines())
+    reopened.close()
+
+
+@pytest.mark.asyncio
+async def test_memory_only_ledger_forgets_old_sessions():
+    now = [0.0]
+    ledger = DeliveryLedger(keep_seconds=3600, clock=lambda: now[0])
+    await ledger.append("1@a", 5, DELIVERED)
+    await ledger.append("1@a", None, CLOSED)
+
+    now[0] = 7200.0
+    await ledger.append("2@b", 6, DELIVERED)
+    assert len(ledger) == 1 and not ledger.is_closed("1@a") and ledger.outcomes("1@a") == {}
+
+
+def test_sessions_move_with_their_runner_between_worker_counts(tmp_path):
+    base = tmp_path / "deliveries.jsonl"
+    # Written by a two-worker cluster; the bot now runs as one process.
+    (tmp_path / "deliveries.jsonl.1").write_text('["7@end", 5, "delivered", 10.0]\n["7@end", null, "closed", 11.0]\n')
+    base.write_text('["7@end", 5, "retrying", 9.0]\n')
+    ledger = DeliveryLedger(base, clock=lambda: 20.0)
+    ledger.open(siblings=ledger_files(base))
+
+    assert ledger_files(base) == [base, tmp_path / "deliveries.jsonl.1"]
+    assert ledger.outcomes("7@end") == {5: DELIVERED} and ledger.is_closed("7@end")
+    ledger.close()
+
+
+def test_open_drops_sessions_not_touched_for_keep_seconds(tmp_path):
+    path = tmp_path / "deliveries.jsonl"
+    path.write_text('["1@old", 5, "delivered", 100.0]\n["2@new", 6, "delivered", 5000.0]\n')
+    ledger = DeliveryLedger(path, keep_seconds=3600, clock=lambda: 5000.0)
+    ledger.open()
+
+    assert ledger.outcomes("1@old") == {} and ledger.outcomes("2@new") == {6: DELIVERED}
+    assert "1@old" not in path.read_text()
+    ledger.close()
+
+
+class HangingBot:
+    """Delivers at once, except to ``hang_for``, whose sends never return (the process 'crashes' there)."""
+
+    def __init__(self, hang_for=()):
+        self.hang_for = set(hang_for)
+        self.sent = []
+
+    async def get_chat(self, chat_id):
+        return types.SimpleNamespace(full_name="Owner")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if chat_id in self.hang_for:
+            await asyncio.Event().wait()
+        self.sent.append((chat_id, text))
+
+
+def _context(bot, owner, iso):
+    user_data = {UD_ACTIVE: {"end_dt_utc": iso, "location": None}}
+    return types.SimpleNamespace(bot=bot, user_data=user_data, bot_data={BD_CONTACTS: {str(owner): [11, 22, 33]}},
+                                 job=types.SimpleNamespace(chat_id=owner, data={"owner_id": owner, "deadline_iso": iso}))
+
+
+@pytest.mark.asyncio
+async def test_alert_cut_short_by_a_crash_resumes_without_repeats(tmp_path):
+    path = tmp_path / "deliveries.jsonl"
+    owner, iso = 600, "2030-01-01T00:00:00+00:00"
+    ledger = DeliveryLedger(path)
+    ledger.open()
+
+    first = HangingBot(hang_for={33})
+    task = asyncio.create_task(deadline_job(_context(first, owner, iso), ledger))
+    while len(ledger.outcomes(session_key(owner, iso))) < 2:
+        await asyncio.sleep(0)
+    task.cancel()
+    ledger.close()
+
+    # Restart: the persisted session is still armed, so the deadline fires again.
+    ledger = DeliveryLedger(path)
+    ledger.open()
+    second = HangingBot()
+    ctx = _context(second, owner, iso)
+    await deadline_job(ctx, ledger)
+
+    assert [cid for cid, _ in second.sent if cid != owner] == [33]
+    [summary] = [text for cid, text in second.sent if cid == owner]   # no second "End time reached"
+    assert summary.startswith("Attempted to notify 3 contact(s): 3 delivered, 0 failed")
+    assert UD_ACTIVE not in ctx.user_data
+
+    # Closed: a third firing (cleared session not persisted before another restart) alerts nobody.
+    third = HangingBot()
+    await deadline_job(_context(third, owner, iso), ledger)
+    assert third.sent == []
+    ledger.close()
@@ -0,0 +1,80 @@
+import types
+
+import pytest
+
+from benchmarks.fakes import FakeBot, FakeContext, make_update
+from bot.constants import BD_CONTACTS, UD_ACTIVE
+from bot.handlers.session import free_gps_during_session
+from bot.jobs.deadline import deadline_job
+from bot.persistence.ledger import DeliveryLedger
+from bot.utils.live_location import LIVE_LOCATIONS, LiveLocations
+from bot.utils.trail import TRAILS
+
+
+def test_fixes_are_persisted_at_most_once_per_interval():
+    now = [0.0]
+    live = LiveLocations(persist_every=60, clock=lambda: now[0])
+
+    assert live.update(1, 1.0, 2.0)           # first fix
+    now[0] = 30
+    assert not live.update(1, 1.1, 2.1)
+    assert live.latest(1) == {"type": "coords", "lat": 1.1, "lon": 2.1}
+    now[0] = 60
+    assert live.update(1, 1.2, 2.2)
+    now[0] = 90
+    assert not live.update(1, 1.3, 2.3)
+
+    live.discard(1)
+    assert live.latest(1) is None
+    assert live.update(1, 1.4, 2.4)
+
+
+@pytest.mark.asyncio
+async def test_live_location_edits_update_memory_silently_and_the_alert_uses_the_latest_fix(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "split")
+    owner, contact = 4242, 77
+    bot = FakeBot()
+    first = {"type": "coords", "lat": 1.0, "lon": 103.0}
+    user_data = {UD_ACTIVE: {"location": None, "end_dt_utc": "2099-01-01T00:00:00+00:00"}}
+    bot_data = {BD_CONTACTS: {str(owner): [contact]}}
+    ctx = FakeContext(bot, user_data, bot_data)
+    try:
+        await free_gps_during_session(
+            make_update(bot, owner, location={"latitude": 1.0, "longitude": 103.0}, live_period=3600), ctx)
+        for i in range(1, 50):
+            fix = {"latitude": 1.0 + i / 1000, "longitude": 103.0}
+            await free_gps_during_session(make_update(bot, owner, location=fix, edited=True), ctx)
+
+        assert bot.calls["sendMessage"] == 1                  # one acknowledgement for the whole share
+        assert user_data[UD_ACTIVE]["location"] == first      # edits within the interval stay in memory
+
+        ctx.job = types.SimpleNamespace(chat_id=owner, data={"owner_id": owner, "location": first})
+        sent = []
+        bot.send_location = lambda chat_id, latitude, longitude, **kw: _record(sent, chat_id, latitude)
+        await deadline_job(ctx, ledger=DeliveryLedger())
+        assert sent == [(contact, 1.049)]
+        assert LIVE_LOCATIONS.latest(owner) is None
+    finally:
+        LIVE_LOCATIONS.discard(owner)
+        TRAILS.discard(owner)
+
+
+async def _record(sent, chat_id, latitude):
+    sent.append((chat_id, latitude))
+
+
+@pytest.mark.asyncio
+async def test_a_static_pin_still_replies_and_replaces_a_live_fix():
+    owner = 4343
+    bot = FakeBot()
+    user_data = {UD_ACTIVE: {"location": None, "end_dt_utc": None}}
+    ctx = FakeContext(bot, user_data, {})
+    try:
+        LIVE_LOCATIONS.update(owner, 5.0, 5.0)
+        await free_gps_during_session(make_update(bot, owner, location={"latitude": 1.0, "longitude": 2.0}), ctx)
+        assert bot.calls["sendMessage"] == 1
+        assert user_data[UD_ACTIVE]["location"] == {"type": "coords", "lat": 1.0, "lon": 2.0}
+        assert LIVE_LOCATIONS.latest(owner) is None
+    finally:
+        LIVE_LOCATIONS.discard(owner)
+        TRAILS.discard(owner)
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from telegram.ext import Application, CommandHandler, ConversationHandler, MessageHandler, filters
+
+from bot.metrics import Registry, instrument_handlers, start_metrics_server, HANDLER_SECONDS
+
+
+def test_render_counter_and_histogram():
+    reg = Registry()
+    c = reg.counter("t_total", "Things.", ("kind",))
+    h = reg.histogram("t_seconds", "Time.", ("op",), buckets=(0.1, 1))
+    reg.gauge("t_depth", "Depth.", lambda: 3)
+    c.inc(kind="a")
+    c.inc(2, kind='q"x')
+    h.observe(0.05, op="send")
+    h.observe(0.5, op="send")
+
+    text = reg.render()
+    assert "# TYPE t_total counter" in text
+    assert 't_total{kind="a"} 1' in text
+    assert 't_total{kind="q\\"x"} 2' in text
+    assert 't_seconds_bucket{op="send",le="0.1"} 1' in text
+    assert 't_seconds_bucket{op="send",le="1"} 2' in text
+    assert 't_seconds_bucket{op="send",le="+Inf"} 2' in text
+    assert 't_seconds_count{op="send"} 2' in text
+    assert "t_depth 3" in text
+
+
+@pytest.mark.asyncio
+async def test_instrument_handlers_times_conversation_children():
+    async def begin_probe(update, context):
+        return ConversationHandler.END
+
+    async def text_probe(update, context):
+        return None
+
+    app = Application.builder().token("123:abc").build()
+    conv = ConversationHandler(
+        entry_points=[CommandHandler("probe", begin_probe)],
+        states={0: [MessageHandler(filters.TEXT, text_probe)]},
+        fallbacks=[],
+    )
+    app.add_handler(conv)
+    instrument_handlers(app)
+    instrument_handlers(app)  # idempotent
+
+    await conv.entry_points[0].callback(None, None)
+    assert HANDLER_SECONDS.count(handler="begin_probe") == 1
+    assert conv.states[0][0].callback.timed
+
+
+@pytest.mark.asyncio
+async def test_metrics_endpoint_serves_text_format():
+    reg = Registry()
+    reg.gauge("saferunner_test_gauge", "Test.", lambda: 7)
+    server = await start_metrics_server("127.0.0.1", 0, reg)
+    port = server.sockets[0].getsockname()[1]
+    try:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\n")
+        response = (await reader.read()).decode()
+        writer.close()
+        assert response.startswith("HTTP/1.1 200 OK")
+        assert "saferunner_test_gauge 7" in response
+
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /other HTTP/1.1\r\n\r\n")
+        assert (await reader.read()).startswith(b"HTTP/1.1 404")
+        writer.close()
+    finally:
+        server.close()
+        await server.wait_closed()
@@ -0,0 +1,66 @@
+import asyncio
+import types
+
+import pytest
+
+from bot.metrics import METRICS
+from bot.startup import register_gauges
+from bot.utils.names import NAME_CACHE, NameCache
+
+
+class CountingBot:
+    def __init__(self, fail_for=()):
+        self.calls = []
+        self.fail_for = set(fail_for)
+
+    async def get_chat(self, chat_id):
+        self.calls.append(chat_id)
+        await asyncio.sleep(0.01)
+        if chat_id in self.fail_for:
+            raise RuntimeError("Chat not found")
+        return types.SimpleNamespace(full_name=f"User {chat_id}")
+
+
+@pytest.mark.asyncio
+async def test_hits_and_coalescing():
+    cache = NameCache()
+    bot = CountingBot()
+    names = await asyncio.gather(*(cache.resolve(bot, 1) for _ in range(5)))
+    assert names == ["User 1"] * 5
+    assert bot.calls == [1]
+    assert await cache.resolve(bot, 1) == "User 1"
+    assert cache.stats()["misses"] == 1
+    assert cache.stats()["coalesced"] == 4
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ttl_lru_and_negative_entries():
+    now = [0.0]
+    cache = NameCache(ttl=10, negative_ttl=1, maxsize=2, clock=lambda: now[0])
+    bot = CountingBot(fail_for={3})
+    assert await cache.resolve_many(bot, [1, 2, 1]) == {1: "User 1", 2: "User 2"}
+    assert await cache.resolve(bot, 3) is None
+    assert len(cache) == 2  # 1 was least recently used and got evicted
+
+    await cache.resolve(bot, 3)
+    assert bot.calls.count(3) == 1
+    now[0] = 2.0  # negative entry expired, positive one still fresh
+    await cache.resolve(bot, 3)
+    await cache.resolve(bot, 2)
+    assert bot.calls.count(3) == 2
+    assert bot.calls.count(2) == 1
+
+
+@pytest.mark.asyncio
+async def test_shared_cache_hit_rate_is_exported():
+    NAME_CACHE.clear()
+    bot = CountingBot()
+    await NAME_CACHE.resolve(bot, 1)
+    await NAME_CACHE.resolve(bot, 1)
+    register_gauges(types.SimpleNamespace(update_queue=types.SimpleNamespace(qsize=lambda: 0), bot=None))
+
+    rendered = METRICS.render()
+    NAME_CACHE.clear()
+    assert "saferunner_name_cache_hit_ratio 0.5" in rendered
+    assert "saferunner_name_cache_entries 1" in rendered
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from telegram import Update
+from telegram.ext import Application
+
+from benchmarks.fakes import StubRequest
+from bot.constants import UD_ACTIVE
+from bot.jobs.wheel import DeadlineEntry, fire_deadline
+from bot.ordering import USER_LOCKS, KeyedLocks, OrderedUpdateProcessor
+
+
+def _update(update_id, user_id):
+    return Update.de_json({
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id, "date": 0, "text": "x",
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "R"},
+        },
+    }, None)
+
+
+@pytest.mark.asyncio
+async def test_users_run_concurrently_but_each_in_arrival_order():
+    locks = KeyedLocks()
+    processor = OrderedUpdateProcessor(8, locks)
+    events = []
+
+    async def handle(update, delay):
+        events.append(("start", update.update_id))
+        await asyncio.sleep(delay)
+        events.append(("end", update.update_id))
+
+    # User 1 sends a slow update then a fast one; user 2's update arrives last.
+    jobs = [(_update(1, 1), 0.05), (_update(2, 1), 0), (_update(3, 2), 0)]
+    await asyncio.gather(*(processor.process_update(u, handle(u, d)) for u, d in jobs))
+
+    assert events.index(("end", 1)) < events.index(("start", 2))   # same user: strictly ordered
+    assert events.index(("end", 3)) < events.index(("end", 1))     # other user: not held up
+    assert len(locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_a_users_backlog_takes_one_slot():
+    processor = OrderedUpdateProcessor(2, KeyedLocks())
+    done = []
+
+    async def handle(update, delay):
+        await asyncio.sleep(delay)
+        done.append(update.update_id)
+
+    backlog = [(_update(i, 1), 0.02) for i in range(1, 6)]
+    await asyncio.gather(*(processor.process_update(u, handle(u, d)) for u, d in backlog + [(_update(9, 2), 0)]))
+    assert done[0] == 9
+    assert done[1:] == [1, 2, 3, 4, 5]
+
+
+@pytest.mark.asyncio
+async def test_deadline_skips_a_session_replaced_while_waiting_for_the_lock():
+    request = StubRequest()
+    app = Application.builder().token("123:TEST").request(request).get_updates_request(request).build()
+    end = (datetime.now(timezone.utc) - timedelta(seconds=1)).isoformat()
+
+    def entry(user_id):
+        return DeadlineEntry(user_id, user_id, 0.0, {"owner_id": user_id, "deadline_iso": end, "location": None}, 0)
+
+    async with app:
+        await app.start()
+        for user_id in (5, 6):
+            app.user_data[user_id][UD_ACTIVE] = {"location": None, "end_dt_utc": end}
+            async with USER_LOCKS.hold(user_id):
+                fire_deadline(app, entry(user_id))
+                await asyncio.sleep(0.01)
+                if user_id == 5:
+                    # The runner's /begin holds the lock and starts a new session.
+                    app.user_data[5][UD_ACTIVE] = {"location": None, "end_dt_utc": None}
+            await asyncio.sleep(0.05)
+        await app.stop()
+
+    assert app.user_data[5][UD_ACTIVE] == {"location": None, "end_dt_utc": None}
+    # Only user 6, whose session was unchanged, was told (deadline reached, no contacts).
+    assert request.calls["sendMessage"] == 2
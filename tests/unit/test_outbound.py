@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from telegram.error import RetryAfter
+
+from bot.metrics import SEND_WAIT
+from bot.utils.outbound import OutboundScheduler, PRIORITY_ALERT, send_priority
+
+
+async def _send(limiter, chat_id, log, label=None, endpoint="sendMessage"):
+    async def callback():
+        log.append(label if label is not None else chat_id)
+        return True
+
+    return await limiter.process_request(callback, (), {}, endpoint, {"chat_id": chat_id}, None)
+
+
+@pytest.mark.asyncio
+async def test_alerts_jump_the_queue():
+    limiter = OutboundScheduler(global_rate=20)
+    alerts_before = SEND_WAIT.count(priority="alert")
+    log = []
+    # Drain the global burst, then queue interactive replies behind it.
+    await asyncio.gather(*(_send(limiter, 1000 + i, log) for i in range(20)))
+    log.clear()
+    interactive = [asyncio.create_task(_send(limiter, i, log, "reply")) for i in range(5)]
+    await asyncio.sleep(0)
+    with send_priority(PRIORITY_ALERT):
+        alert = asyncio.create_task(_send(limiter, 99, log, "alert"))
+    await asyncio.gather(alert, *interactive)
+    assert log.index("alert") <= 1
+    assert limiter.queue_depth == 0
+    assert SEND_WAIT.count(priority="alert") == alerts_before + 1
+    await limiter.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_per_chat_bucket_spaces_messages():
+    limiter = OutboundScheduler(global_rate=1000, per_chat_rate=20, per_chat_burst=1)
+    log = []
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    await asyncio.gather(*(_send(limiter, 1, log) for _ in range(4)))
+    # burst of 1 then 20/s => the 4th message waits ~150ms
+    assert loop.time() - start >= 0.14
+    assert limiter.stats()["wait_max"] >= 0.14
+    await limiter.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_unthrottled_endpoints_and_retry_after():
+    limiter = OutboundScheduler(global_rate=1000, max_retries=1)
+    log = []
+    assert await _send(limiter, 1, log, endpoint="getChat") is True
+    assert limiter.stats()["sent"] == 0
+
+    calls = []
+
+    async def flaky():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RetryAfter(0.01)
+        return "ok"
+
+    assert await limiter.process_request(flaky, (), {}, "sendMessage", {"chat_id": 5}, None) == "ok"
+    assert len(calls) == 2
+
+    async def always_limited():
+        raise RetryAfter(0.01)
+
+    with pytest.raises(RetryAfter):
+        await limiter.process_request(always_limited, (), {}, "sendMessage", {"chat_id": 6}, None)
+    await limiter.shutdown()
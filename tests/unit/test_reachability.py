@@ -0,0 +1,135 @@
+import types
+
+import pytest
+from telegram import Update
+from telegram.error import Forbidden
+
+from benchmarks.fakes import FakeBot, FakeContext, make_update
+from bot.constants import BD_CONTACTS, BD_STORE, UD_ACTIVE
+from bot.handlers.reachability import track_reachability
+from bot.handlers.start import start_param_entry
+from bot.jobs.deadline import deadline_job
+from bot.persistence.ledger import DeliveryLedger
+from bot.persistence.sqlite import SqliteStore
+from bot.utils.names import NAME_CACHE
+from bot.utils.reachability import (
+    BLOCKED, REACHABLE, UNKNOWN, by_reachability, mark_blocked, mark_reachable, reachability,
+)
+
+
+@pytest.fixture(params=["bot_data", "sqlite"])
+def bot_data(request, tmp_path):
+    if request.param == "bot_data":
+        yield {}
+        return
+    store = SqliteStore(tmp_path / "state.sqlite3")
+    yield {BD_STORE: store}
+    store.close()
+
+
+def test_registry_orders_reachable_then_unknown_and_sets_blocked_aside(bot_data):
+    assert mark_reachable(bot_data, 2)
+    assert not mark_reachable(bot_data, 2)
+    assert mark_blocked(bot_data, 3)
+    assert mark_reachable(bot_data, 4) and mark_blocked(bot_data, 4)
+
+    assert reachability(bot_data, [1, 2, 3]) == {1: UNKNOWN, 2: REACHABLE, 3: BLOCKED}
+    assert by_reachability(bot_data, [1, 2, 3, 4, 5]) == ([2, 1, 5], [3, 4])
+
+
+def _update(**payload):
+    return Update.de_json({"update_id": 1, **payload}, None)
+
+
+@pytest.mark.asyncio
+async def test_messages_and_block_events_update_the_registry():
+    ctx = types.SimpleNamespace(bot_data={})
+    user = {"id": 9, "is_bot": False, "first_name": "C"}
+    private = {"id": 9, "type": "private"}
+
+    await track_reachability(_update(message={"message_id": 1, "date": 0, "chat": private, "from": user,
+                                              "text": "/start"}), ctx)
+    assert reachability(ctx.bot_data, [9]) == {9: REACHABLE}
+
+    bot_user = {"id": 1, "is_bot": True, "first_name": "Bot"}
+    await track_reachability(_update(my_chat_member={
+        "chat": private, "from": user, "date": 0,
+        "old_chat_member": {"status": "member", "user": bot_user},
+        "new_chat_member": {"status": "kicked", "user": bot_user, "until_date": 0},
+    }), ctx)
+    assert reachability(ctx.bot_data, [9]) == {9: BLOCKED}
+
+
+@pytest.mark.asyncio
+async def test_alerts_skip_blocked_contacts_and_learn_from_403s():
+    owner = 321
+    calls = []
+
+    async def send_message(chat_id, text, **kwargs):
+        calls.append((chat_id, text))
+        if chat_id == 13:
+            raise Forbidden("Forbidden: bot was blocked by the user")
+        if chat_id == 15:
+            raise Forbidden("Forbidden: bot can't initiate conversation with a user")
+
+    bot = FakeBot()
+    bot.send_message = send_message
+    bot_data = {BD_CONTACTS: {str(owner): [11, 12, 13, 14, 15]}}
+    mark_blocked(bot_data, 12)
+    mark_reachable(bot_data, 14)
+    ctx = FakeContext(bot, {UD_ACTIVE: {"location": None}}, bot_data,
+                      job=types.SimpleNamespace(chat_id=owner, data={"owner_id": owner}))
+
+    await deadline_job(ctx, ledger=DeliveryLedger())
+
+    assert [cid for cid, _ in calls if cid != owner] == [14, 11, 13, 15]     # reachable first, blocked never
+    # Only a block counts as blocked; a contact who has not pressed Start yet may still do so.
+    assert reachability(bot_data, [11, 13, 15]) == {11: REACHABLE, 13: BLOCKED, 15: UNKNOWN}
+    summary = calls[-1][1]
+    assert "4 contact(s): 2 delivered, 2 failed" in summary and "1 skipped (blocked this bot)" in summary
+
+
+@pytest.mark.asyncio
+async def test_runner_is_told_when_an_added_contact_cannot_be_reached():
+    bot = FakeBot()
+    replies = []
+    bot.send_message = lambda chat_id, text, **kw: _append(replies, text)
+    NAME_CACHE.clear()
+    bot_data = {}
+
+    await start_param_entry(make_update(bot, 500, text="/start contact_77"), FakeContext(bot, {}, bot_data))
+    assert "77 hasn’t messaged this bot yet" in replies[-1]
+
+    mark_reachable(bot_data, 78)
+    await start_param_entry(make_update(bot, 500, text="/start bundle_78,79"), FakeContext(bot, {}, bot_data))
+    assert "79 hasn’t messaged this bot yet" in replies[-1] and "78 " not in replies[-1]
+
+
+async def _append(replies, text):
+    replies.append(text)
+
+
+@pytest.mark.asyncio
+async def test_added_contact_note_follows_the_courtesy_ping(monkeypatch):
+    monkeypatch.setattr("bot.handlers.start.ALERT_WHEN_ADDED", True)
+    bot = FakeBot()
+    replies = []
+
+    async def send_message(chat_id, text, **kwargs):
+        if chat_id == 501:
+            replies.append(text)
+        elif chat_id == 88:
+            raise Forbidden("Forbidden: bot can't initiate conversation with a user")
+
+    bot.send_message = send_message
+    NAME_CACHE.clear()
+    bot_data = {}
+
+    for contact_id in (87, 88):
+        update = make_update(bot, 501, text=f"/start contact_{contact_id}")
+        update.effective_user.full_name = "Ann"
+        await start_param_entry(update, FakeContext(bot, {}, bot_data))
+        if contact_id == 87:
+            assert "⚠️" not in replies[-1]          # the ping got through
+    assert "88 hasn’t messaged this bot yet" in replies[-1]
+    assert reachability(bot_data, [87, 88]) == {87: REACHABLE, 88: UNKNOWN}
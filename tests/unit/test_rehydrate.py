@@ -0,0 +1,57 @@
+import time
+import types
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from bot.constants import UD_ACTIVE, UD_TZ
+from bot.jobs.rehydrate import rehydrate_deadlines
+from bot.jobs.wheel import DeadlineWheel
+from bot.metrics import METRICS
+from bot.startup import register_gauges
+
+
+def _iso(delta_s):
+    return (datetime.now(timezone.utc) + timedelta(seconds=delta_s)).isoformat()
+
+
+@pytest.mark.asyncio
+async def test_rehydrate_rearms_persisted_sessions():
+    app = types.SimpleNamespace(
+        bot_data={},
+        user_data={
+            1: {UD_ACTIVE: {"end_dt_utc": _iso(600), "location": {"type": "text", "text": "park"}, "chat_id": 10}},
+            2: {UD_ACTIVE: {"end_dt_utc": _iso(-600), "location": None}},  # passed while down
+            3: {UD_ACTIVE: {"location": None, "end_dt_utc": None}},        # still in the conversation
+            4: {UD_TZ: "UTC"},
+        },
+    )
+    wheel = DeadlineWheel()
+    stats = await rehydrate_deadlines(app, wheel=wheel, batch_size=2)
+
+    assert stats["sessions"] == 2
+    assert stats["overdue"] == 1
+    assert len(wheel) == 2
+    assert wheel.get(1).chat_id == 10
+    assert wheel.get(1).data["location"] == {"type": "text", "text": "park"}
+    assert wheel.get(2).chat_id == 2
+
+    # Overdue session fires on the next tick, the other one does not
+    due = wheel.advance(time.time() + 1.0)
+    assert [e.user_id for e in due] == [2]
+
+    # The same numbers are exported on /metrics
+    register_gauges(types.SimpleNamespace(update_queue=types.SimpleNamespace(qsize=lambda: 0), bot=None))
+    rendered = METRICS.render()
+    assert "saferunner_rehydrated_sessions 2" in rendered
+    assert "saferunner_rehydrated_overdue_sessions 1" in rendered
+
+
+@pytest.mark.asyncio
+async def test_rehydrate_keeps_sessions_armed_since_startup():
+    app = types.SimpleNamespace(bot_data={}, user_data={1: {UD_ACTIVE: {"end_dt_utc": _iso(600)}}})
+    wheel = DeadlineWheel()
+    newer = wheel.arm(1, time.time() + 60, chat_id=1, data={"new": True})
+    stats = await rehydrate_deadlines(app, wheel=wheel)
+    assert stats["sessions"] == 0
+    assert wheel.get(1) is newer
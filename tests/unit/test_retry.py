@@ -0,0 +1,121 @@
+import types
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+from bot.constants import BD_CONTACTS, UD_ACTIVE, UD_RETRY
+from bot.jobs import retry
+from bot.jobs.deadline import deadline_job
+from bot.jobs.retry import RETRIES, RetryQueue, rehydrate_retries, retry_delay, retry_delivery
+from bot.persistence.ledger import DELIVERED, DeliveryLedger
+
+
+class FlakyBot:
+    """Raises the next queued error for a chat, if any; records what went through."""
+
+    def __init__(self, errors=None):
+        self.errors = errors or {}
+        self.sent = []
+
+    async def _call(self, chat_id, what):
+        queued = self.errors.get(chat_id)
+        if queued:
+            raise queued.pop(0)
+        self.sent.append((chat_id, what))
+
+    async def get_chat(self, chat_id):
+        return types.SimpleNamespace(full_name="Owner")
+
+    async def send_message(self, chat_id, text, **kwargs):
+        await self._call(chat_id, text)
+
+    async def send_location(self, chat_id, latitude, longitude, **kwargs):
+        await self._call(chat_id, (latitude, longitude))
+
+
+@pytest.fixture(autouse=True)
+def empty_queue():
+    RETRIES.clear()
+    yield
+    RETRIES.clear()
+
+
+def test_errors_are_classified_into_delays(monkeypatch):
+    monkeypatch.setattr(retry, "RETRY_BASE_SECONDS", 5)
+    monkeypatch.setattr(retry, "RETRY_MAX_SECONDS", 30)
+    monkeypatch.setattr(retry, "RETRY_MAX_ATTEMPTS", 5)
+
+    assert retry_delay(RetryAfter(7), 1) == 7
+    assert [retry_delay(TimedOut(), a) for a in (1, 2, 3, 4)] == [5, 10, 20, 30]
+    assert retry_delay(NetworkError("reset"), 5) is None      # out of attempts
+    assert retry_delay(Forbidden("bot was blocked by the user"), 1) is None
+    assert retry_delay(BadRequest("Chat not found"), 1) is None
+
+
+@pytest.mark.asyncio
+async def test_deadline_queues_transient_failures_and_drops_permanent_ones(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "split")
+    owner = 700
+    bot = FlakyBot({11: [TimedOut()], 22: [Forbidden("blocked")]})
+    user_data = {UD_ACTIVE: {"location": {"type": "coords", "lat": 1.3, "lon": 103.8}}}
+    ctx = types.SimpleNamespace(bot=bot, user_data=user_data, bot_data={BD_CONTACTS: {str(owner): [11, 22, 33]}},
+                                job=types.SimpleNamespace(chat_id=owner, data={"owner_id": owner}))
+
+    await deadline_job(ctx, ledger=DeliveryLedger())
+
+    summary = bot.sent[-1][1]
+    assert "3 contact(s): 1 delivered, 2 failed; retrying 1 in the background" in summary
+    [delivery] = user_data[UD_RETRY]
+    assert delivery["chat_id"] == 11 and delivery["attempt"] == 1 and delivery["error"] == "TimedOut"
+    assert [method for method, _ in delivery["sends"]] == ["send_message", "send_location"]
+    assert len(RETRIES) == 1
+
+
+@pytest.mark.asyncio
+async def test_retries_resume_where_the_delivery_stopped_until_delivered():
+    now = [1000.0]
+    queue = RetryQueue(concurrency=4, clock=lambda: now[0])
+    owner, contact = 800, 44
+    delivery = {"chat_id": contact, "attempt": 1, "due": 1000.0, "error": "TimedOut", "session": "800@end",
+                "sends": [("send_message", {"text": "alert"}), ("send_location", {"latitude": 1, "longitude": 2})]}
+    bot = FlakyBot()
+    ledger = DeliveryLedger()
+    app = types.SimpleNamespace(bot=bot, user_data={owner: {UD_RETRY: [delivery]}}, bot_data={},
+                                mark_data_for_update_persistence=lambda **kw: None)
+    queue.push(owner, delivery)
+
+    # The text goes through, then Telegram asks to wait before the location.
+    bot.send_location = _fail_once(bot.send_location, RetryAfter(3))
+    [(user_id, due)] = queue.take_due()
+    await retry_delivery(app, user_id, due, queue, ledger)
+    assert delivery["attempt"] == 2 and delivery["due"] == 1003.0
+    assert [m for m, _ in delivery["sends"]] == ["send_location"]
+    assert queue.take_due() == []
+
+    now[0] = 1003.0
+    [(user_id, due)] = queue.take_due()
+    await retry_delivery(app, user_id, due, queue, ledger)
+    assert bot.sent == [(contact, "alert"), (contact, (1, 2))]
+    assert UD_RETRY not in app.user_data[owner]
+    assert len(queue) == 0
+    assert ledger.outcomes("800@end") == {contact: DELIVERED}
+
+
+def _fail_once(method, error):
+    errors = [error]
+
+    async def wrapper(*args, **kwargs):
+        if errors:
+            raise errors.pop()
+        return await method(*args, **kwargs)
+
+    return wrapper
+
+
+def test_persisted_deliveries_are_requeued_on_startup():
+    queue = RetryQueue(clock=lambda: 0.0)
+    pending = {"chat_id": 1, "sends": [], "attempt": 2, "due": 50.0, "error": "NetworkError"}
+    app = types.SimpleNamespace(user_data={5: {UD_RETRY: [pending]}, 6: {}})
+
+    assert rehydrate_retries(app, queue) == 1
+    assert queue.take_due(now=50.0) == [(5, pending)]
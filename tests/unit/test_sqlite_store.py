@@ -0,0 +1,134 @@
+import pickle
+from array import array
+
+import pytest
+
+from bot.persistence.sqlite import SqlitePersistence, SqliteStore
+from bot.utils.contacts import (
+    add_contact,
+    list_contacts,
+    list_owners,
+    remove_contact,
+    remove_contact_everywhere,
+    blacklist_add,
+    blacklist_remove,
+    blacklist_list,
+    list_audience,
+)
+from bot.constants import BD_CONTACTS, BD_BLACKLIST, BD_STORE, UD_ACTIVE
+
+
+def test_contacts_run_against_store(tmp_path):
+    bot_data = {BD_STORE: SqliteStore(tmp_path / "state.sqlite3")}
+    add_contact(bot_data, 111, 200)
+    add_contact(bot_data, 111, 201)
+    add_contact(bot_data, 111, 200)  # dedupe
+    add_contact(bot_data, 222, 201)
+    assert list_contacts(bot_data, 111) == [200, 201]
+    assert list_owners(bot_data, 201) == [111, 222]
+    assert BD_CONTACTS not in bot_data
+
+    assert remove_contact(bot_data, 111, 200) is True
+    assert remove_contact(bot_data, 111, 200) is False
+    assert remove_contact_everywhere(bot_data, 201) == 2
+    assert list_contacts(bot_data, 222) == []
+
+
+def test_blacklist_runs_against_store(tmp_path):
+    bot_data = {BD_STORE: SqliteStore(tmp_path / "state.sqlite3")}
+    blacklist_add(bot_data, 11, 999)
+    blacklist_add(bot_data, 11, 999)
+    assert blacklist_list(bot_data, 11) == [999]
+    assert blacklist_remove(bot_data, 11, 999) is True
+    assert blacklist_remove(bot_data, 11, 999) is False
+    assert blacklist_list(bot_data, 11) == []
+
+
+def test_audience_query_applies_blacklist(tmp_path):
+    bot_data = {BD_STORE: SqliteStore(tmp_path / "state.sqlite3")}
+    for cid in (200, 201, 202):
+        add_contact(bot_data, 111, cid)
+    blacklist_add(bot_data, 201, 111)
+    blacklist_add(bot_data, 202, 999)  # blocks someone else
+    assert list_audience(bot_data, 111) == [200, 202]
+
+
+@pytest.mark.asyncio
+async def test_persistence_roundtrip_and_sessions(tmp_path):
+    db = tmp_path / "state.sqlite3"
+    p = SqlitePersistence(db)
+    bot_data = await p.get_bot_data()
+    add_contact(bot_data, 1, 2)
+    bot_data["other"] = {"x": 1}
+    await p.update_bot_data(bot_data)
+    session = {"end_dt_utc": "2099-01-01T00:00:00+00:00", "location": {"type": "text", "text": "park"}}
+    await p.update_user_data(1, {UD_ACTIVE: session})
+    await p.update_conversation("exercise_flow", (1, 1), 1)
+    await p.flush()
+
+    p2 = SqlitePersistence(db)
+    bot_data2 = await p2.get_bot_data()
+    assert bot_data2["other"] == {"x": 1}
+    assert list_contacts(bot_data2, 1) == [2]
+    assert await p2.get_user_data() == {1: {UD_ACTIVE: session}}
+    assert await p2.get_conversations("exercise_flow") == {(1, 1): 1}
+    assert list(p2.store.iter_sessions()) == [(1, session["end_dt_utc"], session["location"])]
+
+    await p2.update_user_data(1, {})
+    assert list(p2.store.iter_sessions()) == []
+
+
+@pytest.mark.asyncio
+async def test_imports_legacy_pickle_file(tmp_path):
+    legacy = tmp_path / "state.pkl"
+    with legacy.open("wb") as f:
+        pickle.dump({
+            "user_data": {5: {"tz": "UTC"}},
+            "chat_data": {},
+            "bot_data": {BD_CONTACTS: {"5": [6, 7]}, BD_BLACKLIST: {"6": [5]}},
+            "conversations": {},
+            "callback_data": None,
+        }, f)
+
+    p = SqlitePersistence(tmp_path / "state.sqlite3", legacy_file=legacy)
+    bot_data = await p.get_bot_data()
+    assert BD_CONTACTS not in bot_data
+    assert list_contacts(bot_data, 5) == [6, 7]
+    assert blacklist_list(bot_data, 6) == [5]
+    assert await p.get_user_data() == {5: {"tz": "UTC"}}
+
+
+def test_import_reads_compact_relations(tmp_path):
+    store = SqliteStore(tmp_path / "state.sqlite3")
+    store.import_bot_data({
+        BD_CONTACTS: {5: 6, 8: array("q", [6, 7])},
+        BD_BLACKLIST: {6: 5, 7: array("q", [5, 8])},
+    })
+    bot_data = {BD_STORE: store}
+    assert list_contacts(bot_data, 5) == [6]
+    assert list_contacts(bot_data, 8) == [6, 7]
+    assert blacklist_list(bot_data, 6) == [5]
+    assert blacklist_list(bot_data, 7) == [5, 8]
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_failed_legacy_import_leaves_nothing_and_is_retried(tmp_path, monkeypatch):
+    legacy = tmp_path / "state.pkl"
+    with legacy.open("wb") as f:
+        pickle.dump({"user_data": {5: {"tz": "UTC"}}, "bot_data": {BD_CONTACTS: {"5": [6]}}}, f)
+    db = tmp_path / "state.sqlite3"
+
+    def crash(self, user_id, data):
+        raise OSError("disk full")
+
+    with monkeypatch.context() as m:
+        m.setattr(SqlitePersistence, "_write_user", crash)
+        with pytest.raises(OSError):
+            await SqlitePersistence(db, legacy_file=legacy).get_bot_data()
+    assert db.exists()
+
+    p = SqlitePersistence(db, legacy_file=legacy)
+    bot_data = await p.get_bot_data()
+    assert list_contacts(bot_data, 5) == [6]
+    assert await p.get_user_data() == {5: {"tz": "UTC"}}
@@ -42,3 +42,27 @@ def test_to_utc_and_delay_non_negative():
 def test_is_valid_tz():
     assert is_valid_tz("Asia/Singapore") is True
     assert is_valid_tz("Not/AZone") is False
+
+
+def test_resolve_tz_is_memoized_per_backend():
+    from bot.utils.time_utils import resolve_tz, tz_name
+
+    assert resolve_tz("Asia/Singapore") is resolve_tz("Asia/Singapore")
+    zi = resolve_tz("Asia/Singapore", backend="zoneinfo")
+    assert tz_name(zi) == "Asia/Singapore"
+    assert resolve_tz("Not/AZone", backend="zoneinfo") is None
+    dt = local_hhmm_to_future_dt(0, 0, zi)
+    assert dt.utcoffset() == timedelta(hours=8)
+
+
+def test_set_user_tz_stores_canonical_name():
+    from types import SimpleNamespace
+    from bot.utils.time_utils import set_user_tz, get_user_tz
+    from bot.constants import UD_TZ
+
+    ctx = SimpleNamespace(user_data={})
+    assert set_user_tz(ctx, "not/a_zone") is None
+    assert UD_TZ not in ctx.user_data
+    assert set_user_tz(ctx, "europe/london") == "Europe/London"
+    assert ctx.user_data[UD_TZ] == "Europe/London"
+    assert get_user_tz(ctx).zone == "Europe/London"
@@ -0,0 +1,74 @@
+import asyncio
+import json
+import threading
+
+import pytest
+
+from bot import tracing
+from bot.profiling import sample_stacks, write_folded
+
+
+@pytest.fixture
+def trace_file(tmp_path):
+    path = tmp_path / "trace.jsonl"
+    tracing.configure(str(path))
+    yield path
+    tracing.configure(None)
+
+
+def _rows(path):
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_span_is_noop_when_disabled():
+    with tracing.span("update") as s:
+        assert s is None
+    assert tracing.current_span() is None
+
+
+@pytest.mark.asyncio
+async def test_child_spans_follow_tasks_into_the_trace(trace_file):
+    async def send():
+        with tracing.span("bot_api", method="sendMessage"):
+            await asyncio.sleep(0)
+
+    with tracing.span("update", type="message") as root:
+        await asyncio.gather(send(), send())
+
+    rows = _rows(trace_file)
+    assert [r["name"] for r in rows] == ["bot_api", "bot_api", "update"]
+    assert all(r["trace"] == root.trace_id for r in rows)
+    assert rows[0]["parent"] == root.span_id and rows[0]["method"] == "sendMessage"
+    assert rows[2]["parent"] is None
+
+
+def test_traced_records_errors(trace_file):
+    @tracing.traced("persistence.append")
+    def append():
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        append()
+    (row,) = _rows(trace_file)
+    assert row["error"] == "OSError" and row["fn"].endswith("append")
+
+
+def test_sampling_profiler_writes_folded_stacks(tmp_path):
+    stop = threading.Event()
+
+    def busy_worker():
+        while not stop.is_set():
+            sum(range(1000))
+
+    t = threading.Thread(target=busy_worker)
+    t.start()
+    try:
+        stacks = sample_stacks(t.ident, seconds=0.2, interval=0.002)
+    finally:
+        stop.set()
+        t.join()
+
+    assert any("busy_worker" in stack for stack in stacks)
+    path = write_folded(stacks, tmp_path / "out" / "p.folded")
+    stack, count = path.read_text().splitlines()[0].rsplit(" ", 1)
+    assert ";" in stack and int(count) >= 1
@@ -0,0 +1,69 @@
+import types
+from datetime import timezone
+
+import pytest
+
+from benchmarks.fakes import FakeBot, FakeContext
+from bot.constants import BD_CONTACTS, UD_ACTIVE
+from bot.jobs.deadline import deadline_job
+from bot.persistence.ledger import DeliveryLedger
+from bot.utils.session_utils import format_trail_summary
+from bot.utils.trail import TRAILS, Trail, distance_m
+
+# ~111 m per 0.001 degree of latitude
+STEP = 0.001
+
+
+def test_ring_keeps_the_newest_points_in_order():
+    trail = Trail(size=4, min_distance=0)
+    for i in range(10):
+        trail.add(1.0 + i * STEP, 103.0, at=1000 + i)
+
+    assert len(trail) == 4
+    points = trail.points()
+    assert [t for t, _, _ in points] == [1006, 1007, 1008, 1009]
+    assert [round(lat, 4) for _, lat, _ in points] == [1.006, 1.007, 1.008, 1.009]
+    assert [t for t, _, _ in trail.points(2)] == [1008, 1009]
+
+
+def test_nearby_fixes_only_refresh_the_newest_point():
+    trail = Trail(size=8, min_distance=25)
+    assert trail.add(1.0, 103.0, at=0)
+    assert not trail.add(1.0001, 103.0, at=10)   # ~11 m away
+    assert trail.add(1.0 + STEP, 103.0, at=20)
+
+    assert [t for t, _, _ in trail.points()] == [10, 20]
+    assert 100 < distance_m(1.0, 103.0, 1.0 + STEP, 103.0) < 120
+
+
+def test_summary_formats_points_in_the_given_timezone():
+    text = format_trail_summary([(0, 1.5, 103.25), (60, 1.5, 103.5)], timezone.utc)
+    assert text.splitlines() == ["Recent path, oldest first:", "00:00 (1.50000, 103.25000)", "00:01 (1.50000, 103.50000)"]
+
+
+@pytest.mark.asyncio
+async def test_alert_includes_the_recent_path_and_forgets_the_trail(monkeypatch):
+    monkeypatch.setattr("bot.jobs.deadline.ALERT_MODE", "single")
+    owner, contact = 5151, 88
+    bot = FakeBot()
+    user_data = {UD_ACTIVE: {"location": {"type": "coords", "lat": 1.003, "lon": 103.0}}}
+    ctx = FakeContext(bot, user_data, {BD_CONTACTS: {str(owner): [contact]}},
+                      job=types.SimpleNamespace(chat_id=owner, data={"owner_id": owner}))
+    sent = []
+
+    async def send_message(chat_id, text, **kwargs):
+        sent.append((chat_id, text))
+
+    bot.send_message = send_message
+    try:
+        for i in range(4):
+            TRAILS.record(owner, 1.0 + i * STEP, 103.0)
+        await deadline_job(ctx, ledger=DeliveryLedger())
+        assert TRAILS.get(owner) is None
+    finally:
+        TRAILS.discard(owner)
+
+    to_contact = [text for chat_id, text in sent if chat_id == contact]
+    assert len(to_contact) == 1
+    path = to_contact[0].split("\n\n", 1)[1]
+    assert path.startswith("Recent path") and len(path.splitlines()) == 5
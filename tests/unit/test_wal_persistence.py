@@ -0,0 +1,73 @@
+import pickle
+
+import pytest
+
+from bot.persistence.wal import WalPersistence
+from bot.constants import BD_CONTACTS
+
+
+@pytest.mark.asyncio
+async def test_wal_replays_log_on_restart(tmp_path):
+    path = tmp_path / "state.pkl"
+    p = WalPersistence(path, compact_every=1000)
+    await p.get_bot_data()
+    await p.update_user_data(1, {"tz": "Asia/Singapore"})
+    await p.update_bot_data({BD_CONTACTS: {"1": [2, 3]}})
+    await p.update_conversation("exercise_flow", (1, 1), 1)
+
+    # No snapshot yet: everything lives in the log
+    assert not path.exists()
+
+    p2 = WalPersistence(path)
+    assert await p2.get_user_data() == {1: {"tz": "Asia/Singapore"}}
+    assert await p2.get_bot_data() == {BD_CONTACTS: {"1": [2, 3]}}
+    assert await p2.get_conversations("exercise_flow") == {(1, 1): 1}
+
+
+@pytest.mark.asyncio
+async def test_wal_appends_only_changed_keys(tmp_path):
+    path = tmp_path / "state.pkl"
+    p = WalPersistence(path)
+    await p.get_bot_data()
+    contacts = {str(i): [i + 1] for i in range(500)}
+    await p.update_bot_data({BD_CONTACTS: dict(contacts)})
+    size_after_full = p.log_path.stat().st_size
+
+    contacts["7"] = [8, 9]
+    await p.update_bot_data({BD_CONTACTS: dict(contacts)})
+    delta = p.log_path.stat().st_size - size_after_full
+    assert 0 < delta < size_after_full / 50
+
+    # Unchanged data appends nothing
+    await p.update_bot_data({BD_CONTACTS: dict(contacts)})
+    assert p.log_path.stat().st_size == size_after_full + delta
+
+
+@pytest.mark.asyncio
+async def test_wal_compaction_writes_pickle_compatible_snapshot(tmp_path):
+    path = tmp_path / "state.pkl"
+    p = WalPersistence(path, compact_every=2)
+    await p.get_user_data()
+    await p.update_user_data(1, {"a": 1})
+    await p.update_user_data(2, {"b": 2})  # triggers compaction
+    assert p.log_path.stat().st_size == 0
+    with path.open("rb") as f:
+        snap = pickle.load(f)
+    assert snap["user_data"] == {1: {"a": 1}, 2: {"b": 2}}
+
+    await p.drop_user_data(1)
+    p2 = WalPersistence(path)
+    assert await p2.get_user_data() == {2: {"b": 2}}
+
+
+@pytest.mark.asyncio
+async def test_wal_ignores_torn_tail(tmp_path):
+    path = tmp_path / "state.pkl"
+    p = WalPersistence(path)
+    await p.get_user_data()
+    await p.update_user_data(1, {"a": 1})
+    with p.log_path.open("ab") as f:
+        f.write(pickle.dumps(("user_set", 2, {"b": 2}))[:-3])
+
+    p2 = WalPersistence(path)
+    assert await p2.get_user_data() == {1: {"a": 1}}